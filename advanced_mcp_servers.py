@@ -3,6 +3,8 @@ import json
 from typing import Dict, List, Optional
 from datetime import datetime
 from mcp_handler import MCPHandler
+from smart_integrations import PredictiveAnalytics
+from pricing_engine import pricing_engine, PricingError
 
 class FramingBusinessMCPServer:
     """
@@ -64,8 +66,8 @@ class FramingBusinessMCPServer:
             artwork_details, preferences, budget
         )
         
-        cost_breakdown = self.calculate_detailed_costs(recommendations)
-        alternatives = self.generate_alternatives(recommendations, budget)
+        cost_breakdown = self.calculate_detailed_costs(recommendations, artwork_details)
+        alternatives = self.generate_alternatives(recommendations, budget, artwork_details)
         
         return {
             'recommendations': recommendations,
@@ -96,47 +98,52 @@ class FramingBusinessMCPServer:
         
         return recommendations
     
-    def calculate_detailed_costs(self, recommendations: List[Dict]) -> Dict:
-        """Calculate detailed cost breakdown"""
+    def _artwork_size(self, artwork: Optional[Dict]) -> tuple:
+        """Artwork width and height in inches, defaulting to 16x20"""
+        return pricing_engine.parse_dimensions(artwork or {}) or (16.0, 20.0)
+    
+    def calculate_detailed_costs(self, recommendations: List[Dict], artwork: Optional[Dict] = None) -> Dict:
+        """Calculate detailed cost breakdown from the shop price list"""
         if not recommendations:
             return {}
         
         rec = recommendations[0]  # Use first recommendation
+        width, height = self._artwork_size(artwork)
+        
+        try:
+            quote = pricing_engine.quote(
+                width, height,
+                frame_type=rec.get('frame_type', 'Hardwood Oak'),
+                mat_style=rec.get('mat_style', 'Single Mat'),
+                glass_type=rec.get('glass_type', 'Standard Glass'),
+                backing_type=rec.get('backing_type', 'Standard'),
+                mat_width=pricing_engine.parse_inches(rec.get('mat_width'), 2.5),
+                frame_width=pricing_engine.parse_inches(rec.get('frame_width'))
+            )
+        except PricingError as e:
+            return {'error': str(e)}
         
+        rec['estimated_cost'] = quote['total']
         return {
-            'materials': {
-                'frame': rec.get('estimated_cost', 0) * 0.4,
-                'mat': rec.get('estimated_cost', 0) * 0.2,
-                'glass': rec.get('estimated_cost', 0) * 0.3,
-                'backing': rec.get('estimated_cost', 0) * 0.1
-            },
-            'labor': rec.get('estimated_cost', 0) * 0.3,
-            'markup': rec.get('estimated_cost', 0) * 0.2,
-            'total': rec.get('estimated_cost', 0)
+            'materials': quote['materials'],
+            'labor': quote['labor'],
+            'markup': quote['markup'],
+            'total': quote['total'],
+            'united_inches': quote['united_inches']
         }
     
-    def generate_alternatives(self, recommendations: List[Dict], budget: float) -> List[Dict]:
+    def generate_alternatives(self, recommendations: List[Dict], budget: float,
+                              artwork: Optional[Dict] = None) -> List[Dict]:
         """Generate alternative options within budget"""
-        alternatives = []
-        
-        # Budget-friendly alternative
-        alternatives.append({
-            'name': 'Budget-Friendly Option',
-            'frame_type': 'Pine Wood',
-            'estimated_cost': budget * 0.6,
-            'trade_offs': ['Less premium materials', 'Standard glass instead of UV protection']
-        })
+        if not budget:
+            return []
         
-        # Premium alternative
-        if budget > 300:
-            alternatives.append({
-                'name': 'Premium Option',
-                'frame_type': 'Hand-crafted Walnut',
-                'estimated_cost': budget * 1.2,
-                'benefits': ['Museum-quality materials', 'Hand-finished details', 'Lifetime warranty']
-            })
-        
-        return alternatives
+        width, height = self._artwork_size(artwork)
+        current = recommendations[0] if recommendations else {}
+        try:
+            return pricing_engine.alternatives(width, height, budget, current=current)
+        except PricingError:
+            return []
 
 class DocumentProcessingMCPServer:
     """
@@ -185,10 +192,31 @@ class BusinessAnalyticsMCPServer:
             'profit_analysis',
             'operational_efficiency'
         ]
+        self.analytics = PredictiveAnalytics()
     
     def generate_business_insights(self, data_range: Dict) -> Dict:
-        """Generate comprehensive business insights"""
-        # Mock analytics - replace with actual data analysis
+        """
+        Generate comprehensive business insights
+        Computed from data_range['orders'] (order history) when provided
+        """
+        if data_range.get('orders'):
+            version = data_range.get('version')
+            insights = dict(self.analytics.business_insights(data_range['orders'], version=version))
+            demand = self.analytics.predict_demand(data_range['orders'], version=version)
+            insights['demand_forecast'] = {
+                'next_month_demand': demand['next_month_demand'],
+                'peak_periods': demand['peak_periods'],
+                'recommended_inventory': demand['recommended_inventory']
+            }
+            if data_range.get('open_orders'):
+                insights['delay_risk'] = self.analytics.predict_completion_delays(data_range['open_orders'])
+            insights['recommendations'] = [
+                f"Stock {quantity} {material} for the next 30 days"
+                for material, quantity in demand['recommended_inventory'].items()
+            ] + insights.get('delay_risk', {}).get('recommendations', [])
+            return insights
+        
+        # Sample analytics when no order history is supplied
         return {
             'sales_trends': {
                 'total_revenue': 45000,
@@ -1,9 +1,13 @@
 
-from fastapi import FastAPI, HTTPException
+import time
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 from pydantic import BaseModel
 from model_handler import ModelHandler
 from mcp_handler import MCPHandler
+from metrics import HTTP_REQUEST_SECONDS, PROMETHEUS_CONTENT_TYPE, metrics
+from tracing import tracer
 import uvicorn
 
 app = FastAPI(title="Multi-Model Chat API", version="1.0.0")
@@ -17,6 +21,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    with tracer.trace(f"{request.method} {request.url.path}", traceparent=request.headers.get("traceparent")) as span:
+        response = await call_next(request)
+        span.set_attribute("status", response.status_code)
+    # Label by route template so path parameters do not create new series
+    route = request.scope.get("route")
+    HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, app="api_server",
+                                 route=getattr(route, "path", "unmatched"),
+                                 method=request.method, status=response.status_code)
+    return response
+
 model_handler = ModelHandler()
 mcp_handler = MCPHandler()
 
@@ -64,5 +81,9 @@ async def get_available_models():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    return Response(content=metrics.render_prometheus(), media_type=PROMETHEUS_CONTENT_TYPE)
+
 if __name__ == "__main__":
     uvicorn.run("api_server:app", host="0.0.0.0", port=8080, reload=True)
@@ -7,8 +7,11 @@ import time
 from model_handler import ModelHandler
 from model_recommender import ModelRecommender
 from mcp_handler import MCPHandler
+from document_retrieval import get_document_index
 from conversation_starters import get_conversation_starters
 from image_generator import ImageGenerator
+from image_asset_store import image_asset_store
+from tracing import tracer
 from white_label_config import WhiteLabelConfig
 from model_control_panel import model_control_panel
 from utils import (
@@ -41,6 +44,15 @@ from health_check import health_check
 # Initialize white-label configuration
 wl_config = WhiteLabelConfig()
 
+# Apply configuration pushed by the Hub over the real-time link
+try:
+    from hub_websocket_client import get_websocket_client
+    hub_link = get_websocket_client(wl_config)
+    if hub_link:
+        hub_link.apply_to(wl_config)
+except ImportError:
+    pass
+
 # Page configuration
 st.set_page_config(
     page_title=wl_config.branding.app_title,
@@ -48,6 +60,15 @@ st.set_page_config(
     layout="wide"
 )
 
+# A rerun span still rendering means the previous run never reached the end of
+# the script (st.stop() or an exception); close it before this run takes over
+if st.session_state.get("rendering_span") is not None:
+    stale_span = st.session_state.pop("rendering_span")
+    stale_span.set_attribute("interrupted", True)
+    stale_span.end()
+if st.session_state.get("rerun_span") is not None:
+    st.session_state.rendering_span = st.session_state.pop("rerun_span")
+
 # Apply custom branded CSS
 st.markdown(wl_config.get_custom_css(), unsafe_allow_html=True)
 
@@ -164,11 +185,21 @@ if 'message_count' not in st.session_state:
 if 'last_message_time' not in st.session_state:
     st.session_state.last_message_time = 0
 
+@st.cache_resource
+def get_model_recommender():
+    """One recommender per server process so its trained classifier survives reruns"""
+    return ModelRecommender()
+
+@st.cache_resource
+def get_image_generator():
+    """One image generator per server process so its improved-prompt cache survives reruns"""
+    return ImageGenerator()
+
 # Initialize handlers
 model_handler = ModelHandler()
-model_recommender = ModelRecommender()
+model_recommender = get_model_recommender()
 mcp_handler = MCPHandler()
-image_generator = ImageGenerator()
+image_generator = get_image_generator()
 
 # Load saved messages if they exist
 if st.session_state.conversation_id:
@@ -837,18 +868,24 @@ if 'show_recommender' in st.session_state and st.session_state.show_recommender:
 
     if st.button("Get Recommendation") and task_description.strip():
         with st.spinner("Analyzing your task..."):
-            recommendation = model_recommender.get_recommendation(task_description)
+            st.session_state.recommendation = model_recommender.get_recommendation(task_description)
 
+    # Kept in session state so the accept button still has it on the next rerun
+    recommendation = st.session_state.get('recommendation')
+    if recommendation:
         st.markdown(f"### Recommended Model: **{recommendation['model_name']}**")
         st.markdown(recommendation['explanation'])
 
         if st.button("Use Recommended Model"):
+            model_recommender.record_feedback(recommendation.get('recommendation_id'), True)
             st.session_state.current_model = model_handler.models[recommendation['model_name']]
             st.session_state.show_recommender = False
+            st.session_state.pop('recommendation', None)
             st.rerun()
 
     if st.button("Cancel"):
         st.session_state.show_recommender = False
+        st.session_state.pop('recommendation', None)
         st.rerun()
 
     st.divider()
@@ -895,7 +932,7 @@ if 'selected_starter' in st.session_state and st.session_state.selected_starter:
     save_session_history(st.session_state.conversation_id, st.session_state.messages)
 
     # Process with MCP if enabled
-    messages_for_api = mcp_handler.prepare_messages(st.session_state.messages)
+    messages_for_api = mcp_handler.prepare_messages(st.session_state.messages, st.session_state.conversation_id)
 
     # Get AI response using current model
     thinking_text = " (deep thinking enabled)" if st.session_state.deep_thinking else ""
@@ -909,15 +946,16 @@ if 'selected_starter' in st.session_state and st.session_state.selected_starter:
         # Add MCP context if available
         mcp_context = mcp_handler.extract_mcp_context(response)
 
-        # Add assistant message to conversation
+        # Add assistant message to conversation (recording the model that actually served it)
         timestamp = datetime.now().strftime("%I:%M %p, %B %d")
-        current_model_name = next((k for k, v in model_handler.models.items() if v == st.session_state.current_model), "AI")
+        served_model_id = model_handler.last_served_model or st.session_state.current_model
+        current_model_name = next((k for k, v in model_handler.models.items() if v == served_model_id), "AI")
         st.session_state.messages.append({
             "role": "assistant",
             "content": response,
             "timestamp": timestamp,
             "model": current_model_name,
-            "model_id": st.session_state.current_model,
+            "model_id": served_model_id,
             "mcp_context": mcp_context,
             "deep_thinking": st.session_state.deep_thinking
         })
@@ -938,7 +976,19 @@ for idx, message in enumerate(st.session_state.messages):
             st.markdown(avatar_html, unsafe_allow_html=True)
 
         with col2:
-            message_html = format_message(message)
+            # Generated images render from the local thumbnail once downloaded (URLs expire)
+            image_src = None
+            if message.get("image_url"):
+                if not message.get("image_asset"):
+                    asset = image_asset_store.lookup(message["image_url"])
+                    if asset:
+                        message["image_asset"] = asset["asset_id"]
+                        save_session_history(st.session_state.conversation_id, st.session_state.messages)
+                    else:
+                        image_asset_store.submit(message["image_url"])
+                if message.get("image_asset"):
+                    image_src = image_asset_store.thumbnail_data_uri(message["image_asset"])
+            message_html = format_message(message, image_src)
             st.markdown(message_html, unsafe_allow_html=True)
 
             # Display MCP context information if available
@@ -1054,6 +1104,9 @@ if wl_config.features.enable_image_generation:
                 image_quality = "standard"
                 image_style = "vivid"
 
+            image_count = st.slider("Number of Images", min_value=1, max_value=4, value=1,
+                                    help="Variations are generated concurrently")
+
         with col2:
             if st.button("🎨 Generate Image", type="primary", use_container_width=True):
                 # Use improved prompt if available and user clicked "Use Improved", otherwise use the original
@@ -1061,19 +1114,26 @@ if wl_config.features.enable_image_generation:
                 current_image_url = image_url.strip() if 'image_url' in locals() else None
 
                 if current_prompt.strip():
-                    with st.spinner("Generating image... This may take a moment..."):
-                        result = image_generator.generate_image(
+                    image_columns = st.columns(min(image_count, 2))
+                    generated = 0
+                    with st.spinner(f"Generating {image_count} image{'s' if image_count > 1 else ''}... This may take a moment..."):
+                        # Results arrive as each image completes
+                        for result in image_generator.generate_images(
                             prompt=current_prompt,
+                            count=image_count,
                             model=image_generator.available_models[image_model],
                             size=image_size,
                             quality=image_quality,
                             style=image_style,
                             reference_image_url=current_image_url
-                        )
+                        ):
+                            if not result.get("success"):
+                                st.error(f"Error generating image: {result.get('error', 'Unknown error')}")
+                                continue
 
-                        if result.get("success"):
-                            st.success("Image generated successfully!")
-                            st.image(result["image_url"], caption=f"Generated: {current_prompt[:100]}...")
+                            with image_columns[generated % len(image_columns)]:
+                                st.image(result["image_url"], caption=f"Generated: {current_prompt[:100]}...")
+                            generated += 1
 
                             # Add generated image info to conversation
                             timestamp = datetime.now().strftime("%I:%M %p, %B %d")
@@ -1097,11 +1157,10 @@ if wl_config.features.enable_image_generation:
                                 "reference_image_url": current_image_url
                             })
 
-                            # Save conversation history
-                            save_session_history(st.session_state.conversation_id, st.session_state.messages)
-
-                        else:
-                            st.error(f"Error generating image: {result.get('error', 'Unknown error')}")
+                    if generated:
+                        st.success(f"{generated} image{'s' if generated > 1 else ''} generated successfully!")
+                        # Save conversation history
+                        save_session_history(st.session_state.conversation_id, st.session_state.messages)
                 else:
                     st.warning("Please enter a description for the image you want to generate.")
 
@@ -1132,6 +1191,16 @@ if wl_config.features.enable_file_upload or wl_config.features.enable_screen_sha
                 for file in uploaded_files:
                     st.write(f"- {file.name} ({file.type})")
 
+                # Index for retrieval; files already indexed in this conversation are skipped
+                document_index = get_document_index(st.session_state.conversation_id)
+                try:
+                    new_chunks = document_index.add_files(uploaded_files)
+                    if new_chunks:
+                        st.caption(f"Indexed {new_chunks} new passages for retrieval "
+                                   f"({document_index.get_stats()['chunks']} in this conversation)")
+                except Exception as e:
+                    st.warning(f"Could not index uploaded files: {e}")
+
         with col2:
             st.subheader("🖥️ Screen Sharing")
             st.markdown("**Share your screen with AI for analysis**")
@@ -1243,25 +1312,54 @@ with st.container():
             "timestamp": timestamp
         })
 
-        # Save conversation history
-        save_session_history(st.session_state.conversation_id, st.session_state.messages)
-
-        # Process with MCP if enabled
-        messages_for_api = mcp_handler.prepare_messages(st.session_state.messages)
-
-        # Get uploaded files if any
-        current_files = uploaded_files if 'uploaded_files' in locals() else None
-
-        # In comparison mode, get responses from all selected models
-        if st.session_state.comparison_mode and st.session_state.comparison_models:
-            for model_name in st.session_state.comparison_models:
-                model_id = model_handler.models[model_name]
+        # One trace per chat turn; the rerun that renders the reply is its last span
+        with tracer.trace("chat.turn", model=st.session_state.current_model,
+                          comparison=bool(st.session_state.comparison_mode)):
+            # Save conversation history
+            save_session_history(st.session_state.conversation_id, st.session_state.messages)
+
+            # Process with MCP if enabled
+            messages_for_api = mcp_handler.prepare_messages(st.session_state.messages, st.session_state.conversation_id)
+
+            # Get uploaded files if any
+            current_files = uploaded_files if 'uploaded_files' in locals() else None
+
+            # In comparison mode, get responses from all selected models
+            if st.session_state.comparison_mode and st.session_state.comparison_models:
+                for model_name in st.session_state.comparison_models:
+                    model_id = model_handler.models[model_name]
+
+                    thinking_text = " (with deep thinking)" if st.session_state.deep_thinking else ""
+                    with st.spinner(f"Getting response from {model_name}{thinking_text}..."):
+                        response = model_handler.get_response(
+                            messages_for_api,
+                            model_id,
+                            deep_thinking=st.session_state.deep_thinking,
+                            uploaded_files=current_files,
+                            allow_fallback=False  # Comparisons must come from the selected model
+                        )
 
-                thinking_text = " (with deep thinking)" if st.session_state.deep_thinking else ""
-                with st.spinner(f"Getting response from {model_name}{thinking_text}..."):
+                        # Add MCP context if available
+                        mcp_context = mcp_handler.extract_mcp_context(response)
+
+                        # Add assistant message to conversation
+                        timestamp = datetime.now().strftime("%I:%M %p, %B %d")
+                        st.session_state.messages.append({
+                            "role": "assistant",
+                            "content": response,
+                            "timestamp": timestamp,
+                            "model": model_name,
+                            "model_id": model_id,
+                            "mcp_context": mcp_context,
+                            "deep_thinking": st.session_state.deep_thinking
+                        })
+            else:
+                # Single model response
+                thinking_text = " (deep thinking enabled)" if st.session_state.deep_thinking else ""
+                with st.spinner(f"Thinking{thinking_text}..."):
                     response = model_handler.get_response(
                         messages_for_api,
-                        model_id,
+                        st.session_state.current_model,
                         deep_thinking=st.session_state.deep_thinking,
                         uploaded_files=current_files
                     )
@@ -1269,49 +1367,31 @@ with st.container():
                     # Add MCP context if available
                     mcp_context = mcp_handler.extract_mcp_context(response)
 
-                    # Add assistant message to conversation
+                    # Add assistant message to conversation (recording the model that actually served it)
                     timestamp = datetime.now().strftime("%I:%M %p, %B %d")
+                    served_model_id = model_handler.last_served_model or st.session_state.current_model
+                    current_model_name = next((k for k, v in model_handler.models.items() if v == served_model_id), "AI")
                     st.session_state.messages.append({
                         "role": "assistant",
                         "content": response,
                         "timestamp": timestamp,
-                        "model": model_name,
-                        "model_id": model_id,
+                        "model": current_model_name,
+                        "model_id": served_model_id,
                         "mcp_context": mcp_context,
                         "deep_thinking": st.session_state.deep_thinking
                     })
-        else:
-            # Single model response
-            thinking_text = " (deep thinking enabled)" if st.session_state.deep_thinking else ""
-            with st.spinner(f"Thinking{thinking_text}..."):
-                response = model_handler.get_response(
-                    messages_for_api,
-                    st.session_state.current_model,
-                    deep_thinking=st.session_state.deep_thinking,
-                    uploaded_files=current_files
-                )
 
-                # Add MCP context if available
-                mcp_context = mcp_handler.extract_mcp_context(response)
-
-                # Add assistant message to conversation
-                timestamp = datetime.now().strftime("%I:%M %p, %B %d")
-                current_model_name = next((k for k, v in model_handler.models.items() if v == st.session_state.current_model), "AI")
-                st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": response,
-                    "timestamp": timestamp,
-                    "model": current_model_name,
-                    "model_id": st.session_state.current_model,
-                    "mcp_context": mcp_context,
-                    "deep_thinking": st.session_state.deep_thinking
-                })
-
-        # Save conversation history after processing responses
-        save_session_history(st.session_state.conversation_id, st.session_state.messages)
+            # Save conversation history after processing responses
+            save_session_history(st.session_state.conversation_id, st.session_state.messages)
+            # Ended after a minute if the session goes away before the rerun renders
+            st.session_state.rerun_span = tracer.start_span("streamlit.rerun", timeout=60)
         st.rerun() # Rerun to display new messages
 
 
+# The rerun that followed a chat turn has finished rendering; close its span
+if st.session_state.get("rendering_span") is not None:
+    st.session_state.pop("rendering_span").end()
+
 # Ensure the main function is called if the script is run directly
 if __name__ == "__main__":
     # The main function logic is now integrated at the top level
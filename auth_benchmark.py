@@ -0,0 +1,106 @@
+"""
+Authentication cost: per-rerun token verification and concurrent login throughput
+
+Usage: python auth_benchmark.py [--iterations 5000] [--logins 64] [--concurrency 16]
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict
+
+from auth_manager import AuthManager, User
+from model_usage_tracker import ModelUsageTracker
+from password_hasher import PasswordHasher
+
+
+def time_calls(call: Callable[[], object], count: int) -> Dict[str, float]:
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return {
+        'p50_us': ModelUsageTracker._percentile(samples, 50) * 1e6,
+        'p99_us': ModelUsageTracker._percentile(samples, 99) * 1e6
+    }
+
+
+def run_benchmark(iterations: int = 5000) -> Dict[str, Dict[str, float]]:
+    manager = AuthManager()
+    user = User(id="bench_001", username="bench", email="bench@example.com", password_hash="", role="admin")
+    token = manager.create_session_token(user)
+
+    def uncached():
+        manager._token_cache.clear()
+        return manager.verify_session_token(token)
+
+    results = {
+        'uncached_verify': time_calls(uncached, max(1, iterations // 10)),
+        'cached_verify': time_calls(lambda: manager.verify_session_token(token), iterations),
+    }
+    manager.revoke_token(token)
+    return results
+
+
+def run_login_benchmark(logins: int = 64, concurrency: int = 16, pooled: bool = True) -> Dict[str, float]:
+    """
+    Concurrent logins against a scratch user file, while the main thread keeps
+    timing a short pure-Python loop to show how much rendering is held back.
+    """
+    manager = AuthManager()
+    manager.password_hasher = PasswordHasher(workers=None if pooled else 0)
+    manager.users_file = os.path.join(tempfile.mkdtemp(), "users.json")
+    for index in range(concurrency):
+        manager.register_user(f"bench{index}", f"bench{index}@example.com", "benchmark-password")
+
+    done = threading.Event()
+    render_samples = []
+
+    def render_loop():
+        while not done.is_set():
+            start = time.perf_counter()
+            sum(range(20000))
+            render_samples.append(time.perf_counter() - start)
+            time.sleep(0.001)
+
+    renderer = threading.Thread(target=render_loop)
+    renderer.start()
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(
+            lambda index: manager.authenticate_user(f"bench{index % concurrency}", "benchmark-password"),
+            range(logins)
+        ))
+    wall_time = time.perf_counter() - wall_start
+    done.set()
+    renderer.join()
+    manager.password_hasher.shutdown()
+
+    render_samples.sort()
+    return {
+        'logins_per_second': logins / wall_time,
+        'failed': sum(1 for user in results if not user),
+        'render_p50_ms': ModelUsageTracker._percentile(render_samples, 50) * 1000,
+        'render_p99_ms': ModelUsageTracker._percentile(render_samples, 99) * 1000
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark session verification and concurrent logins")
+    parser.add_argument('--iterations', type=int, default=5000)
+    parser.add_argument('--logins', type=int, default=64)
+    parser.add_argument('--concurrency', type=int, default=16)
+    args = parser.parse_args()
+
+    for name, stats in run_benchmark(args.iterations).items():
+        print(f"{name:18s} p50 {stats['p50_us']:9.1f}us  p99 {stats['p99_us']:9.1f}us")
+
+    for name, pooled in (('inline_hashing', False), ('pooled_hashing', True)):
+        stats = run_login_benchmark(args.logins, args.concurrency, pooled)
+        print(f"{name:18s} {stats['logins_per_second']:7.1f} logins/s  failed {stats['failed']}  "
+              f"render p50 {stats['render_p50_ms']:6.2f}ms  p99 {stats['render_p99_ms']:6.2f}ms")
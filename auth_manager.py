@@ -1,5 +1,4 @@
 import streamlit as st
-import hashlib
 import jwt
 import secrets
 from datetime import datetime, timedelta
@@ -7,7 +6,25 @@ from dataclasses import dataclass, asdict
 from typing import Optional, Dict, List
 import json
 import os
+import re
+import time
+import atexit
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 from database import DatabaseManager
+from metrics import CACHE_REQUESTS
+from password_hasher import PasswordHasher
+try:
+    import fcntl
+except ImportError:
+    # Windows: registrations are still serialized within this process
+    fcntl = None
+
+USER_ID_PATTERN = re.compile(r'user_(\d+)$')
+
+ROLE_HIERARCHY = {"user": 1, "admin": 2, "super_admin": 3}
 
 @dataclass
 class User:
@@ -41,9 +58,32 @@ class AuthManager:
     """Enterprise authentication and authorization manager"""
 
     def __init__(self):
-        self.secret_key = os.environ.get('AUTH_SECRET_KEY', self._generate_secret_key())
+        self.secret_file = os.environ.get('AUTH_SECRET_FILE', ".auth_secret")
+        self.secret_key = os.environ.get('AUTH_SECRET_KEY') or self._load_secret_key()
         self.session_duration_hours = 24
         self.users_file = "users.json"
+        self.password_hasher = PasswordHasher()
+        
+        # Verified tokens: token -> (UserSession, session id, expiry timestamp), LRU-ordered
+        self._token_cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self.token_cache_size = 1024
+        # Revocations by other workers are picked up at most this many seconds late
+        self.revocation_check_interval = 15
+        self._last_revocation_check = datetime.utcnow()
+        
+        # In-memory user store indexed by id/username/email, reloaded when users.json changes
+        self._lock = threading.RLock()
+        self._users: Dict[str, User] = {}
+        self._by_username: Dict[str, str] = {}
+        self._by_email: Dict[str, str] = {}
+        self._users_stamp = None
+        
+        # last_login updates are deferred and written in batches
+        self._pending_logins: Dict[str, str] = {}
+        self._last_login_flush = time.time()
+        self.login_flush_interval = 60
+        self.login_flush_batch = 50
+        atexit.register(self.flush_last_logins)
         
         try:
             self.db = DatabaseManager()
@@ -59,18 +99,37 @@ class AuthManager:
         """Generate a secure secret key"""
         return secrets.token_urlsafe(32)
 
+    def _load_secret_key(self) -> str:
+        """
+        Signing key shared by all workers and kept across restarts.
+        The first process creates the key file exclusively; the others read it.
+        """
+        try:
+            fd = os.open(self.secret_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            for _ in range(50):
+                with open(self.secret_file, 'r') as f:
+                    key = f.read().strip()
+                if key:
+                    return key
+                time.sleep(0.01)  # Creator has not written it yet
+            raise RuntimeError(f"Auth secret file {self.secret_file} is empty")
+        except OSError as e:
+            print(f"Cannot create auth secret file ({e}); tokens will not survive a restart")
+            return self._generate_secret_key()
+
+        key = self._generate_secret_key()
+        with os.fdopen(fd, 'w') as f:
+            f.write(key)
+        return key
+
     def _hash_password(self, password: str) -> str:
-        """Hash password with salt"""
-        salt = secrets.token_hex(16)
-        return hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), 100000).hex() + ':' + salt
+        """Hash password with salt (in the hashing process pool)"""
+        return self.password_hasher.hash(password)
 
     def _verify_password(self, password: str, password_hash: str) -> bool:
-        """Verify password against hash"""
-        try:
-            hash_part, salt = password_hash.split(':')
-            return hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), 100000).hex() == hash_part
-        except:
-            return False
+        """Verify password against a versioned or legacy hash in constant time"""
+        return self.password_hasher.verify(password, password_hash)
 
     def _initialize_admin_user(self):
         """Create default admin user if none exists"""
@@ -84,100 +143,287 @@ class AuthManager:
             )
             self._save_user(admin_user)
 
-    def _load_users(self) -> Dict[str, User]:
-        """Load users from file"""
+    def _file_stamp(self):
+        """Change marker for users.json (mtime and size), None if missing"""
+        try:
+            stat = os.stat(self.users_file)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def _refresh_users(self):
+        """Reload and re-index users.json only if it changed since the last read"""
+        stamp = self._file_stamp()
+        if stamp == self._users_stamp:
+            return
+        users = {}
         try:
-            if os.path.exists(self.users_file):
+            if stamp:
                 with open(self.users_file, 'r') as f:
                     data = json.load(f)
                     # Ensure 'metadata' is loaded as 'user_metadata'
-                    return {uid: User(id=uid, username=u['username'], email=u['email'], password_hash=u['password_hash'], role=u['role'], created_at=u.get('created_at', ''), last_login=u.get('last_login', ''), is_active=u.get('is_active', True), user_metadata=u.get('metadata', {})) for uid, u in data.items()}
+                    users = {uid: User(id=uid, username=u['username'], email=u['email'], password_hash=u['password_hash'], role=u['role'], created_at=u.get('created_at', ''), last_login=u.get('last_login', ''), is_active=u.get('is_active', True), user_metadata=u.get('metadata', {})) for uid, u in data.items()}
         except Exception as e:
             st.error(f"Error loading users: {e}")
-        return {}
+            return
+        # Deferred logins not yet written still apply to the fresh copy
+        for uid, last_login in self._pending_logins.items():
+            if uid in users:
+                users[uid].last_login = last_login
+        self._users = users
+        self._by_username = {u.username: uid for uid, u in users.items()}
+        self._by_email = {u.email.lower(): uid for uid, u in users.items()}
+        self._users_stamp = stamp
+
+    def _load_users(self) -> Dict[str, User]:
+        """Load users (cached; only re-parsed when users.json changes)"""
+        with self._lock:
+            self._refresh_users()
+            return dict(self._users)
+
+    @contextmanager
+    def _locked_users(self):
+        """
+        Exclusive read-modify-write of users.json across threads and worker processes.
+        Yields the current user dict; changes made to it are written atomically on exit.
+        """
+        with self._lock:
+            lock_file = open(self.users_file + '.lock', 'a')
+            try:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                self._refresh_users()
+                users = dict(self._users)
+                yield users
+                self._write_users(users)
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                lock_file.close()
+
+    def _write_users(self, users: Dict[str, User]):
+        """Write users.json via a temp file and rename, then re-index"""
+        for uid, last_login in self._pending_logins.items():
+            if uid in users:
+                users[uid].last_login = last_login
+        # Save 'user_metadata' as 'metadata' for backward compatibility in JSON
+        json_data = {uid: asdict(u) for uid, u in users.items()}
+        for u_data in json_data.values():
+            u_data['metadata'] = u_data.pop('user_metadata')
+
+        directory = os.path.dirname(os.path.abspath(self.users_file))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.users_', suffix='.json')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(json_data, f, indent=2)
+            os.replace(tmp_path, self.users_file)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        self._pending_logins.clear()
+        self._last_login_flush = time.time()
+        self._users = users
+        self._by_username = {u.username: uid for uid, u in users.items()}
+        self._by_email = {u.email.lower(): uid for uid, u in users.items()}
+        self._users_stamp = self._file_stamp()
 
     def _save_user(self, user: User):
         """Save user to file"""
-        users = self._load_users()
-        users[user.id] = user
-
         try:
-            with open(self.users_file, 'w') as f:
-                # Save 'user_metadata' as 'metadata' for backward compatibility in JSON
-                json_data = {uid: asdict(u) for uid, u in users.items()}
-                for uid, u_data in json_data.items():
-                    if 'user_metadata' in u_data:
-                        u_data['metadata'] = u_data.pop('user_metadata')
-                json.dump(json_data, f, indent=2)
+            with self._locked_users() as users:
+                users[user.id] = user
         except Exception as e:
             st.error(f"Error saving user: {e}")
 
+    def delete_user(self, user_id: str) -> bool:
+        """Delete a user; returns False if it does not exist"""
+        with self._locked_users() as users:
+            self._pending_logins.pop(user_id, None)
+            return users.pop(user_id, None) is not None
+
+    def get_user_by_username(self, username: str) -> Optional[User]:
+        """Indexed lookup; cost does not depend on the number of users"""
+        with self._lock:
+            self._refresh_users()
+            user_id = self._by_username.get(username)
+            return self._users.get(user_id) if user_id else None
+
+    def _next_user_id(self, users: Dict[str, User]) -> str:
+        """Next sequential id; stays unique after deletions"""
+        numbers = [int(match.group(1)) for match in map(USER_ID_PATTERN.match, users) if match]
+        return f"user_{max(numbers, default=len(users)) + 1:03d}"
+
     def register_user(self, username: str, email: str, password: str, role: str = "user") -> bool:
         """Register a new user"""
-        users = self._load_users()
-
         # Check if username or email already exists
-        for user in users.values():
-            if user.username == username or user.email == email:
+        with self._lock:
+            self._refresh_users()
+            if username in self._by_username or email.lower() in self._by_email:
                 return False
 
-        # Create new user
-        user_id = f"user_{len(users) + 1:03d}"
-        new_user = User(
-            id=user_id,
-            username=username,
-            email=email,
-            password_hash=self._hash_password(password),
-            role=role
-        )
+        # Hash outside the file lock: it is the slow part
+        password_hash = self._hash_password(password)
 
-        self._save_user(new_user)
+        with self._locked_users() as users:
+            # Re-check: another worker may have registered the same name meanwhile
+            if username in self._by_username or email.lower() in self._by_email:
+                return False
+
+            # Create new user
+            new_user = User(
+                id=self._next_user_id(users),
+                username=username,
+                email=email,
+                password_hash=password_hash,
+                role=role
+            )
+            users[new_user.id] = new_user
         return True
 
     def authenticate_user(self, username: str, password: str) -> Optional[User]:
         """Authenticate user credentials"""
-        users = self._load_users()
+        user = self.get_user_by_username(username)
+        if not user or not user.is_active or not self._verify_password(password, user.password_hash):
+            return None
 
-        for user in users.values():
-            if user.username == username and user.is_active:
-                if self._verify_password(password, user.password_hash):
-                    # Update last login
-                    user.last_login = datetime.now().isoformat()
-                    self._save_user(user)
-                    return user
-        return None
+        # Upgrade legacy or outdated hashes while the plaintext is at hand
+        if self.password_hasher.needs_rehash(user.password_hash):
+            user.password_hash = self._hash_password(password)
+            self._save_user(user)
+
+        # Update last login (written with the next batch)
+        with self._lock:
+            user.last_login = datetime.now().isoformat()
+            self._pending_logins[user.id] = user.last_login
+            due = (len(self._pending_logins) >= self.login_flush_batch or
+                   time.time() - self._last_login_flush >= self.login_flush_interval)
+        if due:
+            self.flush_last_logins()
+        return user
+
+    def flush_last_logins(self):
+        """Write deferred last_login updates"""
+        with self._lock:
+            if not self._pending_logins:
+                return
+            try:
+                with self._locked_users():
+                    pass
+            except Exception as e:
+                print(f"Error writing last_login updates: {e}")
 
     def create_session_token(self, user: User) -> str:
-        """Create JWT session token"""
+        """Create JWT session token and record the session for revocation"""
         expires_at = datetime.now() + timedelta(hours=self.session_duration_hours)
+        session_id = secrets.token_urlsafe(16)
 
         payload = {
             'user_id': user.id,
             'username': user.username,
             'role': user.role,
+            'jti': session_id,
             'exp': expires_at.timestamp(),
             'iat': datetime.now().timestamp()
         }
 
+        if self.db:
+            self.db.create_auth_session(session_id, user.id, datetime.utcnow() + timedelta(hours=self.session_duration_hours))
         return jwt.encode(payload, self.secret_key, algorithm='HS256')
 
     def verify_session_token(self, token: str) -> Optional[UserSession]:
-        """Verify and decode session token"""
+        """
+        Verify and decode session token.
+        Tokens already verified by this worker are served from an LRU cache
+        until they expire or are revoked; only new tokens pay for JWT decoding
+        and the session table lookup.
+        """
+        self._sync_revocations()
+        with self._lock:
+            cached = self._token_cache.get(token)
+            if cached:
+                if cached[2] > time.time():
+                    self._token_cache.move_to_end(token)
+                    CACHE_REQUESTS.inc(cache="auth_token", result="hit")
+                    return cached[0]
+                del self._token_cache[token]
+                return None
+        CACHE_REQUESTS.inc(cache="auth_token", result="miss")
+
         try:
             payload = jwt.decode(token, self.secret_key, algorithms=['HS256'])
-
-            return UserSession(
-                user_id=payload['user_id'],
-                username=payload['username'],
-                role=payload['role'],
-                login_time=datetime.fromtimestamp(payload['iat']).isoformat(),
-                expires_at=datetime.fromtimestamp(payload['exp']).isoformat()
-            )
         except jwt.ExpiredSignatureError:
             return None
         except jwt.InvalidTokenError:
             return None
 
+        session_id = payload.get('jti')
+        if self.db:
+            try:
+                if not session_id or not self.db.is_auth_session_active(session_id):
+                    return None
+            except Exception as e:
+                print(f"Session table check failed: {e}")
+                return None
+
+        session = UserSession(
+            user_id=payload['user_id'],
+            username=payload['username'],
+            role=payload['role'],
+            login_time=datetime.fromtimestamp(payload['iat']).isoformat(),
+            expires_at=datetime.fromtimestamp(payload['exp']).isoformat()
+        )
+        with self._lock:
+            self._token_cache[token] = (session, session_id, payload['exp'])
+            if len(self._token_cache) > self.token_cache_size:
+                self._token_cache.popitem(last=False)
+        return session
+
+    def _sync_revocations(self):
+        """Drop cached tokens whose sessions were revoked by any worker"""
+        if not self.db:
+            return
+        now = datetime.utcnow()
+        with self._lock:
+            if (now - self._last_revocation_check).total_seconds() < self.revocation_check_interval:
+                return
+            since, self._last_revocation_check = self._last_revocation_check, now
+        try:
+            # Small overlap so a revocation committed during the last check is not missed
+            revoked = set(self.db.get_revoked_auth_sessions(since - timedelta(seconds=1)))
+        except Exception as e:
+            print(f"Revocation check failed: {e}")
+            return
+        if revoked:
+            self._evict_sessions(lambda session_id, session: session_id in revoked)
+
+    def _evict_sessions(self, predicate):
+        with self._lock:
+            for token in [token for token, (session, session_id, _) in self._token_cache.items()
+                          if predicate(session_id, session)]:
+                del self._token_cache[token]
+
+    def revoke_token(self, token: str):
+        """Revoke one session (logout) on every worker"""
+        with self._lock:
+            cached = self._token_cache.pop(token, None)
+        session_id = cached[1] if cached else None
+        if not session_id:
+            try:
+                session_id = jwt.decode(token, self.secret_key, algorithms=['HS256'],
+                                        options={'verify_exp': False}).get('jti')
+            except jwt.InvalidTokenError:
+                return
+        if self.db and session_id:
+            self.db.revoke_auth_sessions(session_id=session_id)
+
+    def revoke_user_sessions(self, user_id: str):
+        """Revoke every session of a user, e.g. when they are deactivated or deleted"""
+        self._evict_sessions(lambda session_id, session: session.user_id == user_id)
+        if self.db:
+            self.db.revoke_auth_sessions(user_id=user_id)
+
     def require_auth(self, required_role: str = "user") -> Optional[UserSession]:
         """Decorator/middleware for requiring authentication"""
         if 'auth_token' not in st.session_state:
@@ -189,9 +435,8 @@ class AuthManager:
             return None
 
         # Check role authorization
-        role_hierarchy = {"user": 1, "admin": 2, "super_admin": 3}
-        user_level = role_hierarchy.get(session.role, 0)
-        required_level = role_hierarchy.get(required_role, 1)
+        user_level = ROLE_HIERARCHY.get(session.role, 0)
+        required_level = ROLE_HIERARCHY.get(required_role, 1)
 
         if user_level < required_level:
             return None
@@ -263,21 +508,26 @@ class AuthManager:
                 if st.button(f"{'Deactivate' if user.is_active else 'Activate'}", key=f"toggle_{user.id}"):
                     user.is_active = not user.is_active
                     self._save_user(user)
+                    if not user.is_active:
+                        self.revoke_user_sessions(user.id)
                     st.rerun()
 
             with col4:
                 if user.role != "super_admin" and st.button("Delete", key=f"delete_{user.id}"):
-                    users = self._load_users()
-                    del users[user.id]
                     try:
-                        with open(self.users_file, 'w') as f:
-                            json.dump({uid: asdict(u) for uid, u in users.items()}, f, indent=2)
+                        self.delete_user(user.id)
+                        self.revoke_user_sessions(user.id)
                         st.rerun()
                     except Exception as e:
                         st.error(f"Error deleting user: {e}")
 
     def logout(self):
         """Logout current user"""
+        if 'auth_token' in st.session_state:
+            try:
+                self.revoke_token(st.session_state['auth_token'])
+            except Exception as e:
+                print(f"Error revoking session: {e}")
         for key in ['auth_token', 'current_user', 'user_role']:
             if key in st.session_state:
                 del st.session_state[key]
@@ -0,0 +1,554 @@
+"""
+Batch inference jobs for FramingBusinessAI back-office work
+
+Runs thousands of items (order re-pricing, customer notifications, quality
+checks) with bounded concurrency, checkpoints every result so a job can resume
+after a restart, can hand work to provider batch APIs, and writes results back
+in bulk.
+
+Usage:
+    python batch_jobs.py run reprice_orders orders.jsonl --concurrency 32
+    python batch_jobs.py resume <job_id>
+    python batch_jobs.py status <job_id>
+"""
+
+import os
+import io
+import csv
+import json
+import time
+import uuid
+import argparse
+from dataclasses import dataclass, asdict, field
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from model_usage_tracker import model_usage_tracker
+
+# Job type -> function(framing_ai, item) returning (model_id, messages)
+JOB_TYPES = {
+    'reprice_orders': lambda ai, item: ai.build_order_messages(item),
+    'customer_notifications': lambda ai, item: ai.build_notification_messages(
+        item.get('order_status', {}), item.get('customer_info', {})
+    ),
+    'quality_checks': lambda ai, item: ai.build_quality_messages(
+        item.get('work_photos', []), item.get('quality_standards', {})
+    ),
+}
+
+# Field used to identify items of each job type (falls back to the item's position)
+JOB_KEY_FIELDS = {
+    'reprice_orders': 'order_id',
+    'customer_notifications': 'order_id',
+    'quality_checks': 'order_id',
+}
+
+# Job type -> (conversation id prefix, conversation title) used by the default write-back
+JOB_CONVERSATIONS = {
+    'reprice_orders': ('order', 'Order Processing'),
+    'customer_notifications': ('notification', 'Customer Notification'),
+    'quality_checks': ('quality', 'Quality Check'),
+}
+
+
+@dataclass
+class BatchJobState:
+    """Persistent state of a batch job"""
+    job_id: str
+    job_type: str
+    source: str = ""
+    status: str = "pending"  # pending, running, waiting_on_provider, completed, failed
+    mode: str = "concurrent"  # concurrent or provider_batch
+    total_items: int = 0
+    completed: int = 0
+    failed: int = 0
+    provider_batches: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    created_at: str = ""
+    updated_at: str = ""
+    finished_at: str = ""
+    items_per_second: float = 0.0
+    last_error: str = ""
+
+
+class BatchJobRunner:
+    """Creates, runs and resumes checkpointed batch jobs"""
+
+    def __init__(self, framing_ai=None, jobs_dir: str = "batch_jobs", concurrency: int = 16,
+                 checkpoint_every: int = 50):
+        if framing_ai is None:
+            from framing_business_integration import FramingBusinessAI
+            framing_ai = FramingBusinessAI()
+        self.framing_ai = framing_ai
+        self.jobs_dir = jobs_dir
+        self.concurrency = concurrency
+        self.checkpoint_every = checkpoint_every
+        os.makedirs(self.jobs_dir, exist_ok=True)
+
+    # ----- Paths and persistence -----
+
+    def _job_dir(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, job_id)
+
+    def _path(self, job_id: str, name: str) -> str:
+        return os.path.join(self._job_dir(job_id), name)
+
+    def save_state(self, state: BatchJobState):
+        """Atomically write the job state file"""
+        state.updated_at = datetime.now().isoformat()
+        tmp_path = self._path(state.job_id, "job.json.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(asdict(state), f, indent=2)
+        os.replace(tmp_path, self._path(state.job_id, "job.json"))
+
+    def get_job(self, job_id: str) -> Optional[BatchJobState]:
+        """Load a job's state, or None if it does not exist"""
+        try:
+            with open(self._path(job_id, "job.json"), 'r') as f:
+                return BatchJobState(**json.load(f))
+        except FileNotFoundError:
+            return None
+
+    def list_jobs(self) -> List[BatchJobState]:
+        """List all jobs, newest first"""
+        jobs = [self.get_job(job_id) for job_id in os.listdir(self.jobs_dir)]
+        return sorted([job for job in jobs if job], key=lambda job: job.created_at, reverse=True)
+
+    # ----- Item sources -----
+
+    @staticmethod
+    def load_items(path: str) -> List[Dict]:
+        """Load items from a .jsonl, .json (list) or .csv file"""
+        if path.endswith('.jsonl'):
+            with open(path, 'r') as f:
+                return [json.loads(line) for line in f if line.strip()]
+        if path.endswith('.json'):
+            with open(path, 'r') as f:
+                data = json.load(f)
+                return data if isinstance(data, list) else data.get('items', [])
+        if path.endswith('.csv'):
+            with open(path, 'r', newline='') as f:
+                return list(csv.DictReader(f))
+        raise ValueError(f"Unsupported item file type: {path}")
+
+    def load_items_from_query(self, sql: str, params: Optional[Dict] = None) -> List[Dict]:
+        """Load items from a SQL query against the application database"""
+        return self.framing_ai.db.run_query(sql, params)
+
+    def create_job(self, job_type: str, items: List[Dict], source: str = "", job_id: Optional[str] = None,
+                   mode: str = "concurrent") -> BatchJobState:
+        """Snapshot the items into the job directory and create the job state"""
+        if job_type not in JOB_TYPES:
+            raise ValueError(f"Unknown job type: {job_type}. Available: {', '.join(JOB_TYPES)}")
+
+        job_id = job_id or f"{job_type}_{datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        os.makedirs(self._job_dir(job_id), exist_ok=True)
+
+        key_field = JOB_KEY_FIELDS.get(job_type)
+        with open(self._path(job_id, "items.jsonl"), 'w') as f:
+            for index, item in enumerate(items):
+                key = str(item.get(key_field) or f"item{index}") if key_field else f"item{index}"
+                f.write(json.dumps({'key': key, 'item': item}, default=str) + "\n")
+
+        state = BatchJobState(
+            job_id=job_id,
+            job_type=job_type,
+            source=source,
+            mode=mode,
+            total_items=len(items),
+            created_at=datetime.now().isoformat()
+        )
+        self.save_state(state)
+        return state
+
+    def _iter_items(self, job_id: str) -> Iterator[Tuple[str, Dict]]:
+        with open(self._path(job_id, "items.jsonl"), 'r') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    yield entry['key'], entry['item']
+
+    def _load_results(self, job_id: str) -> Dict[str, Dict]:
+        """Latest result per item key (later lines override earlier attempts)"""
+        results = {}
+        try:
+            with open(self._path(job_id, "results.jsonl"), 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # Partial line from an interrupted write
+                    results[entry['key']] = entry
+        except FileNotFoundError:
+            pass
+        return results
+
+    def get_results(self, job_id: str) -> List[Dict]:
+        """All latest results of a job"""
+        return list(self._load_results(job_id).values())
+
+    # ----- Concurrent execution -----
+
+    def _process_item(self, job_type: str, key: str, item: Dict) -> Dict:
+        model_id, messages = JOB_TYPES[job_type](self.framing_ai, item)
+        handler = self.framing_ai.model_handler
+        try:
+            response = handler.get_response(messages, model_id)
+            served_model = handler.last_served_model
+            return {
+                'key': key,
+                'success': served_model is not None,
+                'model_id': served_model or model_id,
+                'result': response,
+                'completed_at': datetime.now().isoformat()
+            }
+        except Exception as e:
+            return {
+                'key': key,
+                'success': False,
+                'model_id': model_id,
+                'result': f"Error: {str(e)}",
+                'completed_at': datetime.now().isoformat()
+            }
+
+    def run(self, job_id: str, write_back: Optional[Callable[[List[Dict]], Any]] = None,
+            write_back_size: int = 500, retry_failed: bool = True) -> BatchJobState:
+        """
+        Run (or resume) a job with bounded concurrency.
+
+        Items that already succeeded are skipped, so calling run again after a
+        crash or restart continues where the job stopped. Results are appended to
+        results.jsonl as they complete and handed to write_back in chunks.
+        """
+        state = self.get_job(job_id)
+        if state is None:
+            raise ValueError(f"Job not found: {job_id}")
+
+        previous = self._load_results(job_id)
+        done_keys = {key for key, entry in previous.items() if entry['success'] or not retry_failed}
+        # Items handed to a provider batch API are collected by poll_provider_batches
+        done_keys.update(self._pending_batch_keys(state))
+        state.completed = sum(1 for entry in previous.values() if entry['success'])
+        state.failed = 0
+        state.status = "running"
+        self.save_state(state)
+
+        write_back = write_back or self.default_write_back(state.job_type)
+        buffer: List[Dict] = []
+        processed = 0
+        started = time.time()
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="batch") as executor, \
+                open(self._path(job_id, "results.jsonl"), 'a') as results_file:
+
+            def record(entry):
+                nonlocal processed
+                results_file.write(json.dumps(entry, default=str) + "\n")
+                processed += 1
+                if entry['success']:
+                    state.completed += 1
+                    buffer.append(entry)
+                else:
+                    state.failed += 1
+
+                if processed % self.checkpoint_every == 0:
+                    results_file.flush()
+                    os.fsync(results_file.fileno())
+                    state.items_per_second = processed / max(time.time() - started, 1e-6)
+                    self.save_state(state)
+
+                if write_back and len(buffer) >= write_back_size:
+                    write_back(list(buffer))
+                    buffer.clear()
+
+            in_flight = {}
+            try:
+                for key, item in self._iter_items(job_id):
+                    if key in done_keys:
+                        continue
+                    # Keep a bounded window of submitted work so memory stays flat
+                    if len(in_flight) >= self.concurrency * 2:
+                        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            in_flight.pop(future)
+                            record(future.result())
+                    in_flight[executor.submit(self._process_item, state.job_type, key, item)] = key
+
+                for future in list(in_flight):
+                    record(future.result())
+                    in_flight.pop(future)
+            except BaseException as e:
+                state.status = "failed"
+                state.last_error = str(e)
+                results_file.flush()
+                self.save_state(state)
+                raise
+
+            results_file.flush()
+            os.fsync(results_file.fileno())
+
+        if write_back and buffer:
+            write_back(list(buffer))
+
+        state.items_per_second = processed / max(time.time() - started, 1e-6)
+        if self._pending_batch_keys(state):
+            state.status = "waiting_on_provider"
+        else:
+            state.status = "completed"
+            state.finished_at = datetime.now().isoformat()
+        self.save_state(state)
+        return state
+
+    @staticmethod
+    def _pending_batch_keys(state: BatchJobState) -> set:
+        keys = set()
+        for batch in state.provider_batches.values():
+            if batch['status'] != 'collected':
+                keys.update(batch['custom_ids'].values())
+        return keys
+
+    def default_write_back(self, job_type: str) -> Optional[Callable[[List[Dict]], Any]]:
+        """Bulk database write-back used when the caller does not supply one
+
+        Each item gets a conversation row plus an assistant message holding
+        the model's response, so the output lands in the database and not
+        only in results.jsonl.
+        """
+        if job_type not in JOB_CONVERSATIONS:
+            return None
+        prefix, title = JOB_CONVERSATIONS[job_type]
+
+        def save_results(entries):
+            if not entries:
+                return
+            db = self.framing_ai.db
+            db.save_conversations_bulk([
+                {'id': f"{prefix}_{entry['key']}", 'title': f"{title} - {entry['key']}"}
+                for entry in entries
+            ])
+            db.save_messages_bulk([
+                {
+                    'id': f"{prefix}_{entry['key']}_{job_type}",
+                    'conversation_id': f"{prefix}_{entry['key']}",
+                    'role': 'assistant',
+                    'content': entry['result'],
+                    'model_used': entry.get('model_id'),
+                    'model_id': entry.get('model_id'),
+                }
+                for entry in entries
+            ])
+        return save_results
+
+    # ----- Provider batch APIs -----
+
+    def submit_provider_batches(self, job_id: str) -> BatchJobState:
+        """
+        Submit pending items to provider batch APIs (OpenAI Batch, Anthropic Message Batches).
+
+        Items for providers without a batch API are left for `run`. Use
+        `poll_provider_batches` to collect results once the provider finishes.
+        """
+        state = self.get_job(job_id)
+        if state is None:
+            raise ValueError(f"Job not found: {job_id}")
+
+        done_keys = {key for key, entry in self._load_results(job_id).items() if entry['success']}
+        done_keys.update(self._pending_batch_keys(state))
+        groups: Dict[str, List[Tuple[str, str, List[Dict]]]] = {}
+        for index, (key, item) in enumerate(self._iter_items(job_id)):
+            if key in done_keys:
+                continue
+            model_id, messages = JOB_TYPES[state.job_type](self.framing_ai, item)
+            groups.setdefault(model_id, []).append((f"item-{index}", key, messages))
+
+        for model_id, requests in groups.items():
+            provider = self.framing_ai.model_handler.get_model_info(model_id).get("provider")
+            if provider == "openai":
+                batch_id = self._submit_openai_batch(model_id, requests)
+            elif provider == "anthropic":
+                batch_id = self._submit_anthropic_batch(model_id, requests)
+            else:
+                continue
+            state.provider_batches[batch_id] = {
+                'provider': provider,
+                'model_id': model_id,
+                'status': 'submitted',
+                'custom_ids': {custom_id: key for custom_id, key, _ in requests}
+            }
+
+        state.mode = "provider_batch"
+        state.status = "waiting_on_provider" if state.provider_batches else state.status
+        self.save_state(state)
+        return state
+
+    def _submit_openai_batch(self, model_id: str, requests: List[Tuple[str, str, List[Dict]]]) -> str:
+        import openai
+        client = openai.OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+        lines = io.BytesIO()
+        for custom_id, _, messages in requests:
+            lines.write((json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {"model": model_id, "messages": messages, "temperature": 0.7}
+            }) + "\n").encode("utf-8"))
+        batch_file = client.files.create(file=("batch.jsonl", lines.getvalue()), purpose="batch")
+        batch = client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        return batch.id
+
+    def _submit_anthropic_batch(self, model_id: str, requests: List[Tuple[str, str, List[Dict]]]) -> str:
+        from anthropic import Anthropic
+        client = Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
+        batch_requests = []
+        for custom_id, _, messages in requests:
+            system = "\n".join(m["content"] for m in messages if m["role"] == "system")
+            params = {
+                "model": model_id,
+                "max_tokens": 1000,
+                "messages": [{"role": m["role"], "content": m["content"]} for m in messages if m["role"] != "system"]
+            }
+            if system:
+                params["system"] = system
+            batch_requests.append({"custom_id": custom_id, "params": params})
+        batch = client.messages.batches.create(requests=batch_requests)
+        return batch.id
+
+    def poll_provider_batches(self, job_id: str,
+                              write_back: Optional[Callable[[List[Dict]], Any]] = None) -> BatchJobState:
+        """Collect results of finished provider batches into the job's results"""
+        state = self.get_job(job_id)
+        if state is None:
+            raise ValueError(f"Job not found: {job_id}")
+
+        write_back = write_back or self.default_write_back(state.job_type)
+        for batch_id, batch in state.provider_batches.items():
+            if batch['status'] == 'collected':
+                continue
+            if batch['provider'] == 'openai':
+                entries = self._collect_openai_batch(batch_id, batch)
+            else:
+                entries = self._collect_anthropic_batch(batch_id, batch)
+            if entries is None:
+                continue  # Still processing
+
+            with open(self._path(job_id, "results.jsonl"), 'a') as results_file:
+                for entry in entries:
+                    results_file.write(json.dumps(entry, default=str) + "\n")
+                    # Batch APIs bill at a discount; list price is tracked as an upper bound
+                    model_usage_tracker.track_usage(
+                        batch['model_id'], entry.pop('input_tokens', 0), entry.pop('output_tokens', 0), entry['success']
+                    )
+            if write_back:
+                write_back([entry for entry in entries if entry['success']])
+            batch['status'] = 'collected'
+
+        results = self._load_results(job_id)
+        state.completed = sum(1 for entry in results.values() if entry['success'])
+        state.failed = sum(1 for entry in results.values() if not entry['success'])
+        if all(batch['status'] == 'collected' for batch in state.provider_batches.values()):
+            state.status = "completed" if state.completed + state.failed >= state.total_items else "pending"
+            state.finished_at = datetime.now().isoformat()
+        self.save_state(state)
+        return state
+
+    def _collect_openai_batch(self, batch_id: str, batch: Dict) -> Optional[List[Dict]]:
+        import openai
+        client = openai.OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+        remote = client.batches.retrieve(batch_id)
+        batch['status'] = remote.status
+        if remote.status not in ("completed", "failed", "expired", "cancelled"):
+            return None
+
+        entries = []
+        if remote.output_file_id:
+            for line in client.files.content(remote.output_file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                row = json.loads(line)
+                body = (row.get("response") or {}).get("body") or {}
+                usage = body.get("usage") or {}
+                choices = body.get("choices") or []
+                entries.append({
+                    'key': batch['custom_ids'].get(row["custom_id"], row["custom_id"]),
+                    'success': bool(choices) and not row.get("error"),
+                    'model_id': batch['model_id'],
+                    'result': choices[0]["message"]["content"] if choices else f"Error: {row.get('error')}",
+                    'completed_at': datetime.now().isoformat(),
+                    'input_tokens': usage.get("prompt_tokens", 0),
+                    'output_tokens': usage.get("completion_tokens", 0)
+                })
+        return entries
+
+    def _collect_anthropic_batch(self, batch_id: str, batch: Dict) -> Optional[List[Dict]]:
+        from anthropic import Anthropic
+        client = Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
+        remote = client.messages.batches.retrieve(batch_id)
+        batch['status'] = remote.processing_status
+        if remote.processing_status != "ended":
+            return None
+
+        entries = []
+        for row in client.messages.batches.results(batch_id):
+            succeeded = row.result.type == "succeeded"
+            message = row.result.message if succeeded else None
+            entries.append({
+                'key': batch['custom_ids'].get(row.custom_id, row.custom_id),
+                'success': succeeded,
+                'model_id': batch['model_id'],
+                'result': message.content[0].text if succeeded else f"Error: {row.result.type}",
+                'completed_at': datetime.now().isoformat(),
+                'input_tokens': message.usage.input_tokens if succeeded else 0,
+                'output_tokens': message.usage.output_tokens if succeeded else 0
+            })
+        return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run FramingBusinessAI batch jobs")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Create and run a new job")
+    run_parser.add_argument("job_type", choices=list(JOB_TYPES))
+    run_parser.add_argument("source", help="Item file (.jsonl, .json or .csv) or a SQL query with --query")
+    run_parser.add_argument("--query", action="store_true", help="Treat source as a SQL query")
+    run_parser.add_argument("--provider-batch", action="store_true", help="Use provider batch APIs where available")
+    run_parser.add_argument("--concurrency", type=int, default=16)
+    run_parser.add_argument("--job-id")
+
+    resume_parser = subparsers.add_parser("resume", help="Resume an interrupted job")
+    resume_parser.add_argument("job_id")
+    resume_parser.add_argument("--concurrency", type=int, default=16)
+
+    poll_parser = subparsers.add_parser("poll", help="Collect finished provider batches")
+    poll_parser.add_argument("job_id")
+
+    status_parser = subparsers.add_parser("status", help="Show job status")
+    status_parser.add_argument("job_id")
+
+    args = parser.parse_args()
+    runner = BatchJobRunner(concurrency=getattr(args, "concurrency", 16))
+
+    if args.command == "run":
+        items = runner.load_items_from_query(args.source) if args.query else runner.load_items(args.source)
+        state = runner.create_job(args.job_type, items, source=args.source, job_id=args.job_id)
+        print(f"Created job {state.job_id} with {state.total_items} items")
+        if args.provider_batch:
+            runner.submit_provider_batches(state.job_id)
+        # Runs everything not handed to a provider batch API
+        state = runner.run(state.job_id)
+    elif args.command == "resume":
+        state = runner.run(args.job_id)
+    elif args.command == "poll":
+        state = runner.poll_provider_batches(args.job_id)
+    else:
+        state = runner.get_job(args.job_id)
+
+    print(json.dumps(asdict(state) if state else {"error": "Job not found"}, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,7 @@ import pyttsx3
 from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
 import streamlit as st
+from production_scheduler import ProductionScheduler
 
 class BusinessAssistantFeatures:
     """
@@ -127,29 +128,31 @@ class BusinessAssistantFeatures:
         except Exception as e:
             return {"success": False, "error": str(e)}
     
-    def create_task_schedule(self, tasks, priority_weights=None):
+    def create_task_schedule(self, tasks, priority_weights=None, buffer_minutes=15):
         """Create an optimized schedule for tasks based on priority and deadlines"""
         if not priority_weights:
             priority_weights = {"high": 3, "medium": 2, "low": 1}
         
-        # Sort tasks by priority and deadline
-        sorted_tasks = sorted(tasks, key=lambda x: (
-            -priority_weights.get(x.get('priority', 'medium'), 2),
-            x.get('deadline', datetime.max)
-        ))
+        # Same deadline-aware ordering as the production scheduler: deadlines of
+        # higher-priority tasks are pulled forward instead of priority always winning
+        scheduler = ProductionScheduler(priority_weights=priority_weights)
+        sorted_tasks = sorted(tasks, key=scheduler.sort_key)
         
         schedule = []
         current_time = datetime.now()
         
         for task in sorted_tasks:
             estimated_duration = task.get('estimated_hours', 1)
+            scheduled_end = current_time + timedelta(hours=estimated_duration)
+            deadline = task.get('deadline')
             schedule.append({
                 "task": task,
                 "scheduled_start": current_time,
-                "scheduled_end": current_time + timedelta(hours=estimated_duration),
-                "priority_score": priority_weights.get(task.get('priority', 'medium'), 2)
+                "scheduled_end": scheduled_end,
+                "priority_score": priority_weights.get(task.get('priority', 'medium'), 2),
+                "late": isinstance(deadline, datetime) and scheduled_end > deadline
             })
-            current_time += timedelta(hours=estimated_duration, minutes=15)  # 15-min buffer
+            current_time = scheduled_end + timedelta(minutes=buffer_minutes)
         
         return schedule
     
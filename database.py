@@ -1,10 +1,13 @@
 import os
 import json
+import time
 from datetime import datetime
-from sqlalchemy import create_engine, Column, String, DateTime, Text, Integer, Boolean, Float
+from sqlalchemy import create_engine, event, Column, String, DateTime, Text, Integer, Boolean, Float
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.dialects.postgresql import JSON
+from metrics import DB_QUERY_SECONDS, metrics
+from tracing import tracer
 
 # Database configuration with fallback
 DATABASE_URL = os.environ.get('DATABASE_URL')
@@ -26,6 +29,37 @@ else:
     engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def _operation(statement):
+    return statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "UNKNOWN"
+
+# Statement latency (and a trace span) for every DatabaseManager query, labelled by SQL verb
+@event.listens_for(engine, "before_cursor_execute")
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    span = tracer.start_span("db.query", operation=_operation(statement), statement=statement[:200])
+    conn.info.setdefault('query_start_time', []).append((time.perf_counter(), span))
+
+@event.listens_for(engine, "after_cursor_execute")
+def _record_query_time(conn, cursor, statement, parameters, context, executemany):
+    start, span = conn.info['query_start_time'].pop()
+    DB_QUERY_SECONDS.observe(time.perf_counter() - start, operation=_operation(statement))
+    span.end()
+
+@event.listens_for(engine, "handle_error")
+def _discard_query_timer(exception_context):
+    starts = exception_context.connection.info.get('query_start_time') if exception_context.connection else None
+    if starts:
+        _, span = starts.pop()
+        span.record_error(exception_context.original_exception)
+        span.end()
+
+def _collect_pool():
+    checked_out = getattr(engine.pool, 'checkedout', None)
+    if checked_out:
+        metrics.gauge('db_pool_checked_out', 'Database connections currently checked out').set(checked_out())
+
+metrics.register_collector(_collect_pool)
+
 Base = declarative_base()
 
 class User(Base):
@@ -90,6 +124,15 @@ class ModelRecommendation(Base):
     user_accepted = Column(Boolean, nullable=True)
     timestamp = Column(DateTime, default=datetime.utcnow)
 
+class AuthSession(Base):
+    __tablename__ = "auth_sessions"
+    
+    id = Column(String, primary_key=True)  # Token jti
+    user_id = Column(String, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime)
+    revoked_at = Column(DateTime, nullable=True, index=True)
+
 def create_tables():
     """Create all database tables"""
     Base.metadata.create_all(bind=engine)
@@ -141,6 +184,63 @@ class DatabaseManager:
         finally:
             session.close()
     
+    def save_conversations_bulk(self, conversations):
+        """Save or update many conversations in a single transaction
+        
+        conversations: list of dicts with 'id' and optional 'user_id' and 'title'
+        """
+        session = self.get_session()
+        try:
+            for data in conversations:
+                session.merge(Conversation(
+                    id=data['id'],
+                    user_id=data.get('user_id'),
+                    title=data.get('title', "New Conversation"),
+                    updated_at=datetime.utcnow()
+                ))
+            session.commit()
+            return len(conversations)
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+    
+    def save_messages_bulk(self, messages):
+        """Save or update many messages in a single transaction
+
+        messages: list of dicts with 'id', 'conversation_id', 'role', 'content'
+        and optional 'model_used', 'model_id', 'token_count', 'response_time'
+        """
+        session = self.get_session()
+        try:
+            for data in messages:
+                session.merge(Message(
+                    id=data['id'],
+                    conversation_id=data['conversation_id'],
+                    role=data['role'],
+                    content=data['content'],
+                    model_used=data.get('model_used'),
+                    model_id=data.get('model_id'),
+                    mcp_context=data.get('mcp_context'),
+                    token_count=data.get('token_count'),
+                    response_time=data.get('response_time')
+                ))
+            session.commit()
+            return len(messages)
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+
+    def run_query(self, sql, params=None):
+        """Run a read-only SQL query and return the rows as dicts"""
+        from sqlalchemy import text
+        with self.engine.connect() as connection:
+            result = connection.execute(text(sql), params or {})
+            return [dict(row._mapping) for row in result]
+    
     def save_message(self, message_id, conversation_id, role, content, 
                     model_used=None, model_id=None, mcp_context=None, 
                     token_count=None, response_time=None):
@@ -237,13 +337,13 @@ class DatabaseManager:
             session.close()
     
     def save_recommendation(self, user_id, task_description, recommended_model, 
-                          explanation, alternative_models, user_accepted=None):
+                          explanation, alternative_models, user_accepted=None, recommendation_id=None):
         """Save model recommendation data"""
         session = self.get_session()
         try:
             import uuid
             recommendation = ModelRecommendation(
-                id=str(uuid.uuid4()),
+                id=recommendation_id or str(uuid.uuid4()),
                 user_id=user_id,
                 task_description=task_description,
                 recommended_model=recommended_model,
@@ -260,6 +360,42 @@ class DatabaseManager:
         finally:
             session.close()
     
+    def update_recommendation_feedback(self, recommendation_id, user_accepted):
+        """Record whether the user accepted a recommendation"""
+        session = self.get_session()
+        try:
+            recommendation = session.query(ModelRecommendation).filter(
+                ModelRecommendation.id == recommendation_id
+            ).first()
+            
+            if recommendation:
+                recommendation.user_accepted = user_accepted
+                session.commit()
+            return recommendation is not None
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+    
+    def get_recommendation_training_data(self):
+        """Get stored recommendations as training examples for the local recommender"""
+        session = self.get_session()
+        try:
+            rows = session.query(
+                ModelRecommendation.task_description,
+                ModelRecommendation.recommended_model,
+                ModelRecommendation.user_accepted
+            ).all()
+            
+            return [{
+                'task_description': row.task_description,
+                'recommended_model': row.recommended_model,
+                'user_accepted': row.user_accepted
+            } for row in rows if row.task_description and row.recommended_model]
+        finally:
+            session.close()
+    
     def get_model_analytics(self, user_id=None, days=30):
         """Get model usage analytics"""
         session = self.get_session()
@@ -306,4 +442,76 @@ class DatabaseManager:
             
             return stats
         finally:
-            session.close()
\ No newline at end of file
+            session.close()
+    
+    def get_model_usage_records(self, days=30):
+        """Get raw model usage rows (oldest first) for offline replay"""
+        session = self.get_session()
+        try:
+            from datetime import timedelta
+            cutoff_date = datetime.utcnow() - timedelta(days=days)
+            
+            usage_data = session.query(ModelUsage).filter(
+                ModelUsage.timestamp >= cutoff_date
+            ).order_by(ModelUsage.timestamp).all()
+            
+            return [{
+                'model_id': usage.model_id,
+                'task_type': usage.task_type or 'general',
+                'response_time': usage.response_time,
+                'success': usage.success,
+                'input_tokens': (usage.tokens_used or 1000) // 2,
+                'output_tokens': (usage.tokens_used or 1000) // 2,
+                'timestamp': usage.timestamp.isoformat()
+            } for usage in usage_data]
+        finally:
+            session.close()
+    
+    def create_auth_session(self, session_id, user_id, expires_at):
+        """Record a login session so it can be revoked from any worker"""
+        session = self.get_session()
+        try:
+            session.add(AuthSession(id=session_id, user_id=user_id, expires_at=expires_at))
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+    
+    def is_auth_session_active(self, session_id):
+        """True if the session exists, is not revoked and has not expired"""
+        session = self.get_session()
+        try:
+            auth_session = session.query(AuthSession).filter(AuthSession.id == session_id).first()
+            return bool(auth_session and auth_session.revoked_at is None
+                        and auth_session.expires_at > datetime.utcnow())
+        finally:
+            session.close()
+    
+    def revoke_auth_sessions(self, session_id=None, user_id=None):
+        """Revoke one session, or every active session of a user; returns the number revoked"""
+        session = self.get_session()
+        try:
+            query = session.query(AuthSession).filter(AuthSession.revoked_at.is_(None))
+            if session_id:
+                query = query.filter(AuthSession.id == session_id)
+            if user_id:
+                query = query.filter(AuthSession.user_id == user_id)
+            revoked = query.update({AuthSession.revoked_at: datetime.utcnow()}, synchronize_session=False)
+            session.commit()
+            return revoked
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+    
+    def get_revoked_auth_sessions(self, since):
+        """Ids of sessions revoked at or after since (UTC)"""
+        session = self.get_session()
+        try:
+            rows = session.query(AuthSession.id).filter(AuthSession.revoked_at >= since).all()
+            return [row.id for row in rows]
+        finally:
+            session.close()
@@ -0,0 +1,259 @@
+"""
+Local retrieval over uploaded files (BM25)
+
+Uploaded text, CSV, JSON and PDF files are streamed into chunks, indexed with
+BM25 and persisted per conversation under conversation_history/rag/. Each turn,
+only the top-k chunks relevant to the latest user message are added to the
+prompt, so large documents can be used without sending them to the model.
+"""
+
+import os
+import re
+import csv
+import json
+import math
+import hashlib
+import threading
+from collections import Counter
+from itertools import islice
+from typing import Any, Dict, List, Optional
+
+from file_ingestion import file_ingestor
+from utils import get_history_dir
+
+try:
+    from pypdf import PdfReader
+except ImportError:
+    # PDF uploads are noted but not indexed without pypdf
+    PdfReader = None
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[._-][a-z0-9]+)*")
+STOP_WORDS = frozenset(
+    "a an and are as at be but by for from has have i in is it its of on or that the this to was were "
+    "will with what which who how can do does you your we our they their me my".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOP_WORDS]
+
+
+class DocumentIndex:
+    """BM25 index over the chunks of one conversation's uploaded files"""
+
+    def __init__(self, path: Optional[str] = None, chunk_chars: int = 1200, overlap_chars: int = 150,
+                 csv_rows_per_chunk: int = 25, max_chunks: int = 20000, k1: float = 1.5, b: float = 0.75):
+        self.path = path
+        self.chunk_chars = chunk_chars
+        self.overlap_chars = overlap_chars
+        self.csv_rows_per_chunk = csv_rows_per_chunk
+        self.max_chunks = max_chunks
+        self.k1 = k1
+        self.b = b
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.chunks: List[Dict[str, Any]] = []
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.lengths: List[int] = []
+        self.total_length = 0
+        self._lock = threading.RLock()
+        if path and os.path.exists(path):
+            self._load()
+
+    # Chunking
+
+    def _split_text(self, text_stream) -> List[str]:
+        """Fixed-size chunks with overlap, cut at whitespace where possible"""
+        chunks, buffer = [], ''
+        for piece in iter(lambda: text_stream.read(self.chunk_chars), ''):
+            buffer += piece
+            while len(buffer) >= self.chunk_chars:
+                cut = buffer.rfind(' ', self.chunk_chars // 2, self.chunk_chars)
+                cut = cut if cut > 0 else self.chunk_chars
+                chunks.append(buffer[:cut].strip())
+                buffer = buffer[max(0, cut - self.overlap_chars):]
+                if len(chunks) >= self.max_chunks:
+                    return chunks
+        if buffer.strip():
+            chunks.append(buffer.strip())
+        return chunks
+
+    def _chunk_csv(self, text_stream) -> List[str]:
+        """Groups of rows, each prefixed with the header so chunks stand alone"""
+        reader = csv.reader(text_stream)
+        header = next(reader, [])
+        chunks = []
+        for block in iter(lambda: list(islice(reader, self.csv_rows_per_chunk)), []):
+            lines = [', '.join(header)] + [', '.join(row) for row in block]
+            chunks.append('\n'.join(lines))
+            if len(chunks) >= self.max_chunks:
+                break
+        return chunks
+
+    def _chunk_json(self, text_stream) -> List[str]:
+        """Consecutive elements or members, serialized, up to chunk_chars per chunk"""
+        chunks, current = [], []
+        size = 0
+        try:
+            for key, value in file_ingestor.iter_json(text_stream):
+                item = json.dumps({key: value} if key is not None else value, default=str)
+                if current and size + len(item) > self.chunk_chars:
+                    chunks.append('\n'.join(current))
+                    current, size = [], 0
+                    if len(chunks) >= self.max_chunks:
+                        return chunks
+                current.append(item[:self.chunk_chars * 4])
+                size += len(item)
+        except ValueError as e:
+            # Keep what was decoded before the malformed part
+            print(f"JSON chunking stopped early: {e}")
+        if current:
+            chunks.append('\n'.join(current))
+        return chunks
+
+    def _chunk_pdf(self, file) -> List[str]:
+        chunks = []
+        for page_number, page in enumerate(PdfReader(file).pages, start=1):
+            text = page.extract_text() or ''
+            for start in range(0, len(text), self.chunk_chars - self.overlap_chars):
+                piece = text[start:start + self.chunk_chars].strip()
+                if piece:
+                    chunks.append(f"[page {page_number}] {piece}")
+            if len(chunks) >= self.max_chunks:
+                break
+        return chunks
+
+    @staticmethod
+    def fingerprint(file) -> str:
+        """Name, size and the first/last 64 KB: identifies an upload across reruns cheaply"""
+        digest = hashlib.sha1(file.name.encode())
+        file.seek(0, os.SEEK_END)
+        size = file.tell()
+        digest.update(str(size).encode())
+        file.seek(0)
+        digest.update(file.read(64 * 1024))
+        file.seek(max(0, size - 64 * 1024))
+        digest.update(file.read(64 * 1024))
+        file.seek(0)
+        return digest.hexdigest()
+
+    def add_file(self, file) -> int:
+        """Chunk and index an uploaded file; returns the number of new chunks (0 if already indexed)"""
+        file_id = self.fingerprint(file)
+        with self._lock:
+            if file_id in self.files:
+                return 0
+
+        file_name = file.name
+        file_type = getattr(file, 'type', '') or ''
+        try:
+            if file_name.lower().endswith('.pdf'):
+                chunks = self._chunk_pdf(file) if PdfReader else []
+            elif file_name.endswith('.csv') or file_name.endswith('.json') or \
+                    file_type.startswith('text/') or file_name.endswith('.txt'):
+                with file_ingestor.open_text(file) as (text, _):
+                    if file_name.endswith('.csv'):
+                        chunks = self._chunk_csv(text)
+                    elif file_name.endswith('.json'):
+                        chunks = self._chunk_json(text)
+                    else:
+                        chunks = self._split_text(text)
+            else:
+                chunks = []
+        finally:
+            file.seek(0)
+
+        with self._lock:
+            room = max(0, self.max_chunks - len(self.chunks))
+            for part, text in enumerate(chunks[:room], start=1):
+                self._index_chunk({'source': file_name, 'part': part, 'text': text})
+            self.files[file_id] = {'name': file_name, 'chunks': min(len(chunks), room)}
+            self._save()
+        return min(len(chunks), room)
+
+    def add_files(self, files) -> int:
+        return sum(self.add_file(file) for file in files)
+
+    def _index_chunk(self, chunk: Dict[str, Any]):
+        chunk_id = len(self.chunks)
+        counts = Counter(tokenize(chunk['text']))
+        self.chunks.append(chunk)
+        length = sum(counts.values())
+        self.lengths.append(length)
+        self.total_length += length
+        for term, count in counts.items():
+            self.postings.setdefault(term, {})[chunk_id] = count
+
+    # Retrieval
+
+    def search(self, query: str, top_k: int = 4) -> List[Dict[str, Any]]:
+        """Top-k chunks by BM25 score; only chunks sharing a query term are scored"""
+        with self._lock:
+            if not self.chunks:
+                return []
+            count = len(self.chunks)
+            average_length = self.total_length / count or 1.0
+            scores: Dict[int, float] = {}
+            for term in set(tokenize(query)):
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for chunk_id, frequency in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.lengths[chunk_id] / average_length)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+            best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+            return [dict(self.chunks[chunk_id], score=round(score, 3)) for chunk_id, score in best]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'files': [dict(info) for info in self.files.values()],
+                'chunks': len(self.chunks),
+                'terms': len(self.postings)
+            }
+
+    # Persistence (chunks are stored; postings are rebuilt on load)
+
+    def _save(self):
+        if not self.path:
+            return
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'files': self.files, 'chunks': self.chunks}, f)
+        os.replace(tmp_path, self.path)
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error loading document index {self.path}: {e}")
+            return
+        self.files = data.get('files', {})
+        for chunk in data.get('chunks', []):
+            self._index_chunk(chunk)
+
+
+_indexes: Dict[str, DocumentIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_document_index(conversation_id: str) -> DocumentIndex:
+    """Shared per-conversation index, loaded from disk on first use"""
+    with _indexes_lock:
+        index = _indexes.get(conversation_id)
+        if index is None:
+            directory = os.path.join(get_history_dir(), "rag")
+            os.makedirs(directory, exist_ok=True)
+            safe_id = re.sub(r'[^A-Za-z0-9_.-]', '_', conversation_id)
+            index = _indexes[conversation_id] = DocumentIndex(os.path.join(directory, f"{safe_id}.json"))
+        return index
+
+
+def has_document_index(conversation_id: str) -> bool:
+    """True if the conversation has indexed files (without creating an index)"""
+    with _indexes_lock:
+        if conversation_id in _indexes:
+            return bool(_indexes[conversation_id].chunks)
+    safe_id = re.sub(r'[^A-Za-z0-9_.-]', '_', conversation_id)
+    return os.path.exists(os.path.join(get_history_dir(), "rag", f"{safe_id}.json"))
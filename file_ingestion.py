@@ -0,0 +1,374 @@
+"""
+Streaming summaries of uploaded files for model context
+
+Uploads are read in fixed-size chunks up to a byte cap, so memory use does not
+depend on file size. CSV rows are read one at a time. JSON arrays and objects
+are decoded one element at a time. Column/key statistics come from the same
+single pass, along with the first rows and a reservoir sample of the rest.
+"""
+
+import io
+import csv
+import json
+import math
+import random
+from itertools import islice
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+CHUNK_SIZE = 64 * 1024
+CSV_BLOCK_ROWS = 4096
+NUMERIC_START = set('0123456789+-.')
+
+
+class _CappedReader(io.RawIOBase):
+    """Read-only view over a file object that stops after max_bytes"""
+
+    def __init__(self, file, max_bytes: int):
+        self.file = file
+        self.remaining = max_bytes
+        self.bytes_read = 0
+        self.truncated = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.remaining <= 0:
+            # Only call it truncated if there really was more to read
+            self.truncated = self.truncated or bool(self.file.read(1))
+            return 0
+        data = self.file.read(min(len(buffer), self.remaining))
+        buffer[:len(data)] = data
+        self.remaining -= len(data)
+        self.bytes_read += len(data)
+        return len(data)
+
+
+class ColumnStats:
+    """Single-pass statistics for one CSV column or JSON field"""
+
+    def __init__(self, max_distinct: int):
+        self.max_distinct = max_distinct
+        self.count = 0
+        self.empty = 0
+        self.numeric = 0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self.total = 0.0
+        self.types = {}
+        self.distinct = set()
+        self.distinct_overflow = False
+
+    def add(self, value: Any):
+        self.count += 1
+        if value is None or value == '':
+            self.empty += 1
+            return
+        type_name = type(value).__name__
+        self.types[type_name] = self.types.get(type_name, 0) + 1
+
+        number = None
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            number = float(value)
+        elif isinstance(value, str):
+            try:
+                number = float(value)
+            except ValueError:
+                pass
+        if number is not None and math.isfinite(number):
+            self.numeric += 1
+            self.minimum = min(self.minimum, number)
+            self.maximum = max(self.maximum, number)
+            self.total += number
+
+        if not self.distinct_overflow and isinstance(value, (str, int, float, bool)):
+            self.distinct.add(value)
+            if len(self.distinct) > self.max_distinct:
+                self.distinct.clear()
+                self.distinct_overflow = True
+
+    def add_texts(self, values: Tuple[str, ...]):
+        """Add a block of CSV cells (always strings) at once"""
+        present = [value for value in values if value]
+        self.count += len(values)
+        self.empty += len(values) - len(present)
+        if not present:
+            return
+        self.types['str'] = self.types.get('str', 0) + len(present)
+
+        try:
+            numbers = list(map(float, present))
+        except ValueError:
+            # Mixed or text column: only cells that look numeric are parsed
+            numbers = []
+            for value in present:
+                if value[0] in NUMERIC_START:
+                    try:
+                        numbers.append(float(value))
+                    except ValueError:
+                        pass
+        numbers = [number for number in numbers if math.isfinite(number)]
+        if numbers:
+            self.numeric += len(numbers)
+            self.minimum = min(self.minimum, min(numbers))
+            self.maximum = max(self.maximum, max(numbers))
+            self.total += math.fsum(numbers)
+
+        if not self.distinct_overflow:
+            self.distinct.update(present)
+            if len(self.distinct) > self.max_distinct:
+                self.distinct.clear()
+                self.distinct_overflow = True
+
+    def to_dict(self) -> Dict[str, Any]:
+        present = self.count - self.empty
+        summary = {
+            'type': 'numeric' if present and self.numeric == present else
+                    (max(self.types, key=self.types.get) if self.types else 'empty'),
+            'non_empty': present,
+            'distinct': f"{self.max_distinct}+" if self.distinct_overflow else len(self.distinct)
+        }
+        if self.numeric:
+            summary.update({
+                'min': self.minimum,
+                'max': self.maximum,
+                'mean': round(self.total / self.numeric, 4)
+            })
+        return summary
+
+
+class FileIngestor:
+    """Memory-bounded summaries of uploaded text, CSV and JSON files"""
+
+    def __init__(self, max_scan_bytes: int = 64 * 1024 * 1024, head_rows: int = 10, sample_rows: int = 5,
+                 text_chars: int = 2000, max_columns: int = 50, max_distinct: int = 50,
+                 max_element_bytes: int = 1024 * 1024, preview_chars: int = 500, seed: int = 0):
+        self.max_scan_bytes = max_scan_bytes
+        self.head_rows = head_rows
+        self.sample_rows = sample_rows
+        self.text_chars = text_chars
+        self.max_columns = max_columns
+        self.max_distinct = max_distinct
+        self.max_element_bytes = max_element_bytes
+        self.preview_chars = preview_chars
+        self.seed = seed
+
+    @contextmanager
+    def open_text(self, file) -> Iterator[Tuple[io.TextIOWrapper, _CappedReader]]:
+        """Text stream over the upload that never closes the underlying file"""
+        raw = _CappedReader(file, self.max_scan_bytes)
+        text = io.TextIOWrapper(io.BufferedReader(raw, CHUNK_SIZE), encoding='utf-8', errors='replace', newline='')
+        try:
+            yield text, raw
+        finally:
+            text.detach()
+
+    def _sampler(self):
+        """Keep the first head_rows items plus a uniform reservoir sample of the rest"""
+        rng = random.Random(self.seed)
+        head, reservoir = [], []
+        seen = 0
+
+        def add(item):
+            nonlocal seen
+            if len(head) < self.head_rows:
+                head.append(item)
+                return
+            seen += 1
+            if len(reservoir) < self.sample_rows:
+                reservoir.append(item)
+            else:
+                index = int(rng.random() * seen)
+                if index < self.sample_rows:
+                    reservoir[index] = item
+        return head, reservoir, add
+
+    def summarize_text(self, file) -> Dict[str, Any]:
+        with self.open_text(file) as (text, raw):
+            head = text.read(self.text_chars)
+            lines = head.count('\n')
+            for chunk in iter(lambda: text.read(CHUNK_SIZE), ''):
+                lines += chunk.count('\n')
+        return {'kind': 'text', 'head': head, 'lines': lines, 'bytes_scanned': raw.bytes_read,
+                'truncated': raw.truncated}
+
+    def summarize_csv(self, file) -> Dict[str, Any]:
+        with self.open_text(file) as (text, raw):
+            reader = csv.reader(text)
+            header = next(reader, [])
+            columns = [ColumnStats(self.max_distinct) for _ in header[:self.max_columns]]
+            head, reservoir, add = self._sampler()
+            rows = 0
+            # Column statistics are updated a block of rows at a time
+            for block in iter(lambda: list(islice(reader, CSV_BLOCK_ROWS)), []):
+                rows += len(block)
+                for row in block:
+                    add(row)
+                width = len(columns)
+                cells = zip(*(row[:width] + [''] * (width - len(row)) for row in block))
+                for stats, values in zip(columns, cells):
+                    stats.add_texts(values)
+        return {
+            'kind': 'csv',
+            'columns': header,
+            'rows': rows,
+            'column_stats': {name: stats.to_dict() for name, stats in zip(header, columns)},
+            'head': head,
+            'sample': reservoir,
+            'bytes_scanned': raw.bytes_read,
+            'truncated': raw.truncated
+        }
+
+    def iter_json(self, text: io.TextIOWrapper, info: Optional[Dict[str, str]] = None) -> Iterator[Tuple[Optional[str], Any]]:
+        """
+        Yield (key, value) for each member of a top-level JSON object, or
+        (None, element) for each element of a top-level array, decoding one
+        member at a time. Any other top-level value is yielded whole.
+        info['container'] is set to 'object', 'array' or 'value'.
+        """
+        info = info if info is not None else {}
+        decoder = json.JSONDecoder()
+        buffer, position, eof = '', 0, False
+
+        def fill():
+            nonlocal buffer, position, eof
+            chunk = text.read(CHUNK_SIZE)
+            if not chunk:
+                eof = True
+            buffer = buffer[position:] + chunk
+            position = 0
+
+        def skip(characters=' \t\r\n'):
+            nonlocal position
+            while True:
+                while position < len(buffer) and buffer[position] in characters:
+                    position += 1
+                if position < len(buffer) or eof:
+                    return
+                fill()
+
+        def decode():
+            nonlocal position
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buffer, position)
+                    # A number at the end of the buffer may continue in the next chunk
+                    if end < len(buffer) or eof:
+                        position = end
+                        return value
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                if len(buffer) - position > self.max_element_bytes:
+                    raise ValueError(f"JSON element larger than {self.max_element_bytes} bytes")
+                fill()
+
+        skip()
+        if position >= len(buffer):
+            return
+        opener = buffer[position]
+        if opener not in '[{':
+            info['container'] = 'value'
+            yield None, decode()
+            return
+
+        info['container'] = 'array' if opener == '[' else 'object'
+        closer = ']' if opener == '[' else '}'
+        position += 1
+        while True:
+            skip(' \t\r\n,')
+            if position >= len(buffer):
+                raise ValueError("Unexpected end of JSON input")
+            if buffer[position] == closer:
+                return
+            key = None
+            if opener == '{':
+                key = decode()
+                skip(' \t\r\n:')
+            yield key, decode()
+
+    def summarize_json(self, file) -> Dict[str, Any]:
+        with self.open_text(file) as (text, raw):
+            summary: Dict[str, Any] = {'kind': 'json', 'items': 0, 'container': 'value'}
+            fields: Dict[str, ColumnStats] = {}
+            head, reservoir, add = self._sampler()
+            try:
+                for key, value in self.iter_json(text, summary):
+                    summary['items'] += 1
+                    if key is None:
+                        add(value)
+                        if isinstance(value, dict):
+                            for field_name, field_value in value.items():
+                                if field_name in fields or len(fields) < self.max_columns:
+                                    fields.setdefault(field_name, ColumnStats(self.max_distinct)).add(field_value)
+                    else:
+                        if len(fields) < self.max_columns:
+                            fields[key] = ColumnStats(self.max_distinct)
+                            fields[key].add(value)
+                        add({key: value})
+            except (ValueError, json.JSONDecodeError) as e:
+                summary['error'] = str(e)
+        summary.update({
+            'field_stats': {name: stats.to_dict() for name, stats in fields.items()},
+            'head': head,
+            'sample': reservoir,
+            'bytes_scanned': raw.bytes_read,
+            'truncated': raw.truncated
+        })
+        return summary
+
+    def summarize(self, file) -> Dict[str, Any]:
+        """Summary dict for an uploaded file; the file position is reset afterwards"""
+        file_name = file.name
+        file_type = getattr(file, 'type', '') or ''
+        try:
+            if file_name.endswith('.csv'):
+                return self.summarize_csv(file)
+            if file_name.endswith('.json'):
+                return self.summarize_json(file)
+            if file_type.startswith('text/') or file_name.endswith('.txt'):
+                return self.summarize_text(file)
+            return {'kind': 'other'}
+        finally:
+            file.seek(0)
+
+    def _preview(self, value: Any) -> str:
+        text = json.dumps(value, default=str)
+        return text if len(text) <= self.preview_chars else text[:self.preview_chars] + '...'
+
+    def describe(self, file) -> str:
+        """One-line model context for an uploaded file"""
+        file_name = file.name
+        file_type = getattr(file, 'type', '') or ''
+        summary = self.summarize(file)
+        scanned = " (stopped at size cap)" if summary.get('truncated') else ""
+
+        if summary['kind'] == 'text':
+            head = summary['head']
+            return (f"Text file '{file_name}' ({summary['lines']} lines{scanned}): "
+                    f"{head[:self.preview_chars]}{'...' if len(head) > self.preview_chars else ''}")
+        if summary['kind'] == 'csv':
+            return (f"CSV file '{file_name}' with {summary['rows']} data rows{scanned}, "
+                    f"columns: {self._preview(summary['column_stats'])}; "
+                    f"first rows: {self._preview([summary['columns']] + summary['head'])}"
+                    + (f"; random sample: {self._preview(summary['sample'])}" if summary['sample'] else ""))
+        if summary['kind'] == 'json':
+            if summary['container'] == 'value':
+                description = f"JSON file '{file_name}'{scanned}"
+            else:
+                description = (f"JSON {summary['container']} '{file_name}' with {summary['items']} "
+                               f"{'keys' if summary['container'] == 'object' else 'items'}{scanned}")
+            if summary.get('error'):
+                description += f" (parse stopped: {summary['error']})"
+            if summary['field_stats']:
+                description += f", fields: {self._preview(summary['field_stats'])}"
+            return description + f"; first items: {self._preview(summary['head'])}"
+        if file_type.startswith('image/'):
+            if 'screen-capture' in file_name.lower() or 'screenshot' in file_name.lower():
+                return f"Screen capture '{file_name}' ({file_type}) - This appears to be a screenshot that may contain UI elements, applications, or desktop content for analysis"
+            return f"Image file '{file_name}' ({file_type}) uploaded"
+        return f"File '{file_name}' ({file_type}) uploaded"
+
+
+file_ingestor = FileIngestor()
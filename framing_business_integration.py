@@ -4,6 +4,8 @@ from datetime import datetime
 from database import DatabaseManager
 from model_handler import ModelHandler
 from model_recommender import ModelRecommender
+from production_scheduler import ProductionScheduler
+from pricing_engine import pricing_engine
 
 class FramingBusinessAI:
     """
@@ -15,6 +17,8 @@ class FramingBusinessAI:
         self.db = DatabaseManager()
         self.model_handler = ModelHandler()
         self.model_recommender = ModelRecommender()
+        self.production_scheduler = ProductionScheduler()
+        self.pricing_engine = pricing_engine
         
         # Business-specific model routing
         self.business_models = {
@@ -27,11 +31,15 @@ class FramingBusinessAI:
             'inventory_management': 'gpt-4o-mini',  # Quick data processing
             'customer_notifications': 'claude-3-haiku-20240307'  # Fast, friendly messages
         }
+        
+        # Hedging budgets for latency-critical, customer-facing routes
+        self.model_handler.hedge_budget.set_route_budget('customer_notifications', 0.2)
     
-    def process_design_request(self, customer_data, artwork_description, preferences):
+    def process_design_request(self, customer_data, artwork_description, preferences, coalesce=True):
         """
         Handle custom framing design requests
         Routes to Claude 3.5 Sonnet for creative consultation
+        Duplicate in-flight requests share one model call unless coalesce=False
         """
         design_prompt = f"""
         Customer Profile: {customer_data.get('name', 'Customer')}
@@ -51,7 +59,7 @@ class FramingBusinessAI:
         response = self.model_handler.get_response([
             {"role": "system", "content": "You are an expert custom framing consultant with 20+ years experience."},
             {"role": "user", "content": design_prompt}
-        ], model_id)
+        ], model_id, coalesce=coalesce)
         
         # Log to database for tracking
         self.db.log_model_usage(
@@ -63,30 +71,47 @@ class FramingBusinessAI:
         
         return response
     
-    def process_order(self, order_data):
+    def quote_order(self, order_data):
         """
-        Process incoming orders with AI validation and cost calculation
-        Routes to GPT-4o for structured processing
+        Exact price for an order from the local pricing engine (microseconds, no model call)
+        Returns {'valid', 'errors', 'quote', 'budget', 'compute_us'}
         """
+        return self.pricing_engine.quote_order(order_data)
+    
+    def build_order_messages(self, order_data, quote=None):
+        """Build the model ID and messages for order validation; costs come from the pricing engine"""
+        quote = quote or self.quote_order(order_data)
+        # Only the priced result goes in the prompt: timing fields differ on every call
+        # and would defeat response caching and request coalescing
+        prompt_quote = {'quote': quote.get('quote'), 'errors': quote.get('errors', [])}
         order_prompt = f"""
         Order Details: {json.dumps(order_data, indent=2)}
         
-        Validate this framing order and provide:
+        Computed Quote (exact, from the shop price list - do not recalculate):
+        {json.dumps(prompt_quote, indent=2)}
+        
+        Review this framing order and provide:
         1. Order validation (missing information, conflicts)
-        2. Material cost calculation
-        3. Labor time estimate
-        4. Profit margin analysis
-        5. Production priority recommendation
-        6. Suggested upsell opportunities
+        2. Explanation of the quote for the customer
+        3. Production priority recommendation
+        4. Suggested upsell opportunities
         
         Respond in JSON format for integration with POS system.
         """
         
         model_id = self.business_models['order_processing']
-        response = self.model_handler.get_response([
+        return model_id, [
             {"role": "system", "content": "You are an order processing specialist for a custom framing business."},
             {"role": "user", "content": order_prompt}
-        ], model_id)
+        ]
+    
+    def process_order(self, order_data, quote=None):
+        """
+        Process incoming orders with AI validation
+        Pricing is computed locally; GPT-4o-mini only writes the validation narrative
+        """
+        model_id, messages = self.build_order_messages(order_data, quote)
+        response = self.model_handler.get_response(messages, model_id)
         
         # Save to database
         order_id = order_data.get('order_id', 'unknown')
@@ -97,39 +122,53 @@ class FramingBusinessAI:
         
         return response
     
-    def optimize_production_schedule(self, current_orders, workshop_capacity, material_availability):
+    def plan_production_schedule(self, current_orders, workshop_capacity, material_availability):
+        """
+        Deterministic kanban plan from the local scheduler (milliseconds, no model call)
+        """
+        return self.production_scheduler.schedule(current_orders, workshop_capacity, material_availability)
+    
+    def optimize_production_schedule(self, current_orders, workshop_capacity, material_availability, explain=True):
         """
         Optimize production scheduling for the kanban board
-        Routes to Claude 3 Opus for complex scheduling
+        The plan is computed locally; Claude 3 Opus only explains it when explain=True
         """
+        plan = self.plan_production_schedule(current_orders, workshop_capacity, material_availability)
+        if not explain:
+            return plan
+        
+        plan_summary = {
+            'scheduled': [
+                {key: entry[key] for key in ('order_id', 'priority', 'deadline', 'start_date', 'end_date', 'slack_days')}
+                for entry in plan['scheduled']
+            ],
+            'blocked': plan['blocked'],
+            'late_orders': plan['late_orders'],
+            'utilization': round(plan['utilization'], 2)
+        }
         schedule_prompt = f"""
-        Current Orders: {json.dumps(current_orders, indent=2)}
         Workshop Capacity: {workshop_capacity}
-        Material Availability: {json.dumps(material_availability, indent=2)}
+        Production Plan: {json.dumps(plan_summary, indent=2)}
         
-        Create an optimized production schedule considering:
-        1. Order priorities and deadlines
-        2. Material availability constraints
-        3. Workshop capacity and worker skills
-        4. Profit margin optimization
-        5. Customer satisfaction impact
+        This plan was produced by our scheduling engine and is final. Explain it for the
+        workshop team:
+        1. Which orders to start first and why
+        2. Late or blocked orders and what would unblock them (materials, overtime)
+        3. Any capacity risks this week
         
-        Provide kanban board updates and timeline adjustments.
+        Do not change the schedule.
         """
         
         model_id = self.business_models['production_planning']
-        response = self.model_handler.get_response([
+        plan['explanation'] = self.model_handler.get_response([
             {"role": "system", "content": "You are a production planning expert for custom manufacturing."},
             {"role": "user", "content": schedule_prompt}
         ], model_id)
         
-        return response
+        return plan
     
-    def generate_customer_notifications(self, order_status, customer_info):
-        """
-        Generate personalized customer notifications
-        Routes to Claude 3 Haiku for fast, friendly messages
-        """
+    def build_notification_messages(self, order_status, customer_info):
+        """Build the model ID and messages for a customer notification"""
         notification_prompt = f"""
         Customer: {customer_info.get('name')}
         Order: {order_status.get('order_id')}
@@ -146,10 +185,23 @@ class FramingBusinessAI:
         """
         
         model_id = self.business_models['customer_notifications']
-        response = self.model_handler.get_response([
+        return model_id, [
             {"role": "system", "content": "You are a friendly customer service representative for a high-end framing shop."},
             {"role": "user", "content": notification_prompt}
-        ], model_id)
+        ]
+    
+    def generate_customer_notifications(self, order_status, customer_info, hedge=False):
+        """
+        Generate personalized customer notifications
+        Routes to Claude 3 Haiku for fast, friendly messages
+        With hedge=True, a slow response is raced against a cheaper equivalent model
+        """
+        model_id, messages = self.build_notification_messages(order_status, customer_info)
+        
+        if hedge:
+            response = self.model_handler.get_hedged_response(messages, model_id, route='customer_notifications')
+        else:
+            response = self.model_handler.get_response(messages, model_id)
         
         return response
     
@@ -183,11 +235,8 @@ class FramingBusinessAI:
         
         return response
     
-    def quality_control_assessment(self, work_photos, quality_standards):
-        """
-        AI-powered quality control for finished pieces
-        Routes to Claude 3.5 Sonnet for detailed analysis
-        """
+    def build_quality_messages(self, work_photos, quality_standards):
+        """Build the model ID and messages for a quality control assessment"""
         qc_prompt = f"""
         Quality Standards: {json.dumps(quality_standards, indent=2)}
         
@@ -203,10 +252,18 @@ class FramingBusinessAI:
         """
         
         model_id = self.business_models['quality_control']
-        response = self.model_handler.get_response([
+        return model_id, [
             {"role": "system", "content": "You are a master craftsman and quality control expert for custom framing."},
             {"role": "user", "content": qc_prompt}
-        ], model_id)
+        ]
+    
+    def quality_control_assessment(self, work_photos, quality_standards):
+        """
+        AI-powered quality control for finished pieces
+        Routes to Claude 3.5 Sonnet for detailed analysis
+        """
+        model_id, messages = self.build_quality_messages(work_photos, quality_standards)
+        response = self.model_handler.get_response(messages, model_id)
         
         return response
     
@@ -298,8 +355,9 @@ def example_business_workflow():
         'order_id': 'ORD001',
         'customer_id': 'CUST001',
         'frame_type': 'Hardwood Cherry',
+        'dimensions': '16x20',
         'mat_color': 'Cream',
-        'glass_type': 'Museum UV',
+        'glass_type': 'Museum UV Acrylic',
         'rush_order': False
     }
     order_analysis = ai_system.process_order(order_data)
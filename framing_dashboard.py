@@ -2,8 +2,10 @@ import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
+import os
 import pandas as pd
 from framing_business_integration import FramingBusinessAI, SystemIntegrations
+from smart_integrations import RealtimeDataSync
 
 # Page configuration for framing business dashboard
 st.set_page_config(
@@ -18,6 +20,20 @@ if 'framing_ai' not in st.session_state:
 
 framing_ai = st.session_state.framing_ai
 
+@st.cache_resource
+def get_realtime_sync():
+    """One background sync engine per server process; pages read its cache"""
+    data_sync = RealtimeDataSync()
+    if os.getenv('KANBAN_API_URL'):
+        data_sync.register_sync_endpoint(
+            'kanban', os.getenv('KANBAN_API_URL'),
+            sync_interval=int(os.getenv('KANBAN_SYNC_INTERVAL', '30')),
+            headers={'Authorization': f"Bearer {os.getenv('KANBAN_API_TOKEN', '')}"}
+        )
+    return data_sync
+
+data_sync = get_realtime_sync()
+
 st.title("🖼️ ArtFrame AI Business Hub")
 st.markdown("**AI-Powered Custom Framing Operations Center**")
 
@@ -110,6 +126,9 @@ elif module == "Order Processing":
         mat_style = st.selectbox("Mat Style", ["Single Mat", "Double Mat", "Triple Mat", "No Mat"])
         mat_color = st.text_input("Mat Color", value="Cream")
         
+        art_width = st.number_input("Artwork Width (inches)", min_value=1.0, max_value=96.0, value=16.0)
+        art_height = st.number_input("Artwork Height (inches)", min_value=1.0, max_value=96.0, value=20.0)
+        
     with col2:
         st.subheader("Technical Specifications")
         glass_type = st.selectbox("Glass Type", 
@@ -127,6 +146,8 @@ elif module == "Order Processing":
             'customer_id': st.session_state.get('current_design', {}).get('customer_data', {}).get('customer_id', 'UNKNOWN'),
             'frame_material': frame_material,
             'frame_width': frame_width,
+            'width': art_width,
+            'height': art_height,
             'mat_style': mat_style,
             'mat_color': mat_color,
             'glass_type': glass_type,
@@ -137,11 +158,26 @@ elif module == "Order Processing":
             'timestamp': datetime.now().isoformat()
         }
         
-        with st.spinner("AI is validating order and calculating costs..."):
-            order_analysis = framing_ai.process_order(order_data)
+        # Price is exact and instant; only the validation narrative waits on the model
+        quote_result = framing_ai.quote_order(order_data)
+        st.markdown("### 💰 Quote")
+        if quote_result['valid']:
+            quote = quote_result['quote']
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("Total", f"${quote['total']:.2f}")
+            col2.metric("Materials", f"${sum(quote['materials'].values()):.2f}")
+            col3.metric("Labor", f"${quote['labor']:.2f}")
+            col4.metric("United Inches", f"{quote['united_inches']:.0f}")
+            st.json(quote['materials'])
+        else:
+            for error in quote_result['errors']:
+                st.error(error)
+        
+        with st.spinner("AI is validating order..."):
+            order_analysis = framing_ai.process_order(order_data, quote_result)
             
             st.success("Order Processed Successfully!")
-            st.markdown("### 💰 AI Cost Analysis & Validation")
+            st.markdown("### 📝 AI Validation")
             st.markdown(order_analysis)
 
 elif module == "Production Planning":
@@ -151,17 +187,26 @@ elif module == "Production Planning":
     
     with col1:
         st.subheader("Current Orders")
-        # Simulate current orders
-        current_orders = [
-            {'order_id': 'ORD001', 'priority': 'High', 'deadline': '2024-01-15', 'complexity': 'Medium'},
-            {'order_id': 'ORD002', 'priority': 'Normal', 'deadline': '2024-01-18', 'complexity': 'High'},
-            {'order_id': 'ORD003', 'priority': 'Low', 'deadline': '2024-01-20', 'complexity': 'Low'}
-        ]
+        # Kanban orders come from the local sync cache, never a live call
+        current_orders = data_sync.get_kanban_orders() if 'kanban' in data_sync.sync_endpoints else []
+        
+        if current_orders:
+            staleness = data_sync.get_staleness('kanban')
+            st.caption(f"Synced from kanban {staleness:.0f}s ago" if staleness is not None else "Kanban sync pending")
+        else:
+            # Simulate current orders
+            current_orders = [
+                {'order_id': 'ORD001', 'priority': 'High', 'deadline': '2024-01-15', 'complexity': 'Medium'},
+                {'order_id': 'ORD002', 'priority': 'Normal', 'deadline': '2024-01-18', 'complexity': 'High'},
+                {'order_id': 'ORD003', 'priority': 'Low', 'deadline': '2024-01-20', 'complexity': 'Low'}
+            ]
         
         for order in current_orders:
-            with st.expander(f"Order {order['order_id']} - {order['priority']} Priority"):
-                st.write(f"Deadline: {order['deadline']}")
-                st.write(f"Complexity: {order['complexity']}")
+            with st.expander(f"Order {order['order_id']} - {order.get('priority', 'Normal')} Priority"):
+                st.write(f"Deadline: {order.get('deadline', 'Not set')}")
+                st.write(f"Complexity: {order.get('complexity', 'Unknown')}")
+                if 'status' in order:
+                    st.write(f"Status: {order['status']} ({order.get('progress', 0)}%)")
         
         st.subheader("Workshop Capacity")
         daily_capacity = st.number_input("Daily Frame Capacity", value=5)
@@ -193,14 +238,32 @@ elif module == "Production Planning":
             'equipment_status': equipment_status
         }
         
-        with st.spinner("AI is optimizing production schedule..."):
-            schedule = framing_ai.optimize_production_schedule(
-                current_orders, workshop_capacity, materials
-            )
-            
-            st.success("Production Schedule Optimized!")
-            st.markdown("### 📅 AI-Optimized Schedule")
-            st.markdown(schedule)
+        schedule = framing_ai.plan_production_schedule(current_orders, workshop_capacity, materials)
+        
+        st.success(f"Production Schedule Optimized in {schedule['compute_ms']:.1f}ms!")
+        st.markdown("### 📅 Optimized Schedule")
+        
+        kanban_cols = st.columns(len(schedule['kanban']))
+        for col, (column_name, order_ids) in zip(kanban_cols, schedule['kanban'].items()):
+            with col:
+                st.markdown(f"**{column_name}** ({len(order_ids)})")
+                for order_id in order_ids:
+                    st.write(order_id)
+        
+        if schedule['scheduled']:
+            st.dataframe(pd.DataFrame(schedule['scheduled']), use_container_width=True)
+        if schedule['late_orders']:
+            st.warning(f"Late orders: {', '.join(schedule['late_orders'])}")
+        for entry in schedule['blocked']:
+            st.error(f"{entry['order_id']} blocked ({entry['reason']}): {entry['shortages']}")
+        
+        st.session_state.production_plan = (current_orders, workshop_capacity, materials)
+    
+    if 'production_plan' in st.session_state and st.button("Explain Schedule with AI"):
+        with st.spinner("AI is explaining the production schedule..."):
+            explained = framing_ai.optimize_production_schedule(*st.session_state.production_plan)
+            st.markdown("### 🧠 AI Explanation")
+            st.markdown(explained['explanation'])
 
 elif module == "Customer Notifications":
     st.header("📱 AI Customer Communication")
@@ -8,6 +8,8 @@ import sqlite3
 from usage_monitor import usage_monitor
 from auth_manager import auth_manager
 from production_config import prod_config
+from metrics import MODEL_REQUEST_SECONDS
+from tracing import tracer
 import requests
 import time
 
@@ -44,7 +46,8 @@ def health_check():
                 "cost_today": usage_monitor.metrics.total_cost,
                 "conversations_active": len([f for f in os.listdir("conversation_history") if f.endswith(".json")]) if os.path.exists("conversation_history") else 0,
                 "uptime_hours": _get_uptime_hours()
-            }
+            },
+            "latency_by_provider": _provider_latency()
         }
         
         # Performance alerts
@@ -74,6 +77,18 @@ def health_check():
             "error": str(e)
         }
 
+def _provider_latency():
+    """p50/p95/p99 provider call latency (ms) since this process started"""
+    return {
+        provider: {
+            "calls": summary["count"],
+            "p50_ms": round(summary["p50"] * 1000, 1),
+            "p95_ms": round(summary["p95"] * 1000, 1),
+            "p99_ms": round(summary["p99"] * 1000, 1)
+        }
+        for (provider,), summary in MODEL_REQUEST_SECONDS.summaries(by=("provider",)).items()
+    }
+
 def _check_database_health():
     """Check database connectivity"""
     try:
@@ -102,6 +117,39 @@ def _get_uptime_hours():
     except:
         return 0
 
+def render_slowest_traces(limit=10):
+    """Slowest recent traces with a per-span breakdown"""
+    st.subheader("🐢 Slowest Traces")
+    if not tracer.enabled:
+        st.info("Tracing is disabled. Set TRACE_SAMPLE_RATE (e.g. 0.1) to record chat turns and API requests.")
+        return
+    
+    traces = tracer.slowest_traces(limit)
+    if not traces:
+        st.info(f"No traces recorded yet (sampling {tracer.sample_rate:.0%} of requests).")
+        return
+    
+    st.caption(f"Sampling {tracer.sample_rate:.0%} of requests · exported to {tracer.path} ({tracer.export_format})")
+    st.dataframe([{
+        "trace": trace["name"],
+        "duration_ms": round(trace["duration_ms"], 1),
+        "spans": len(trace["spans"]),
+        "status": trace["status"],
+        "started": datetime.fromtimestamp(trace["start"]).strftime("%H:%M:%S"),
+        "trace_id": trace["trace_id"]
+    } for trace in traces], use_container_width=True)
+    
+    for trace in traces[:3]:
+        with st.expander(f"{trace['name']} · {trace['duration_ms']:.0f} ms · {trace['trace_id'][:8]}"):
+            st.dataframe([{
+                "span": span["name"],
+                "offset_ms": round(span["offset_ms"], 1),
+                "duration_ms": round(span["duration_ms"], 1),
+                "share": f"{span['duration_ms'] / trace['duration_ms']:.0%}" if trace["duration_ms"] else "-",
+                "status": span["status"],
+                "attributes": ", ".join(f"{key}={value}" for key, value in span["attributes"].items())
+            } for span in trace["spans"]], use_container_width=True)
+
 def render_health_dashboard():
     """Render health check dashboard"""
     st.title("🏥 System Health Dashboard")
@@ -132,6 +180,15 @@ def render_health_dashboard():
         st.metric("Cost Today", f"${metrics.get('cost_today', 0):.2f}")
         st.metric("Active Conversations", metrics.get("conversations_active", 0))
     
+    if health.get("latency_by_provider"):
+        st.subheader("Provider Latency")
+        st.dataframe(
+            [dict(provider=provider, **stats) for provider, stats in health["latency_by_provider"].items()],
+            use_container_width=True
+        )
+    
+    render_slowest_traces()
+    
     with st.expander("Raw Health Data"):
         st.json(health)
     
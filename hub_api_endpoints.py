@@ -1,10 +1,21 @@
 """
 Hub API Endpoints for Custom Framing Business
 Add these endpoints to your existing Hub app
+
+Importing this module does not start the background job workers. Run it
+directly, serve create_app() from a WSGI server (e.g. gunicorn
+'hub_api_endpoints:create_app()'), or call start_job_workers() from your own
+app's startup so queued jobs are processed.
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, url_for
 from framing_business_integration import FramingBusinessAI
+from job_queue import DurableJobQueue, JobWorkerPool
+from production_scheduler import SchedulingError
+from metrics import HTTP_REQUEST_SECONDS, PROMETHEUS_CONTENT_TYPE, metrics
+from tracing import tracer
+import os
+import time
 import uuid
 from datetime import datetime
 
@@ -13,6 +24,173 @@ framing_ai = FramingBusinessAI()
 
 app = Flask(__name__)
 
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    # Joins the caller's trace when it sent a traceparent header
+    g.trace_scope = tracer.trace(f"{request.method} {request.url_rule.rule if request.url_rule else request.path}",
+                                 traceparent=request.headers.get('traceparent'))
+    g.trace_scope.__enter__()
+
+@app.after_request
+def record_request_latency(response):
+    if 'request_start' in g:
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - g.request_start, app="hub_api",
+                                     route=request.url_rule.rule if request.url_rule else "unmatched",
+                                     method=request.method, status=response.status_code)
+    return response
+
+@app.teardown_request
+def end_request_trace(error=None):
+    scope = g.pop('trace_scope', None)
+    if scope is not None:
+        scope.__exit__(type(error) if error else None, error, None)
+
+# Long-running AI calls can run as queued jobs instead of holding a Flask worker
+job_queue = DurableJobQueue(
+    db_path=os.getenv("HUB_JOB_DB", "hub_jobs.db"),
+    visibility_timeout=int(os.getenv("HUB_JOB_VISIBILITY_TIMEOUT", "300"))
+)
+
+def run_design(data):
+    customer_data = {
+        'name': data.get('customer_name'),
+        'budget': data.get('budget', 0),
+        'customer_id': data.get('customer_id', f"CUST{datetime.now().strftime('%m%d%H%M')}")
+    }
+    
+    artwork_description = data.get('artwork_description', '')
+    preferences = data.get('preferences', '')
+    
+    # Get AI recommendation
+    recommendation = framing_ai.process_design_request(
+        customer_data, artwork_description, preferences,
+        coalesce=data.get('coalesce', True)
+    )
+    
+    return {
+        'design_recommendation': recommendation,
+        'customer_id': customer_data['customer_id']
+    }
+
+def run_order(order_data):
+    # Add timestamp if not present
+    if 'timestamp' not in order_data:
+        order_data['timestamp'] = datetime.now().isoformat()
+    
+    # Generate order ID if not present
+    if 'order_id' not in order_data:
+        order_data['order_id'] = f"ORD{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    
+    # Price locally; the model only writes the validation narrative
+    quote = framing_ai.quote_order(order_data)
+    analysis = framing_ai.process_order(order_data, quote) if order_data.get('narrative', True) else None
+    
+    return {
+        'order_id': order_data['order_id'],
+        'quote': quote,
+        'validation_result': analysis
+    }
+
+def run_production(data):
+    current_orders = data.get('current_orders', [])
+    workshop_capacity = data.get('workshop_capacity', {})
+    material_availability = data.get('material_availability', {})
+    
+    # Plan locally; the model explanation is opt-in because it adds LLM latency
+    schedule = framing_ai.optimize_production_schedule(
+        current_orders, workshop_capacity, material_availability,
+        explain=data.get('explain', False)
+    )
+    
+    return {
+        'optimized_schedule': schedule,
+        'orders_processed': len(current_orders)
+    }
+
+def run_notifications(data):
+    order_status = data.get('order_status', {})
+    customer_info = data.get('customer_info', {})
+    
+    # Get AI-generated message (hedged by default: this is customer-facing)
+    notification = framing_ai.generate_customer_notifications(
+        order_status, customer_info, hedge=data.get('hedge', True)
+    )
+    
+    return {
+        'notification_message': notification,
+        'order_id': order_status.get('order_id'),
+        'customer_name': customer_info.get('name')
+    }
+
+def run_quality(data):
+    work_photos = data.get('work_photos', [])
+    quality_standards = data.get('quality_standards', {})
+    
+    # Get AI quality assessment
+    assessment = framing_ai.quality_control_assessment(work_photos, quality_standards)
+    
+    return {'quality_assessment': assessment}
+
+def run_analytics(data):
+    sales_data = data.get('sales_data', {})
+    cost_data = data.get('cost_data', {})
+    timeframe = data.get('timeframe', 'Last 30 days')
+    
+    # Get AI analysis
+    analysis = framing_ai.analyze_profit_and_sales(sales_data, cost_data, timeframe)
+    
+    return {
+        'business_analysis': analysis,
+        'timeframe': timeframe
+    }
+
+JOB_HANDLERS = {
+    'design': run_design,
+    'order': run_order,
+    'production': run_production,
+    'notifications': run_notifications,
+    'quality': run_quality,
+    'analytics': run_analytics
+}
+
+job_workers = JobWorkerPool(job_queue, JOB_HANDLERS, workers=int(os.getenv("HUB_JOB_WORKERS", "4")))
+
+def start_job_workers():
+    """
+    Start the background job workers (idempotent). Call once from the serving
+    process at startup so jobs left in the durable queue by a restart are
+    picked up without waiting for the next async request.
+    """
+    job_workers.start()
+
+def create_app():
+    """WSGI entry point: the Flask app with its job workers running"""
+    start_job_workers()
+    return app
+
+def wants_async(data):
+    """Clients opt in with {"async": true} or a 'Prefer: respond-async' header"""
+    return bool(data.get('async')) or 'respond-async' in request.headers.get('Prefer', '')
+
+def enqueue_job(job_type, data):
+    """Queue a job and return a 202 response pointing at its status URL"""
+    if data.get('webhook_url'):
+        try:
+            job_workers.validate_webhook_url(data['webhook_url'])
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+    payload = {k: v for k, v in data.items() if k not in ('async', 'webhook_url')}
+    job_id = job_queue.enqueue(job_type, payload, webhook_url=data.get('webhook_url'))
+    status_url = url_for('job_status', job_id=job_id)
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status': 'queued',
+        'status_url': status_url,
+        'queued_at': datetime.now().isoformat()
+    }), 202, {'Location': status_url}
+
 # DESIGN CONSULTATION ENDPOINT
 @app.route('/api/ai/design', methods=['POST'])
 def design_consultation():
@@ -22,25 +200,12 @@ def design_consultation():
     """
     try:
         data = request.json
-        
-        customer_data = {
-            'name': data.get('customer_name'),
-            'budget': data.get('budget', 0),
-            'customer_id': data.get('customer_id', f"CUST{datetime.now().strftime('%m%d%H%M')}")
-        }
-        
-        artwork_description = data.get('artwork_description', '')
-        preferences = data.get('preferences', '')
-        
-        # Get AI recommendation
-        recommendation = framing_ai.process_design_request(
-            customer_data, artwork_description, preferences
-        )
+        if wants_async(data):
+            return enqueue_job('design', data)
         
         return jsonify({
             'success': True,
-            'design_recommendation': recommendation,
-            'customer_id': customer_data['customer_id'],
+            **run_design(data),
             'timestamp': datetime.now().isoformat()
         })
         
@@ -60,22 +225,12 @@ def process_order():
     """
     try:
         order_data = request.json
-        
-        # Add timestamp if not present
-        if 'timestamp' not in order_data:
-            order_data['timestamp'] = datetime.now().isoformat()
-        
-        # Generate order ID if not present
-        if 'order_id' not in order_data:
-            order_data['order_id'] = f"ORD{datetime.now().strftime('%Y%m%d%H%M%S')}"
-        
-        # Get AI analysis
-        analysis = framing_ai.process_order(order_data)
+        if wants_async(order_data):
+            return enqueue_job('order', order_data)
         
         return jsonify({
             'success': True,
-            'order_id': order_data['order_id'],
-            'validation_result': analysis,
+            **run_order(order_data),
             'processed_at': datetime.now().isoformat()
         })
         
@@ -86,6 +241,35 @@ def process_order():
             'fallback_message': 'Order processing AI unavailable. Please proceed with manual validation.'
         }), 500
 
+# QUOTE ENDPOINT
+@app.route('/api/ai/quote', methods=['POST'])
+def quote_order():
+    """
+    POS app requests an instant price (no model call)
+    Returns the quote, plus in-budget alternatives when a budget is given
+    """
+    try:
+        order_data = request.json
+        result = framing_ai.quote_order(order_data)
+        
+        if result['budget'] and result['quote']:
+            spec = result['quote']['specification']
+            result['alternatives'] = framing_ai.pricing_engine.alternatives(
+                spec['width'], spec['height'], result['budget'], current=spec,
+                mat_width=spec['mat_width'], rush=spec['rush']
+            )
+        
+        return jsonify({
+            'success': result['valid'],
+            **result
+        }), 200 if result['valid'] else 400
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 # PRODUCTION PLANNING ENDPOINT
 @app.route('/api/ai/production', methods=['POST'])
 def production_planning():
@@ -95,23 +279,21 @@ def production_planning():
     """
     try:
         data = request.json
-        
-        current_orders = data.get('current_orders', [])
-        workshop_capacity = data.get('workshop_capacity', {})
-        material_availability = data.get('material_availability', {})
-        
-        # Get AI optimization
-        schedule = framing_ai.optimize_production_schedule(
-            current_orders, workshop_capacity, material_availability
-        )
+        if wants_async(data):
+            return enqueue_job('production', data)
         
         return jsonify({
             'success': True,
-            'optimized_schedule': schedule,
-            'generated_at': datetime.now().isoformat(),
-            'orders_processed': len(current_orders)
+            **run_production(data),
+            'generated_at': datetime.now().isoformat()
         })
         
+    except SchedulingError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+        
     except Exception as e:
         return jsonify({
             'success': False,
@@ -128,20 +310,13 @@ def customer_notifications():
     """
     try:
         data = request.json
-        
-        order_status = data.get('order_status', {})
         customer_info = data.get('customer_info', {})
-        
-        # Get AI-generated message
-        notification = framing_ai.generate_customer_notifications(
-            order_status, customer_info
-        )
+        if wants_async(data):
+            return enqueue_job('notifications', data)
         
         return jsonify({
             'success': True,
-            'notification_message': notification,
-            'order_id': order_status.get('order_id'),
-            'customer_name': customer_info.get('name'),
+            **run_notifications(data),
             'generated_at': datetime.now().isoformat()
         })
         
@@ -161,16 +336,12 @@ def quality_control():
     """
     try:
         data = request.json
-        
-        work_photos = data.get('work_photos', [])
-        quality_standards = data.get('quality_standards', {})
-        
-        # Get AI quality assessment
-        assessment = framing_ai.quality_control_assessment(work_photos, quality_standards)
+        if wants_async(data):
+            return enqueue_job('quality', data)
         
         return jsonify({
             'success': True,
-            'quality_assessment': assessment,
+            **run_quality(data),
             'assessed_at': datetime.now().isoformat()
         })
         
@@ -190,18 +361,12 @@ def business_analytics():
     """
     try:
         data = request.json
-        
-        sales_data = data.get('sales_data', {})
-        cost_data = data.get('cost_data', {})
-        timeframe = data.get('timeframe', 'Last 30 days')
-        
-        # Get AI analysis
-        analysis = framing_ai.analyze_profit_and_sales(sales_data, cost_data, timeframe)
+        if wants_async(data):
+            return enqueue_job('analytics', data)
         
         return jsonify({
             'success': True,
-            'business_analysis': analysis,
-            'timeframe': timeframe,
+            **run_analytics(data),
             'analyzed_at': datetime.now().isoformat()
         })
         
@@ -212,6 +377,87 @@ def business_analytics():
             'fallback_message': 'Business analytics AI unavailable. Please review data manually.'
         }), 500
 
+# JOB SUBMISSION ENDPOINT
+@app.route('/api/ai/jobs', methods=['POST'])
+def submit_job():
+    """
+    Queue any AI workflow as a background job
+    Body: {"job_type": "production", "payload": {...}, "webhook_url": "..."}
+    """
+    try:
+        data = request.json
+        job_type = data.get('job_type')
+        
+        if job_type not in JOB_HANDLERS:
+            return jsonify({
+                'success': False,
+                'error': f"Unknown job_type: {job_type}",
+                'job_types': list(JOB_HANDLERS)
+            }), 400
+        
+        payload = dict(data.get('payload', {}))
+        if data.get('webhook_url'):
+            payload['webhook_url'] = data['webhook_url']
+        return enqueue_job(job_type, payload)
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+# JOB QUEUE STATS ENDPOINT
+@app.route('/api/ai/jobs/stats', methods=['GET'])
+def job_stats():
+    """
+    Worker count, queue depth and job latency percentiles
+    """
+    try:
+        return jsonify({
+            'success': True,
+            'job_queue': job_workers.get_stats(),
+            'retrieved_at': datetime.now().isoformat()
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+# JOB STATUS ENDPOINT
+@app.route('/api/ai/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """
+    Poll a queued job; the result is included once it has succeeded
+    """
+    try:
+        job = job_queue.get(job_id)
+        if job is None:
+            return jsonify({
+                'success': False,
+                'error': 'Job not found'
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'job_id': job['id'],
+            'job_type': job['job_type'],
+            'status': job['status'],
+            'attempts': job['attempts'],
+            'result': job['result'],
+            'error': job['error'],
+            'created_at': job['created_at'],
+            'started_at': job['started_at'],
+            'finished_at': job['finished_at']
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 # AI USAGE ANALYTICS ENDPOINT
 @app.route('/api/ai/usage', methods=['GET'])
 def ai_usage_analytics():
@@ -227,6 +473,7 @@ def ai_usage_analytics():
         return jsonify({
             'success': True,
             'usage_insights': insights,
+            'request_coalescing': framing_ai.model_handler.single_flight.get_stats(),
             'timeframe_days': days,
             'retrieved_at': datetime.now().isoformat()
         })
@@ -262,5 +509,17 @@ def health_check():
             'timestamp': datetime.now().isoformat()
         }), 503
 
+# PROMETHEUS METRICS ENDPOINT
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """
+    Counters, gauges and latency percentiles in the Prometheus text format
+    """
+    return Response(metrics.render_prometheus(), content_type=PROMETHEUS_CONTENT_TYPE)
+
 if __name__ == '__main__':
+    # The debug reloader runs this block in a watcher process and in the serving
+    # child; only the child (WERKZEUG_RUN_MAIN set) should take jobs
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_job_workers()
     app.run(debug=True, port=5001)
\ No newline at end of file
@@ -0,0 +1,124 @@
+"""
+Latency benchmark for HubConnectionManager against a local stub hub
+
+Usage: python hub_benchmark.py [--requests 200] [--concurrency 16]
+"""
+
+import argparse
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List
+
+import requests
+
+from hub_connection_manager import HubConnectionManager
+from model_usage_tracker import ModelUsageTracker
+from white_label_config import WhiteLabelConfig
+
+
+class StubHubHandler(BaseHTTPRequestHandler):
+    """Minimal hub: health, registration, config and event batches"""
+
+    protocol_version = "HTTP/1.1"  # Keep-alive, like a real hub behind a proxy
+    disable_nagle_algorithm = True  # Otherwise the body waits on a delayed ACK
+
+    def _reply(self, status: int, payload: Dict):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/api/health':
+            self._reply(200, {'status': 'ok'})
+        elif self.path.endswith('/config'):
+            self._reply(200, {'branding': {}})
+        else:
+            self._reply(404, {})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self._reply(200, {'registration_id': 'stub'})
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub_hub() -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def summarize(samples: List[float], wall_time: float) -> Dict[str, float]:
+    samples = sorted(samples)
+    return {
+        'p50_ms': ModelUsageTracker._percentile(samples, 50) * 1000,
+        'p95_ms': ModelUsageTracker._percentile(samples, 95) * 1000,
+        'p99_ms': ModelUsageTracker._percentile(samples, 99) * 1000,
+        'throughput_rps': len(samples) / wall_time
+    }
+
+
+def time_calls(call: Callable[[], object], count: int) -> Dict[str, float]:
+    samples = []
+    wall_start = time.perf_counter()
+    for _ in range(count):
+        start = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples, time.perf_counter() - wall_start)
+
+
+async def time_async_calls(manager: HubConnectionManager, count: int, concurrency: int) -> Dict[str, float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    samples = []
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await manager.aget_hub_configuration()
+            samples.append(time.perf_counter() - start)
+
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(count)))
+    return summarize(samples, time.perf_counter() - wall_start)
+
+
+def run_benchmark(count: int = 200, concurrency: int = 16) -> Dict[str, Dict[str, float]]:
+    server = start_stub_hub()
+    hub_url = f"http://127.0.0.1:{server.server_port}"
+
+    config = WhiteLabelConfig(config_file="hub_benchmark_config.json")
+    config.connection.enable_hub_integration = True
+    config.connection.enable_real_time_sync = False
+    config.connection.hub_dashboard_url = hub_url
+    config.connection.hub_api_key = "benchmark"
+    manager = HubConnectionManager(config)
+
+    results = {
+        'unpooled_get': time_calls(lambda: requests.get(f"{hub_url}/api/health", timeout=5), count),
+        'pooled_test_connection': time_calls(manager.test_connection, count),
+        'pooled_get_config': time_calls(manager.get_hub_configuration, count),
+        'send_event_enqueue': time_calls(lambda: manager.send_event('benchmark', {'n': 1}), count),
+        'async_get_config': asyncio.run(time_async_calls(manager, count, concurrency)),
+    }
+    manager.event_pipeline.close()
+    server.shutdown()
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark hub client latency against a local stub hub")
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    args = parser.parse_args()
+
+    for name, stats in run_benchmark(args.requests, args.concurrency).items():
+        print(f"{name:24s} p50 {stats['p50_ms']:7.2f}ms  p95 {stats['p95_ms']:7.2f}ms  "
+              f"p99 {stats['p99_ms']:7.2f}ms  {stats['throughput_rps']:8.0f} req/s")
@@ -1,327 +1,218 @@
-
-import requests
-import json
 import asyncio
-import websockets
+import threading
+import time
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
 from white_label_config import WhiteLabelConfig
+from hub_event_pipeline import HubEventPipeline, get_event_pipeline
+from hub_websocket_client import (HubWebSocketClient, find_websocket_client, get_websocket_client,
+                                  realtime_sync_enabled)
+from metrics import HUB_REQUEST_SECONDS, HUB_REQUESTS
+from tracing import tracer
 
-class HubConnectionManager:
-    """Manages connection to the Central Hub Dashboard"""
-    
-    def __init__(self, config: WhiteLabelConfig):
-        self.config = config
-        self.connection_status = False
-        self.last_sync = None
-        self.session = requests.Session()
-        
-        # Set up headers
-        if config.connection.hub_api_key:
-            self.session.headers.update({
+# Connection pool tuning for hub traffic
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 16
+CONNECT_TIMEOUT = 5
+
+_sessions: Dict[Tuple[str, str], requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+
+class TracingHTTPAdapter(HTTPAdapter):
+    """Records each hub request as a span and passes the trace on in a traceparent header"""
+
+    def send(self, request, *args, **kwargs):
+        with tracer.span("hub.request", method=request.method, endpoint=urlsplit(request.url).path) as span:
+            if span.traceparent:
+                request.headers['traceparent'] = span.traceparent
+            response = super().send(request, *args, **kwargs)
+            span.set_attribute("status", response.status_code)
+            return response
+
+
+def get_hub_session(config: WhiteLabelConfig) -> requests.Session:
+    """
+    Shared keep-alive session per hub URL and API key.
+
+    Streamlit creates new managers on every rerun; sharing the session keeps
+    connections to the hub warm instead of paying a TCP/TLS handshake per call.
+    """
+    key = (config.connection.hub_dashboard_url.rstrip('/'), config.connection.hub_api_key)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            # Only idempotent requests are retried at the transport level
+            retry = Retry(
+                total=config.connection.retry_attempts,
+                backoff_factor=0.3,
+                status_forcelist=[502, 503, 504],
+                allowed_methods=['GET', 'HEAD'],
+                raise_on_status=False
+            )
+            adapter = TracingHTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE,
+                                         max_retries=retry)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers.update({
                 'X-API-Key': config.connection.hub_api_key,
                 'Content-Type': 'application/json',
                 'User-Agent': f"{config.connection.app_name}/{config.connection.app_version}"
             })
-    
-    def test_connection(self) -> Dict[str, Any]:
-        """Test connection to Hub Dashboard"""
-        try:
-            if not self.config.connection.enable_hub_integration:
-                return {
-                    'success': False,
-                    'message': 'Hub integration not enabled',
-                    'status': 'disabled'
-                }
-            
-            url = f"{self.config.connection.hub_dashboard_url}{self.config.connection.hub_connection_test_endpoint}"
-            
-            response = self.session.get(
-                url,
-                timeout=self.config.connection.connection_timeout
-            )
-            
-            if response.status_code == 200:
-                self.connection_status = True
-                return {
-                    'success': True,
-                    'message': 'Connected to Hub Dashboard',
-                    'status': 'connected',
-                    'response_time': response.elapsed.total_seconds(),
-                    'hub_info': response.json() if response.content else {}
-                }
-            else:
-                return {
-                    'success': False,
-                    'message': f'Connection failed: {response.status_code}',
-                    'status': 'failed'
-                }
-                
-        except requests.exceptions.Timeout:
-            return {
-                'success': False,
-                'message': 'Connection timeout',
-                'status': 'timeout'
-            }
-        except Exception as e:
-            return {
-                'success': False,
-                'message': f'Connection error: {str(e)}',
-                'status': 'error'
-            }
-    
-    def register_app(self) -> Dict[str, Any]:
-        """Register this app with the Hub Dashboard"""
-        try:
-            url = f"{self.config.connection.hub_dashboard_url}/api/apps/register"
-            
-            registration_data = {
-                'app_id': self.config.connection.app_id,
-                'app_name': self.config.connection.app_name,
-                'app_version': self.config.connection.app_version,
-                'app_type': 'multi-model-chat',
-                'features': {
-                    'ai_models': True,
-                    'conversation_management': True,
-                    'image_generation': self.config.features.enable_image_generation,
-                    'file_upload': self.config.features.enable_file_upload,
-                    'deep_thinking': self.config.features.enable_deep_thinking
-                },
-                'endpoints': {
-                    'health': '/health',
-                    'chat': '/api/chat',
-                    'models': '/api/models'
-                },
-                'timestamp': datetime.now().isoformat()
-            }
-            
-            response = self.session.post(url, json=registration_data)
-            
-            if response.status_code == 200:
-                return {
-                    'success': True,
-                    'message': 'App registered successfully',
-                    'registration_id': response.json().get('registration_id')
-                }
-            else:
-                return {
-                    'success': False,
-                    'message': f'Registration failed: {response.status_code}'
-                }
-                
-        except Exception as e:
-            return {
-                'success': False,
-                'message': f'Registration error: {str(e)}'
-            }
-    
-    def send_event(self, event_type: str, event_data: Dict[str, Any]) -> bool:
-        """Send event to Hub Dashboard"""
-        try:
-            if not self.connection_status:
-                return False
-            
-            url = f"{self.config.connection.hub_dashboard_url}{self.config.connection.hub_events_endpoint}"
-            
-            event_payload = {
-                'app_id': self.config.connection.app_id,
-                'event_type': event_type,
-                'event_data': event_data,
-                'timestamp': datetime.now().isoformat()
-            }
-            
-            response = self.session.post(url, json=event_payload)
-            return response.status_code == 200
-            
-        except Exception:
-            return False
-    
-    def send_conversation_event(self, conversation_id: str, message_count: int, 
-                               model_used: str, response_time: float) -> bool:
-        """Send conversation analytics to Hub"""
-        return self.send_event('conversation', {
-            'conversation_id': conversation_id,
-            'message_count': message_count,
-            'model_used': model_used,
-            'response_time': response_time,
-            'features_used': {
-                'image_generation': self.config.features.enable_image_generation,
-                'deep_thinking': self.config.features.enable_deep_thinking
-            }
-        })
-    
-    def send_usage_analytics(self, daily_stats: Dict[str, Any]) -> bool:
-        """Send usage analytics to Hub"""
-        return self.send_event('usage_analytics', daily_stats)
-    
-    def get_hub_configuration(self) -> Optional[Dict[str, Any]]:
-        """Get configuration updates from Hub"""
-        try:
-            url = f"{self.config.connection.hub_dashboard_url}/api/apps/{self.config.connection.app_id}/config"
-            response = self.session.get(url)
-            
-            if response.status_code == 200:
-                return response.json()
-            return None
-            
-        except Exception:
-            return None
-    
-    async def setup_websocket_connection(self):
-        """Set up WebSocket connection for real-time updates"""
-        if not self.config.connection.enable_real_time_sync:
-            return
-        
-        try:
-            ws_url = f"{self.config.connection.hub_websocket_url}/ws/{self.config.connection.app_id}"
-            
-            async with websockets.connect(
-                ws_url,
-                extra_headers={'X-API-Key': self.config.connection.hub_api_key}
-            ) as websocket:
-                await websocket.send(json.dumps({
-                    'action': 'subscribe',
-                    'app_id': self.config.connection.app_id
-                }))
-                
-                async for message in websocket:
-                    data = json.loads(message)
-                    await self.handle_websocket_message(data)
-                    
-        except Exception as e:
-            print(f"WebSocket connection error: {e}")
-    
-    async def handle_websocket_message(self, message: Dict[str, Any]):
-        """Handle incoming WebSocket messages from Hub"""
-        message_type = message.get('type')
-        
-        if message_type == 'config_update':
-            # Handle configuration updates
-            pass
-        elif message_type == 'broadcast':
-            # Handle broadcast messages
-            pass
-        elif message_type == 'ping':
-            # Respond to ping
-            pass
+            session.hooks['response'].append(_response_recorder(config.connection.app_id))
+            _sessions[key] = session
+        return session
+
+
+def _response_recorder(app_id: str):
+    """Response hook recording hub latency and status per endpoint (app id folded out of paths)"""
+    def record(response, *args, **kwargs):
+        endpoint = urlsplit(response.request.url).path
+        if app_id:
+            endpoint = endpoint.replace(f"/{app_id}/", "/{app_id}/")
+        HUB_REQUEST_SECONDS.observe(response.elapsed.total_seconds(), endpoint=endpoint,
+                                    method=response.request.method)
+        HUB_REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+    return record
 
-def create_hub_connection(config: WhiteLabelConfig) -> HubConnectionManager:
-    """Factory function to create Hub connection manager"""
-    return HubConnectionManager(config)
-import requests
-import json
-import time
-from datetime import datetime
 
 class HubConnectionManager:
-    """Manages connections to the Central Hub Dashboard"""
-    
-    def __init__(self, config):
+    """Manages connections to the Central Hub Dashboard (sync and async APIs share one connection pool)"""
+
+    def __init__(self, config: WhiteLabelConfig):
         self.config = config
-        self.session = requests.Session()
-        
-    def test_connection(self):
+        self.connection_status = False
+        self.last_sync = None
+        self.session = get_hub_session(config)
+
+    @property
+    def base_url(self) -> str:
+        return self.config.connection.hub_dashboard_url.rstrip('/')
+
+    @property
+    def timeout(self) -> Tuple[float, float]:
+        """(connect, read) timeouts; reads may take up to connection_timeout"""
+        read_timeout = self.config.connection.connection_timeout
+        return (min(CONNECT_TIMEOUT, read_timeout), read_timeout)
+
+    @property
+    def event_pipeline(self) -> HubEventPipeline:
+        """Shared background sender for this hub"""
+        return get_event_pipeline(
+            f"{self.base_url}{self.config.connection.hub_events_batch_endpoint}",
+            headers={'X-API-Key': self.config.connection.hub_api_key},
+            app_id=self.config.connection.app_id,
+            session=self.session,
+            timeout=min(5, self.config.connection.connection_timeout),  # Short timeout for analytics
+            max_retries=self.config.connection.retry_attempts
+        )
+
+    def test_connection(self) -> Dict[str, Any]:
         """Test connection to the Hub Dashboard"""
         if not self.config.connection.enable_hub_integration:
             return {
                 "success": False,
-                "message": "Hub integration is disabled"
+                "message": "Hub integration is disabled",
+                "status": "disabled"
             }
-            
+
         if not self.config.connection.hub_dashboard_url:
             return {
                 "success": False,
                 "message": "Hub Dashboard URL not configured"
             }
-            
+
         if not self.config.connection.hub_api_key:
             return {
                 "success": False,
                 "message": "Hub API key not configured"
             }
-        
+
         try:
-            # Test connection endpoint
-            test_url = f"{self.config.connection.hub_dashboard_url.rstrip('/')}/api/health"
-            
-            headers = {
-                "X-API-Key": self.config.connection.hub_api_key,
-                "Content-Type": "application/json"
-            }
-            
             start_time = time.time()
-            response = self.session.get(
-                test_url,
-                headers=headers,
-                timeout=self.config.connection.connection_timeout
-            )
+            response = self.session.get(f"{self.base_url}/api/health", timeout=self.timeout)
             response_time = time.time() - start_time
-            
+
             if response.status_code == 200:
+                self.connection_status = True
+                self.last_sync = datetime.now()
                 return {
                     "success": True,
                     "message": "Hub connection successful",
+                    "status": "connected",
                     "response_time": response_time,
                     "status_code": response.status_code
                 }
             else:
+                self.connection_status = False
                 return {
                     "success": False,
                     "message": f"Hub returned status {response.status_code}: {response.text}",
+                    "status": "failed",
                     "status_code": response.status_code
                 }
-                
+
         except requests.exceptions.ConnectionError:
+            self.connection_status = False
+            HUB_REQUESTS.inc(endpoint="/api/health", status="connection_error")
             return {
                 "success": False,
-                "message": "Could not connect to Hub Dashboard. Check the URL."
+                "message": "Could not connect to Hub Dashboard. Check the URL.",
+                "status": "error"
             }
         except requests.exceptions.Timeout:
+            self.connection_status = False
+            HUB_REQUESTS.inc(endpoint="/api/health", status="timeout")
             return {
                 "success": False,
-                "message": "Connection to Hub Dashboard timed out"
+                "message": "Connection to Hub Dashboard timed out",
+                "status": "timeout"
             }
         except Exception as e:
+            self.connection_status = False
             return {
                 "success": False,
-                "message": f"Connection error: {str(e)}"
+                "message": f"Connection error: {str(e)}",
+                "status": "error"
             }
-    
-    def register_app(self):
+
+    def register_app(self) -> Dict[str, Any]:
         """Register this app instance with the Hub"""
         if not self.test_connection()['success']:
             return {
                 "success": False,
                 "message": "Cannot register - Hub connection failed"
             }
-        
+
         try:
-            register_url = f"{self.config.connection.hub_dashboard_url.rstrip('/')}/api/apps/register"
-            
-            headers = {
-                "X-API-Key": self.config.connection.hub_api_key,
-                "Content-Type": "application/json"
-            }
-            
             app_data = {
                 "app_id": self.config.connection.app_id,
                 "app_name": self.config.branding.app_title,
+                "app_version": self.config.connection.app_version,
+                "app_type": "multi-model-chat",
                 "company_name": self.config.branding.company_name,
                 "registration_time": datetime.now().isoformat(),
                 "features": {
                     "model_comparison": self.config.features.enable_model_comparison,
                     "image_generation": self.config.features.enable_image_generation,
-                    "file_upload": self.config.features.enable_file_upload
+                    "file_upload": self.config.features.enable_file_upload,
+                    "deep_thinking": self.config.features.enable_deep_thinking
                 }
             }
-            
+
             response = self.session.post(
-                register_url,
-                headers=headers,
+                f"{self.base_url}/api/apps/register",
                 json=app_data,
-                timeout=self.config.connection.connection_timeout
+                timeout=self.timeout
             )
-            
+
             if response.status_code in [200, 201]:
                 data = response.json() if response.content else {}
                 return {
@@ -334,42 +225,104 @@ class HubConnectionManager:
                     "success": False,
                     "message": f"Registration failed: {response.status_code} - {response.text}"
                 }
-                
+
         except Exception as e:
             return {
                 "success": False,
                 "message": f"Registration error: {str(e)}"
             }
-    
-    def send_analytics_event(self, event_type, event_data):
-        """Send an analytics event to the Hub"""
+
+    def send_event(self, event_type: str, event_data: Dict[str, Any]) -> bool:
+        """Queue an event for the Hub; never blocks the caller. Returns False if it was dropped"""
         if not self.config.connection.enable_hub_integration:
             return False
-            
-        try:
-            events_url = f"{self.config.connection.hub_dashboard_url.rstrip('/')}/api/events"
-            
-            headers = {
-                "X-API-Key": self.config.connection.hub_api_key,
-                "Content-Type": "application/json"
-            }
-            
-            event_payload = {
-                "app_id": self.config.connection.app_id,
-                "event_type": event_type,
-                "event_data": event_data,
-                "timestamp": datetime.now().isoformat()
+
+        return self.event_pipeline.publish(event_type, event_data)
+
+    def send_analytics_event(self, event_type: str, event_data: Dict[str, Any]) -> bool:
+        """Send an analytics event to the Hub"""
+        return self.send_event(event_type, event_data)
+
+    def send_conversation_event(self, conversation_id: str, message_count: int,
+                               model_used: str, response_time: float) -> bool:
+        """Send conversation analytics to Hub"""
+        return self.send_event('conversation', {
+            'conversation_id': conversation_id,
+            'message_count': message_count,
+            'model_used': model_used,
+            'response_time': response_time,
+            'features_used': {
+                'image_generation': self.config.features.enable_image_generation,
+                'deep_thinking': self.config.features.enable_deep_thinking
             }
-            
-            response = self.session.post(
-                events_url,
-                headers=headers,
-                json=event_payload,
-                timeout=5  # Short timeout for analytics
+        })
+
+    def send_usage_analytics(self, daily_stats: Dict[str, Any]) -> bool:
+        """Send usage analytics to Hub"""
+        return self.send_event('usage_analytics', daily_stats)
+
+    def get_event_metrics(self) -> Dict[str, Any]:
+        """Drop rate, lag and spill buffer size for event shipping"""
+        if not self.config.connection.enable_hub_integration:
+            return {}
+        return self.event_pipeline.get_metrics()
+
+    def get_hub_configuration(self) -> Optional[Dict[str, Any]]:
+        """Get configuration updates from Hub (pushed over WebSocket when connected)"""
+        client = find_websocket_client(self.config)
+        if client and client.stats['connected']:
+            return client.latest_config
+
+        try:
+            response = self.session.get(
+                f"{self.base_url}/api/apps/{self.config.connection.app_id}/config",
+                timeout=self.timeout
             )
-            
-            return response.status_code in [200, 201, 202]
-            
-        except:
-            # Silently fail for analytics
-            return False
+
+            if response.status_code == 200:
+                self.last_sync = datetime.now()
+                return response.json()
+            return None
+
+        except Exception:
+            return None
+
+    def start_realtime_sync(self) -> Optional[HubWebSocketClient]:
+        """Start the managed WebSocket link; config pushed by the Hub is applied automatically"""
+        return get_websocket_client(self.config)
+
+    def get_realtime_status(self) -> Dict[str, Any]:
+        """Connection state and counters for the WebSocket link (does not start it)"""
+        client = find_websocket_client(self.config)
+        if client:
+            return client.get_status()
+        return {'connected': False, 'enabled': realtime_sync_enabled(self.config), 'started': False}
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """Connection pool settings and currently open pools"""
+        adapter = self.session.get_adapter(self.base_url or 'http://')
+        return {
+            'pool_connections': POOL_CONNECTIONS,
+            'pool_maxsize': POOL_MAXSIZE,
+            'open_pools': len(adapter.poolmanager.pools),
+            'timeout': self.timeout
+        }
+
+    # Async API: the same pooled session, run off the event loop
+
+    async def atest_connection(self) -> Dict[str, Any]:
+        return await asyncio.to_thread(self.test_connection)
+
+    async def aregister_app(self) -> Dict[str, Any]:
+        return await asyncio.to_thread(self.register_app)
+
+    async def asend_event(self, event_type: str, event_data: Dict[str, Any]) -> bool:
+        # Publishing only enqueues, so it is safe to call on the loop directly
+        return self.send_event(event_type, event_data)
+
+    async def aget_hub_configuration(self) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self.get_hub_configuration)
+
+def create_hub_connection(config: WhiteLabelConfig) -> HubConnectionManager:
+    """Factory function to create Hub connection manager"""
+    return HubConnectionManager(config)
@@ -0,0 +1,300 @@
+"""
+Background event shipping to the Central Hub Dashboard
+
+Events are put on a bounded in-memory queue and returned immediately, so a chat
+turn never waits on the hub. A sender thread batches them into one gzip POST,
+retries with exponential backoff, and spills batches to disk while the hub is
+unreachable. Spilled batches are replayed after the next successful send.
+
+Batches the hub refuses with a 4xx (other than 408/429) are not retried: they
+would fail the same way again, so they go to a dead-letter file next to the
+spill file instead. Each hub URL and app gets its own spill file.
+"""
+
+import os
+import re
+import gzip
+import hashlib
+import json
+import time
+import queue
+import atexit
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+# Client errors worth retrying: the hub timed out reading the body, or is rate limiting
+RETRYABLE_CLIENT_ERRORS = (408, 429)
+
+
+def default_spill_path(url: str, app_id: str) -> str:
+    """Spill file named after the app and hub URL, so pipelines never share one"""
+    app = re.sub(r'[^A-Za-z0-9_.-]+', '_', app_id).strip('_') or 'app'
+    digest = hashlib.sha1(url.encode('utf-8')).hexdigest()[:10]
+    return f"hub_events_spill_{app}_{digest}.jsonl"
+
+
+class HubEventPipeline:
+    """
+    Bounded queue plus a background batching sender for hub events.
+
+    spill_path defaults to default_spill_path(url, app_id); max_spill_bytes=0
+    disables spilling.
+    """
+
+    def __init__(self, url: str, headers: Optional[Dict[str, str]] = None, app_id: str = "",
+                 session: Optional[requests.Session] = None, max_queue_size: int = 10000,
+                 batch_size: int = 100, flush_interval: float = 1.0, max_retries: int = 3,
+                 retry_backoff: float = 0.5, timeout: float = 5.0,
+                 spill_path: Optional[str] = None,
+                 max_spill_bytes: int = 50 * 1024 * 1024):
+        self.url = url
+        self.headers = dict(headers or {})
+        self.app_id = app_id
+        self.session = session or requests.Session()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.timeout = timeout
+        self.spill_path = spill_path or default_spill_path(url, app_id)
+        root, extension = os.path.splitext(self.spill_path)
+        self.dead_letter_path = f"{root}.rejected{extension or '.jsonl'}"
+        self.max_spill_bytes = max_spill_bytes
+
+        self._queue: "queue.Queue[Tuple[float, Dict[str, Any]]]" = queue.Queue(maxsize=max_queue_size)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._thread: Optional[threading.Thread] = None
+
+        self.metrics = {
+            'published': 0,
+            'sent': 0,
+            'dropped': 0,
+            'spilled': 0,
+            'replayed': 0,
+            'rejected': 0,
+            'batches_sent': 0,
+            'send_failures': 0,
+            'last_send_at': None,
+            'last_error': None,
+            'last_lag_seconds': None,
+            'max_lag_seconds': 0.0,
+        }
+
+    def start(self):
+        """Start the sender thread (idempotent)"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="hub-event-sender", daemon=True)
+            self._thread.start()
+
+    def publish(self, event_type: str, event_data: Dict[str, Any]) -> bool:
+        """Queue an event without blocking; returns False if it had to be dropped"""
+        self.start()
+        event = {
+            'app_id': self.app_id,
+            'event_type': event_type,
+            'event_data': event_data,
+            'timestamp': datetime.now().isoformat()
+        }
+        try:
+            self._queue.put_nowait((time.time(), event))
+        except queue.Full:
+            self._count('dropped')
+            return False
+        self._idle.clear()
+        self._count('published')
+        return True
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Wait until everything queued so far has been sent or spilled"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self._queue.empty() and self._idle.wait(0.05):
+                return True
+            time.sleep(0.01)
+        return False
+
+    def close(self, timeout: float = 5.0):
+        """Flush pending events and stop the sender thread"""
+        if not self._thread:
+            return
+        self.flush(timeout)
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Throughput, drop rate, lag and spill buffer size"""
+        with self._lock:
+            metrics = dict(self.metrics)
+        offered = metrics['published'] + metrics['dropped']
+        metrics['queue_depth'] = self._queue.qsize()
+        metrics['drop_rate'] = metrics['dropped'] / offered if offered else 0.0
+        metrics['spill_bytes'] = self._spill_size()
+        return metrics
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self.metrics[key] += amount
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._collect_batch()
+            if not batch:
+                self._idle.set()
+                continue
+
+            events = [event for _, event in batch]
+            outcome = self._send_with_retry(events)
+            if outcome == 'sent':
+                lag = time.time() - batch[0][0]
+                with self._lock:
+                    self.metrics['sent'] += len(events)
+                    self.metrics['last_lag_seconds'] = lag
+                    self.metrics['max_lag_seconds'] = max(self.metrics['max_lag_seconds'], lag)
+                self._replay_spill()
+            elif outcome == 'rejected':
+                self._dead_letter(events)
+            else:
+                self._spill(events)
+
+            if self._queue.empty():
+                self._idle.set()
+
+    def _collect_batch(self) -> List[Tuple[float, Dict[str, Any]]]:
+        """Block for the first event, then gather more until the batch fills or the interval ends"""
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+
+        deadline = time.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _send_batch(self, events: List[Dict[str, Any]]) -> int:
+        body = gzip.compress(json.dumps({'app_id': self.app_id, 'events': events}, default=str).encode('utf-8'))
+        headers = dict(self.headers)
+        headers.update({'Content-Type': 'application/json', 'Content-Encoding': 'gzip'})
+        response = self.session.post(self.url, data=body, headers=headers, timeout=self.timeout)
+        return response.status_code
+
+    def _send_with_retry(self, events: List[Dict[str, Any]]) -> str:
+        """'sent', 'rejected' (the hub refused the batch itself) or 'failed' (hub unavailable)"""
+        for attempt in range(self.max_retries + 1):
+            rejected = False
+            try:
+                status = self._send_batch(events)
+                if status in [200, 201, 202]:
+                    with self._lock:
+                        self.metrics['batches_sent'] += 1
+                        self.metrics['last_send_at'] = datetime.now().isoformat()
+                    return 'sent'
+                error = f"Hub rejected event batch (HTTP {status})"
+                rejected = 400 <= status < 500 and status not in RETRYABLE_CLIENT_ERRORS
+            except requests.RequestException as e:
+                error = str(e)
+
+            with self._lock:
+                self.metrics['send_failures'] += 1
+                self.metrics['last_error'] = error
+            if rejected:
+                return 'rejected'
+            if attempt < self.max_retries and not self._stop.wait(self.retry_backoff * (2 ** attempt)):
+                continue
+            break
+        return 'failed'
+
+    def _spill_size(self) -> int:
+        if not os.path.exists(self.spill_path):
+            return 0
+        return os.path.getsize(self.spill_path)
+
+    def _spill(self, events: List[Dict[str, Any]]):
+        """Append an undeliverable batch to the spill file, dropping it if the file is full"""
+        if self._spill_size() >= self.max_spill_bytes:
+            self._count('dropped', len(events))
+            return
+        self._append(self.spill_path, events, 'spilled')
+
+    def _dead_letter(self, events: List[Dict[str, Any]]):
+        """Keep a batch the hub refused for inspection; it is never replayed"""
+        if self.max_spill_bytes <= 0 or (os.path.exists(self.dead_letter_path)
+                                         and os.path.getsize(self.dead_letter_path) >= self.max_spill_bytes):
+            self._count('dropped', len(events))
+            return
+        self._append(self.dead_letter_path, events, 'rejected')
+
+    def _append(self, path: str, events: List[Dict[str, Any]], metric: str):
+        try:
+            with open(path, 'a') as f:
+                f.write(json.dumps(events, default=str) + '\n')
+        except OSError:
+            self._count('dropped', len(events))
+            return
+        self._count(metric, len(events))
+
+    def _replay_spill(self):
+        """Resend spilled batches now that the hub is reachable again"""
+        if not self._spill_size():
+            return
+
+        replay_path = f"{self.spill_path}.replay"
+        os.replace(self.spill_path, replay_path)
+        with open(replay_path) as f:
+            batches = [json.loads(line) for line in f if line.strip()]
+        os.remove(replay_path)
+
+        for index, events in enumerate(batches):
+            outcome = self._send_with_retry(events)
+            if outcome == 'failed':
+                for remaining in batches[index:]:
+                    self._spill(remaining)
+                return
+            if outcome == 'rejected':
+                self._dead_letter(events)
+            else:
+                self._count('replayed', len(events))
+
+
+_pipelines: Dict[Tuple[str, str], HubEventPipeline] = {}
+_pipelines_lock = threading.Lock()
+
+
+def get_event_pipeline(url: str, headers: Dict[str, str], app_id: str, **kwargs) -> HubEventPipeline:
+    """
+    Shared pipeline per hub URL and app.
+
+    Streamlit builds new connection managers on every rerun, so pipelines live
+    at module level to keep one sender thread and one spill file per hub.
+    """
+    key = (url, app_id)
+    with _pipelines_lock:
+        pipeline = _pipelines.get(key)
+        if pipeline is None:
+            pipeline = HubEventPipeline(url, headers=headers, app_id=app_id, **kwargs)
+            _pipelines[key] = pipeline
+        else:
+            pipeline.headers.update(headers)
+        return pipeline
+
+
+@atexit.register
+def _flush_pipelines():
+    for pipeline in list(_pipelines.values()):
+        pipeline.close(timeout=2.0)
@@ -0,0 +1,294 @@
+"""
+Managed WebSocket link to the Central Hub Dashboard
+
+One connection per hub runs on a dedicated asyncio loop thread. It reconnects
+with exponential backoff, uses WebSocket ping/pong for liveness, and multiplexes
+config pushes, events and commands by message type. Config updates pushed by the
+hub are applied to WhiteLabelConfig and saved, so no polling is needed. Only
+branding and feature settings of the right type are accepted from a push; the
+connection settings (hub URLs, API key) never change remotely.
+"""
+
+import json
+import random
+import asyncio
+import threading
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+try:
+    from websockets.asyncio.client import connect as ws_connect
+    HEADERS_ARG = 'additional_headers'
+except ImportError:  # websockets < 13
+    from websockets import connect as ws_connect
+    HEADERS_ARG = 'extra_headers'
+
+from white_label_config import WhiteLabelConfig
+
+Handler = Callable[[Dict[str, Any]], Union[None, Dict[str, Any], Awaitable[Any]]]
+
+
+class HubWebSocketClient:
+    """Reconnecting, multiplexed WebSocket client running on its own event loop thread"""
+
+    def __init__(self, config: WhiteLabelConfig, ping_interval: float = 20.0, ping_timeout: float = 20.0,
+                 min_backoff: float = 1.0, max_backoff: float = 60.0, max_outbound: int = 1000,
+                 persist_config: bool = True):
+        self.config = config
+        self.url = f"{config.connection.hub_websocket_url.rstrip('/')}/ws/{config.connection.app_id}"
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.max_outbound = max_outbound
+        self.persist_config = persist_config
+
+        self.handlers: Dict[str, List[Handler]] = {}
+        self.latest_config: Dict[str, Any] = {}
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._outbound: Optional[asyncio.Queue] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self._websocket = None
+        self._lock = threading.Lock()
+        self._config_lock = threading.Lock()
+
+        self.stats = {
+            'connected': False,
+            'connects': 0,
+            'disconnects': 0,
+            'messages_received': 0,
+            'messages_sent': 0,
+            'outbound_dropped': 0,
+            'config_updates': 0,
+            'config_rejected': 0,
+            'last_message_at': None,
+            'last_error': None,
+        }
+
+        self.on('config_update', self._handle_config_update)
+        self.on('ping', lambda message: {'type': 'pong', 'id': message.get('id')})
+
+    def on(self, message_type: str, handler: Handler):
+        """
+        Register a handler for a message type.
+
+        Handlers run on the client's event loop and may be sync or async. For
+        'command' messages a returned dict is sent back as the command result.
+        """
+        self.handlers.setdefault(message_type, []).append(handler)
+
+    def start(self):
+        """Start the loop thread and connection task (idempotent)"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._loop = asyncio.new_event_loop()
+            ready = threading.Event()
+            self._thread = threading.Thread(target=self._run_loop, args=(ready,), name="hub-websocket", daemon=True)
+            self._thread.start()
+            ready.wait()
+
+    def stop(self, timeout: float = 5.0):
+        """Close the connection and stop the loop thread"""
+        if not self._thread or not self._loop:
+            return
+        self._loop.call_soon_threadsafe(self._stopping.set)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def send(self, message: Dict[str, Any]) -> bool:
+        """
+        Queue a message for the hub from any thread.
+
+        Messages wait in a bounded queue while disconnected; when it is full
+        the message is dropped and False is returned.
+        """
+        if not self._loop or not self._thread:
+            return False
+        future = asyncio.run_coroutine_threadsafe(self._enqueue(message), self._loop)
+        return future.result(timeout=1)
+
+    def send_event(self, event_type: str, event_data: Dict[str, Any]) -> bool:
+        """Send an event over the shared connection"""
+        return self.send({
+            'type': 'event',
+            'event_type': event_type,
+            'event_data': event_data,
+            'timestamp': datetime.now().isoformat()
+        })
+
+    def apply_to(self, config: WhiteLabelConfig) -> Dict[str, List[str]]:
+        """Apply the latest pushed configuration to another config instance"""
+        with self._config_lock:
+            return config.apply_config_update(self.latest_config)
+
+    def get_status(self) -> Dict[str, Any]:
+        """Connection state and message counters"""
+        status = dict(self.stats)
+        status['outbound_queue'] = self._outbound.qsize() if self._outbound else 0
+        status['url'] = self.url
+        return status
+
+    def _run_loop(self, ready: threading.Event):
+        asyncio.set_event_loop(self._loop)
+        self._outbound = asyncio.Queue(maxsize=self.max_outbound)
+        self._stopping = asyncio.Event()
+        ready.set()
+        try:
+            self._loop.run_until_complete(self._connection_loop())
+        finally:
+            self._loop.close()
+
+    async def _enqueue(self, message: Dict[str, Any]) -> bool:
+        try:
+            self._outbound.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            self.stats['outbound_dropped'] += 1
+            return False
+
+    async def _connection_loop(self):
+        backoff = self.min_backoff
+        while not self._stopping.is_set():
+            try:
+                async with ws_connect(
+                    self.url,
+                    ping_interval=self.ping_interval,
+                    ping_timeout=self.ping_timeout,
+                    **{HEADERS_ARG: {'X-API-Key': self.config.connection.hub_api_key}}
+                ) as websocket:
+                    self._websocket = websocket
+                    self.stats['connected'] = True
+                    self.stats['connects'] += 1
+                    backoff = self.min_backoff
+
+                    await websocket.send(json.dumps({
+                        'action': 'subscribe',
+                        'app_id': self.config.connection.app_id,
+                        'channels': sorted(self.handlers)
+                    }))
+                    await self._serve(websocket)
+
+            except Exception as e:
+                self.stats['last_error'] = str(e)
+            finally:
+                if self.stats['connected']:
+                    self.stats['disconnects'] += 1
+                self.stats['connected'] = False
+                self._websocket = None
+
+            if self._stopping.is_set():
+                break
+
+            # Full jitter so many apps do not reconnect to the hub in lockstep
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=random.uniform(0, backoff))
+            except asyncio.TimeoutError:
+                pass
+            backoff = min(backoff * 2, self.max_backoff)
+
+    async def _serve(self, websocket):
+        """Run reader and writer until either fails or the client is stopped"""
+        tasks = [
+            asyncio.ensure_future(self._reader(websocket)),
+            asyncio.ensure_future(self._writer(websocket)),
+            asyncio.ensure_future(self._stopping.wait()),
+        ]
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        for task in done:
+            if task.exception():
+                raise task.exception()
+
+    async def _reader(self, websocket):
+        async for raw in websocket:
+            try:
+                message = json.loads(raw)
+            except ValueError:
+                continue
+            self.stats['messages_received'] += 1
+            self.stats['last_message_at'] = datetime.now().isoformat()
+            await self._dispatch(message)
+
+    async def _writer(self, websocket):
+        while True:
+            message = await self._outbound.get()
+            try:
+                await websocket.send(json.dumps(message, default=str))
+            except Exception:
+                # Keep the message for the next connection
+                if not self._outbound.full():
+                    self._outbound.put_nowait(message)
+                raise
+            self.stats['messages_sent'] += 1
+
+    async def _dispatch(self, message: Dict[str, Any]):
+        for handler in self.handlers.get(message.get('type'), []):
+            try:
+                result = handler(message)
+                if asyncio.iscoroutine(result):
+                    result = await result
+            except Exception as e:
+                result = {'success': False, 'error': str(e)} if message.get('type') == 'command' else None
+            if isinstance(result, dict):
+                if message.get('type') == 'command':
+                    result = {'type': 'command_result', 'id': message.get('id'), **result}
+                await self._enqueue(result)
+
+    def _handle_config_update(self, message: Dict[str, Any]):
+        update, rejected = self.config.filter_remote_update(message.get('config') or {})
+        if rejected:
+            self.stats['config_rejected'] += len(rejected)
+            self.stats['last_error'] = f"Rejected pushed config keys: {', '.join(rejected)}"
+        with self._config_lock:
+            for section, values in update.items():
+                self.latest_config.setdefault(section, {}).update(values)
+            changed = self.config.apply_config_update(update)
+        self.stats['config_updates'] += 1
+        if changed and self.persist_config:
+            self.config.save_config()
+        return {'type': 'config_ack', 'id': message.get('id'), 'changed': changed, 'rejected': rejected}
+
+
+_clients: Dict[str, HubWebSocketClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_websocket_client(config: WhiteLabelConfig) -> Optional[HubWebSocketClient]:
+    """
+    Shared, started client for the configured hub, or None when real-time sync is off.
+
+    Streamlit reruns create new configs, so one client per hub lives at module level.
+    """
+    key = _client_key(config)
+    if key is None:
+        return None
+
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = HubWebSocketClient(config)
+            _clients[key] = client
+        client.start()
+        return client
+
+
+def find_websocket_client(config: WhiteLabelConfig) -> Optional[HubWebSocketClient]:
+    """The shared client if one was already started; never starts one (for read-only callers)"""
+    key = _client_key(config)
+    with _clients_lock:
+        return _clients.get(key) if key else None
+
+
+def realtime_sync_enabled(config: WhiteLabelConfig) -> bool:
+    return _client_key(config) is not None
+
+
+def _client_key(config: WhiteLabelConfig) -> Optional[str]:
+    connection = config.connection
+    if not (connection.enable_hub_integration and connection.enable_real_time_sync and connection.hub_websocket_url):
+        return None
+    return f"{connection.hub_websocket_url}|{connection.app_id}"
@@ -0,0 +1,151 @@
+"""
+Content-addressed store for generated images
+
+Generated image URLs expire, so images are downloaded in the background
+(streamed, with timeouts and a size cap) and kept on disk under their SHA-256.
+Each asset also gets a full-size WebP and a small WebP thumbnail for the chat
+view. Thumbnails are served as cached data URIs, so rendering chat history does
+not refetch or re-decode full-size images on every rerun.
+"""
+
+import os
+import base64
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+from PIL import Image
+
+CONTENT_EXTENSIONS = {'image/png': 'png', 'image/jpeg': 'jpg', 'image/webp': 'webp', 'image/gif': 'gif'}
+
+
+class ImageAssetStore:
+    """Background downloads into a content-addressed directory with WebP renditions"""
+
+    def __init__(self, root: str = "generated_images", thumbnail_size: Tuple[int, int] = (384, 384),
+                 webp_quality: int = 80, max_bytes: int = 25 * 1024 * 1024,
+                 timeout: Tuple[float, float] = (5.0, 30.0), workers: int = 4, max_downloads: int = 1024):
+        self.root = root
+        self.thumbnail_size = thumbnail_size
+        self.webp_quality = webp_quality
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.max_downloads = max_downloads
+        self.session = requests.Session()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image-assets")
+        # Download futures by URL in least-recently-used order; finished ones are evicted past max_downloads
+        self._downloads: 'OrderedDict[str, Future]' = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _asset_dir(self, asset_id: str) -> str:
+        return os.path.join(self.root, asset_id[:2])
+
+    def paths(self, asset_id: str) -> Dict[str, str]:
+        directory = self._asset_dir(asset_id)
+        return {
+            'webp': os.path.join(directory, f"{asset_id}.webp"),
+            'thumbnail': os.path.join(directory, f"{asset_id}_thumb.webp")
+        }
+
+    def submit(self, url: str, retry_failed: bool = False) -> Future:
+        """Start (or join) the background download of url; a failed download is only retried on request"""
+        with self._lock:
+            future = self._downloads.get(url)
+            if future is None or (retry_failed and future.done() and future.exception()):
+                future = self._downloads[url] = self._executor.submit(self._download, url)
+                self._evict_finished()
+            self._downloads.move_to_end(url)
+            return future
+
+    def _evict_finished(self):
+        # Called with the lock held; in-flight downloads are never dropped
+        excess = len(self._downloads) - self.max_downloads
+        if excess <= 0:
+            return
+        for url in [url for url, future in self._downloads.items() if future.done()][:excess]:
+            del self._downloads[url]
+
+    def fetch(self, url: str, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Download and wait; None on failure"""
+        try:
+            return self.submit(url, retry_failed=True).result(timeout=timeout)
+        except Exception as e:
+            print(f"Image download failed for {url[:80]}: {e}")
+            return None
+
+    def lookup(self, url: str) -> Optional[Dict[str, Any]]:
+        """The asset for url if its download has finished successfully; never blocks"""
+        with self._lock:
+            future = self._downloads.get(url)
+            if future is not None:
+                self._downloads.move_to_end(url)
+        if future is None or not future.done() or future.exception():
+            return None
+        return future.result()
+
+    def _download(self, url: str) -> Dict[str, Any]:
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix='.download_')
+        try:
+            with os.fdopen(fd, 'wb') as f, \
+                    self.session.get(url, stream=True, timeout=self.timeout) as response:
+                response.raise_for_status()
+                content_type = response.headers.get('Content-Type', '').split(';')[0].strip()
+                for chunk in response.iter_content(64 * 1024):
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise ValueError(f"Image larger than {self.max_bytes} bytes")
+                    digest.update(chunk)
+                    f.write(chunk)
+
+            asset_id = digest.hexdigest()
+            directory = self._asset_dir(asset_id)
+            os.makedirs(directory, exist_ok=True)
+            extension = CONTENT_EXTENSIONS.get(content_type, 'img')
+            original = os.path.join(directory, f"{asset_id}.{extension}")
+            if os.path.exists(original):
+                os.unlink(tmp_path)
+            else:
+                os.replace(tmp_path, original)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        paths = self.paths(asset_id)
+        with Image.open(original) as image:
+            width, height = image.size
+            if not (os.path.exists(paths['webp']) and os.path.exists(paths['thumbnail'])):
+                image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+                self._write_atomic(image, paths['webp'])
+                image.thumbnail(self.thumbnail_size)
+                self._write_atomic(image, paths['thumbnail'])
+
+        return {'asset_id': asset_id, 'original': original, 'width': width, 'height': height,
+                'bytes': size, **paths}
+
+    def _write_atomic(self, image: Image.Image, path: str):
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        image.save(tmp_path, format='WEBP', quality=self.webp_quality)
+        os.replace(tmp_path, path)
+
+    def thumbnail_data_uri(self, asset_id: str) -> Optional[str]:
+        """Thumbnail as a data URI for HTML chat rendering (cached after the first read)"""
+        path = self.paths(asset_id)['thumbnail']
+        return _read_data_uri(path) if os.path.exists(path) else None
+
+
+@lru_cache(maxsize=256)
+def _read_data_uri(path: str) -> str:
+    with open(path, 'rb') as f:
+        return "data:image/webp;base64," + base64.b64encode(f.read()).decode('ascii')
+
+
+image_asset_store = ImageAssetStore()
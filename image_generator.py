@@ -1,9 +1,60 @@
 import os
-import requests
+import json
+import time
 import base64
-from io import BytesIO
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from PIL import Image
 import openai
+from image_asset_store import image_asset_store
+from model_usage_tracker import ModelUsageTracker, model_usage_tracker
+from metrics import CACHE_REQUESTS
+
+# Price per image by model, quality and size (USD)
+IMAGE_PRICES = {
+    ('dall-e-3', 'standard', '1024x1024'): 0.04,
+    ('dall-e-3', 'standard', '1792x1024'): 0.08,
+    ('dall-e-3', 'standard', '1024x1792'): 0.08,
+    ('dall-e-3', 'hd', '1024x1024'): 0.08,
+    ('dall-e-3', 'hd', '1792x1024'): 0.12,
+    ('dall-e-3', 'hd', '1024x1792'): 0.12,
+    ('dall-e-2', 'standard', '1024x1024'): 0.02,
+    ('dall-e-2', 'standard', '512x512'): 0.018,
+    ('dall-e-2', 'standard', '256x256'): 0.016,
+}
+
+# Images one API request may return (DALL-E 3 only supports n=1)
+MAX_IMAGES_PER_REQUEST = {'dall-e-3': 1, 'dall-e-2': 10}
+
+PROMPT_IMPROVEMENT_TEMPLATE = """
+You are an expert at crafting detailed, effective prompts for AI image generation. 
+Transform the user's basic prompt into a highly detailed, specific prompt that will generate better images.
+
+Original prompt: "{prompt}"
+
+Improve this prompt by:
+1. Adding specific artistic style details
+2. Including lighting and composition information
+3. Specifying colors, textures, and mood
+4. Adding technical photography/art terms
+5. Being more descriptive about subjects and settings
+6. Keeping the core intent but making it much more detailed
+
+Return only the improved prompt, nothing else.
+"""
+
+PROMPT_BATCH_TEMPLATE = """
+You are an expert at crafting detailed, effective prompts for AI image generation.
+Transform each of the user's basic prompts below into a highly detailed, specific prompt,
+adding style, lighting, composition, color, texture and mood while keeping its core intent.
+
+Original prompts:
+{prompts}
+
+Return a JSON object of the form {{"prompts": ["...", "..."]}} with exactly one improved
+prompt per original, in the same order.
+"""
 
 class ImageGenerator:
     """
@@ -16,6 +67,14 @@ class ImageGenerator:
             "DALL-E 2": "dall-e-2",
             "Stable Diffusion": "stable-diffusion"  # Placeholder for future integration
         }
+        # Concurrent image requests per batch
+        self.max_parallel_requests = int(os.environ.get("IMAGE_GENERATION_PARALLELISM", "4"))
+        # Prompt improvement is frequent and low-value, so it defaults to the small model
+        self.prompt_model = os.environ.get("IMAGE_PROMPT_MODEL", "gpt-4o-mini")
+        self.prompt_cache_ttl = int(os.environ.get("IMAGE_PROMPT_CACHE_TTL", "86400"))
+        self.prompt_cache_size = 512
+        self._prompt_cache = OrderedDict()
+        self._prompt_cache_lock = threading.Lock()
 
     def generate_image(self, prompt, model="dall-e-3", size="1024x1024", quality="standard", style="vivid", reference_image_url=None):
         """Generate an image using the specified model"""
@@ -27,120 +86,255 @@ class ImageGenerator:
         else:
             return {"error": f"Unsupported model: {model}"}
 
+    @staticmethod
+    def image_cost(model, size, quality="standard"):
+        """Estimated price of one image"""
+        quality = quality if model == "dall-e-3" else "standard"
+        return IMAGE_PRICES.get((model, quality, size), 0.08 if quality == "hd" else 0.04)
+
+    def _request_dalle_images(self, client, prompt, model, size, quality, style, n):
+        """One images.generate call; returns the image URLs"""
+        if model == "dall-e-3":
+            response = client.images.generate(
+                model=model,
+                prompt=prompt,
+                size=size,
+                quality=quality,
+                style=style,
+                n=n
+            )
+        else:  # DALL-E 2
+            response = client.images.generate(
+                model=model,
+                prompt=prompt,
+                size=size,
+                n=n
+            )
+        return [image.url for image in response.data]
+
     def _generate_dalle_image(self, prompt, model, size, quality, style, reference_image_url):
         """Generate image using OpenAI's DALL-E"""
+        for result in self.generate_images(prompt, 1, model, size, quality, style, reference_image_url):
+            if not result.get("success") and "error_message" not in result:
+                return {"error": result["error"]}
+            return result
+        return {"error": "DALL-E API Error: no image returned"}
+
+    def generate_images(self, prompt, count=1, model="dall-e-3", size="1024x1024", quality="standard",
+                        style="vivid", reference_image_url=None, parallelism=None):
+        """
+        Generate count images, yielding each result as soon as it completes.
+        Requests run concurrently (up to parallelism) and use n>1 where the model
+        allows it. Usage limits are checked once per batch and usage is charged
+        per image returned.
+        """
+        if model not in MAX_IMAGES_PER_REQUEST:
+            yield {"success": False, "error": f"Unsupported model: {model}"}
+            return
+
         api_key = os.environ.get("OPENAI_API_KEY")
         if not api_key:
-            return {"error": "OpenAI API key not found. Please add your OPENAI_API_KEY to Secrets."}
+            yield {"success": False, "error": "OpenAI API key not found. Please add your OPENAI_API_KEY to Secrets."}
+            return
 
-        try:
-            client = openai.OpenAI(api_key=api_key)
-
-            # Add reference image info to prompt if provided
-            if reference_image_url:
-                prompt = f"{prompt}\n\nReference image style: {reference_image_url}"
-
-            if model == "dall-e-3":
-                # Check usage limits before generating
-                from usage_monitor import usage_monitor
-                service_status = usage_monitor.is_service_blocked()
-                if service_status['any_blocked']:
-                    return {
-                        'success': False,
-                        'error_message': 'Image generation temporarily unavailable due to usage limits.',
-                        'image_url': None
-                    }
-
-                response = client.images.generate(
-                    model=model,
-                    prompt=prompt,
-                    size=size,
-                    quality=quality,
-                    style=style,
-                    n=1
-                )
-
-                # Track image generation usage
-                estimated_cost = 0.04 if quality == "standard" else 0.08  # DALL-E-3 pricing
-                usage_monitor.track_usage("image", 1, estimated_cost)
-            else:  # DALL-E 2
-                response = client.images.generate(
-                    model=model,
-                    prompt=prompt,
-                    size=size,
-                    n=1
-                )
-
-            image_url = response.data[0].url
-
-            return {
-                "success": True,
-                "image_url": image_url,
-                "model": model,
-                "prompt": prompt,
-                "size": size
+        # Check usage limits before generating
+        from usage_monitor import usage_monitor
+        service_status = usage_monitor.is_service_blocked()
+        if service_status['any_blocked']:
+            yield {
+                'success': False,
+                'error': 'Image generation temporarily unavailable due to usage limits.',
+                'error_message': 'Image generation temporarily unavailable due to usage limits.',
+                'image_url': None
             }
+            return
 
-        except Exception as e:
-            return {"error": f"DALL-E API Error: {str(e)}"}
+        # Add reference image info to prompt if provided
+        if reference_image_url:
+            prompt = f"{prompt}\n\nReference image style: {reference_image_url}"
+
+        client = openai.OpenAI(api_key=api_key)
+        per_request = MAX_IMAGES_PER_REQUEST[model]
+        batches = [min(per_request, count - start) for start in range(0, count, per_request)]
+        cost_per_image = self.image_cost(model, size, quality)
+        index = 0
+
+        workers = max(1, min(parallelism or self.max_parallel_requests, len(batches)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image-gen") as executor:
+            futures = [executor.submit(self._request_dalle_images, client, prompt, model, size, quality, style, n)
+                       for n in batches]
+            for future in as_completed(futures):
+                try:
+                    urls = future.result()
+                except Exception as e:
+                    yield {"success": False, "error": f"DALL-E API Error: {str(e)}"}
+                    continue
+
+                # Track image generation usage (on this thread; the monitor is not thread-safe)
+                usage_monitor.track_usage("image", len(urls), cost_per_image * len(urls))
+                for image_url in urls:
+                    # Keep a local copy before the URL expires
+                    image_asset_store.submit(image_url)
+                    index += 1
+                    yield {
+                        "success": True,
+                        "image_url": image_url,
+                        "model": model,
+                        "prompt": prompt,
+                        "size": size,
+                        "index": index,
+                        "cost": cost_per_image
+                    }
 
     def _generate_stable_diffusion_image(self, prompt):
         """Placeholder for Stable Diffusion integration"""
         return {"error": "Stable Diffusion integration not yet implemented. Use DALL-E models for now."}
 
-    def improve_prompt(self, user_prompt):
-        """Improve user's image prompt using AI"""
-        api_key = os.environ.get("OPENAI_API_KEY")
-        if not api_key:
-            return {"error": "OpenAI API key not found. Please add your OPENAI_API_KEY to Secrets."}
+    @staticmethod
+    def _prompt_key(prompt):
+        """Cache key: case- and whitespace-insensitive"""
+        return " ".join(prompt.lower().split())
 
-        try:
-            client = openai.OpenAI(api_key=api_key)
+    def _cached_prompt(self, key):
+        with self._prompt_cache_lock:
+            entry = self._prompt_cache.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                del self._prompt_cache[key]
+                return None
+            self._prompt_cache.move_to_end(key)
+            return entry[1]
 
-            improvement_prompt = f"""
-You are an expert at crafting detailed, effective prompts for AI image generation. 
-Transform the user's basic prompt into a highly detailed, specific prompt that will generate better images.
+    def _cache_prompt(self, key, improved_prompt):
+        with self._prompt_cache_lock:
+            self._prompt_cache[key] = (time.time() + self.prompt_cache_ttl, improved_prompt)
+            self._prompt_cache.move_to_end(key)
+            while len(self._prompt_cache) > self.prompt_cache_size:
+                self._prompt_cache.popitem(last=False)
 
-Original prompt: "{user_prompt}"
-
-Improve this prompt by:
-1. Adding specific artistic style details
-2. Including lighting and composition information
-3. Specifying colors, textures, and mood
-4. Adding technical photography/art terms
-5. Being more descriptive about subjects and settings
-6. Keeping the core intent but making it much more detailed
-
-Return only the improved prompt, nothing else.
-"""
+    def _request_prompt_improvement(self, client, prompts):
+        """One chat completion improving all prompts; tracked like any other model call"""
+        model = self.prompt_model
+        if len(prompts) == 1:
+            content = PROMPT_IMPROVEMENT_TEMPLATE.format(prompt=prompts[0])
+            extra = {}
+        else:
+            content = PROMPT_BATCH_TEMPLATE.format(
+                prompts="\n".join(f"{number}. \"{prompt}\"" for number, prompt in enumerate(prompts, start=1))
+            )
+            extra = {"response_format": {"type": "json_object"}}
 
+        start_time = time.time()
+        try:
             response = client.chat.completions.create(
-                model="gpt-4o",
+                model=model,
                 messages=[
                     {"role": "system", "content": "You are an expert prompt engineer for AI image generation."},
-                    {"role": "user", "content": improvement_prompt}
+                    {"role": "user", "content": content}
                 ],
                 temperature=0.7,
-                max_tokens=300
+                max_tokens=min(300 * len(prompts), 4000),
+                **extra
             )
+        except Exception:
+            model_usage_tracker.track_usage(model, 0, 0, success=False)
+            raise
 
-            improved_prompt = response.choices[0].message.content.strip()
+        usage = getattr(response, "usage", None)
+        input_tokens = getattr(usage, "prompt_tokens", 0) or len(content) // 4
+        output_tokens = getattr(usage, "completion_tokens", 0) or 0
+        model_usage_tracker.track_usage(model, input_tokens, output_tokens, True,
+                                        response_time=time.time() - start_time)
 
-            return {
-                "success": True,
-                "improved_prompt": improved_prompt,
-                "original_prompt": user_prompt
-            }
+        from usage_monitor import usage_monitor
+        pricing = ModelUsageTracker.MODEL_PRICING.get(model)
+        usage_monitor.track_usage("api_call", 1, pricing.calculate_cost(input_tokens, output_tokens) if pricing else 0.0)
+        usage_monitor.track_usage("tokens", input_tokens + output_tokens)
+
+        text = response.choices[0].message.content.strip()
+        if len(prompts) == 1:
+            return [text]
+        improved = json.loads(text).get("prompts", [])
+        if len(improved) != len(prompts) or not all(isinstance(item, str) for item in improved):
+            raise ValueError(f"expected {len(prompts)} improved prompts, got {len(improved)}")
+        return [item.strip() for item in improved]
+
+    def improve_prompt(self, user_prompt):
+        """Improve user's image prompt using AI"""
+        return self.improve_prompts([user_prompt])[0]
 
+    def improve_prompts(self, user_prompts):
+        """
+        Improve several prompts, answering repeats from the cache and sending the
+        rest to the prompt model in a single request. Returns one result per prompt.
+        """
+        results = [None] * len(user_prompts)
+        pending = {}
+        for position, user_prompt in enumerate(user_prompts):
+            key = self._prompt_key(user_prompt)
+            cached = self._cached_prompt(key)
+            CACHE_REQUESTS.inc(cache="image_prompt", result="miss" if cached is None else "hit")
+            if cached is not None:
+                results[position] = {"success": True, "improved_prompt": cached,
+                                     "original_prompt": user_prompt, "cached": True}
+            else:
+                pending.setdefault(key, []).append(position)
+
+        if pending:
+            error = self._improve_pending(user_prompts, pending, results)
+            for positions in pending.values():
+                for position in positions:
+                    if results[position] is None:
+                        results[position] = {"error": error}
+        return results
+
+    def _improve_pending(self, user_prompts, pending, results):
+        """Fill results for uncached prompts; returns the error message for any left unfilled"""
+        api_key = os.environ.get("OPENAI_API_KEY")
+        if not api_key:
+            return "OpenAI API key not found. Please add your OPENAI_API_KEY to Secrets."
+
+        from usage_monitor import usage_monitor
+        if usage_monitor.is_service_blocked()['any_blocked']:
+            return "Prompt improvement temporarily unavailable due to usage limits."
+        available, reason = model_usage_tracker.is_model_available(self.prompt_model)
+        if not available:
+            return f"Prompt improvement unavailable: {reason}"
+
+        client = openai.OpenAI(api_key=api_key)
+        keys = list(pending)
+        prompts = [user_prompts[pending[key][0]] for key in keys]
+        error = "Prompt improvement error: no result returned"
+        try:
+            improved = self._request_prompt_improvement(client, prompts)
         except Exception as e:
-            return {"error": f"Prompt improvement error: {str(e)}"}
+            if len(prompts) == 1:
+                return f"Prompt improvement error: {str(e)}"
+            # A malformed batch answer falls back to one request per prompt
+            improved = []
+            for prompt in prompts:
+                try:
+                    improved.extend(self._request_prompt_improvement(client, [prompt]))
+                except Exception as e:
+                    improved.append(None)
+                    error = f"Prompt improvement error: {str(e)}"
+
+        for key, improved_prompt in zip(keys, improved):
+            if improved_prompt is None:
+                continue
+            self._cache_prompt(key, improved_prompt)
+            for position in pending[key]:
+                results[position] = {"success": True, "improved_prompt": improved_prompt,
+                                     "original_prompt": user_prompts[position], "cached": False}
+        return error
 
-    def download_image(self, image_url):
-        """Download image from URL and return as PIL Image"""
+    def download_image(self, image_url, timeout=60):
+        """Download image from URL (via the asset store) and return as PIL Image"""
+        asset = image_asset_store.fetch(image_url, timeout=timeout)
+        if not asset:
+            return None
         try:
-            response = requests.get(image_url)
-            response.raise_for_status()
-            image = Image.open(BytesIO(response.content))
-            return image
+            return Image.open(asset['original'])
         except Exception as e:
             return None
\ No newline at end of file
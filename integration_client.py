@@ -0,0 +1,198 @@
+"""
+Pooled, concurrent HTTP client for outbound business-system integrations
+
+Each registered endpoint gets its own keep-alive session and timeouts. Calls can
+be fanned out concurrently with per-call results, so one slow or failing system
+does not hide the others. Writes carry an Idempotency-Key that is reused across
+retries, and per-endpoint latency is recorded in the shared metrics registry.
+
+Non-idempotent writes (POST, PATCH) are only retried once the request may have
+reached the server if the endpoint is registered as honoring Idempotency-Key;
+otherwise only failures to connect are retried, so a slow write is never
+applied twice.
+"""
+
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from metrics import INTEGRATION_REQUEST_SECONDS, INTEGRATION_REQUESTS
+
+RETRYABLE_STATUS = {429, 502, 503, 504}
+
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+
+class IntegrationClient:
+    """Per-endpoint pooled sessions with timeouts, retries, idempotency keys and fan-out"""
+
+    def __init__(self, connect_timeout: float = 3.0, read_timeout: float = 10.0,
+                 max_retries: int = 2, retry_backoff: float = 0.25, pool_maxsize: int = 10,
+                 max_workers: int = 8):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.pool_maxsize = pool_maxsize
+        self.endpoints: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="integration")
+
+    def register_endpoint(self, name: str, base_url: str, headers: Optional[Dict[str, str]] = None,
+                          timeout: Optional[Tuple[float, float]] = None, honors_idempotency_key: bool = False):
+        """
+        Register (or update) an endpoint with its own connection pool. Set
+        honors_idempotency_key only for receivers that discard duplicate
+        Idempotency-Keys; it allows POST/PATCH retries after timeouts and 5xx.
+        """
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers.update(headers or {})
+
+        with self._lock:
+            previous = self.endpoints.get(name)
+            self.endpoints[name] = {
+                'base_url': base_url.rstrip('/'),
+                'session': session,
+                'timeout': timeout or (self.connect_timeout, self.read_timeout),
+                'honors_idempotency_key': honors_idempotency_key
+            }
+        if previous:
+            previous['session'].close()
+
+    def request(self, endpoint_name: str, method: str, path: str, json: Any = None,
+                idempotency_key: Optional[str] = None, params: Optional[Dict] = None,
+                headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """
+        Call an endpoint and return {'success', 'status_code', 'data' or 'error', 'latency'}.
+        A 304 Not Modified counts as success with 'not_modified' set.
+
+        Connection errors and 429/5xx are retried with backoff. Writes carry an
+        Idempotency-Key (generated when the caller does not supply one) that is
+        sent unchanged on every attempt, so the receiver can discard duplicates.
+        POST and PATCH to endpoints that ignore the key are retried only when the
+        request never reached the server (connection refused or connect timeout)
+        or was rejected with 429.
+        """
+        endpoint = self.endpoints[endpoint_name]
+        method = method.upper()
+        headers = dict(headers or {})
+        if method != 'GET':
+            idempotency_key = idempotency_key or str(uuid.uuid4())
+            headers['Idempotency-Key'] = idempotency_key
+        retry_after_send = method in IDEMPOTENT_METHODS or endpoint['honors_idempotency_key']
+
+        start = time.perf_counter()
+        result: Dict[str, Any] = {'success': False}
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = endpoint['session'].request(
+                    method, f"{endpoint['base_url']}{path}", json=json, params=params,
+                    headers=headers, timeout=endpoint['timeout']
+                )
+                result = self._to_result(response)
+                if response.status_code not in RETRYABLE_STATUS:
+                    break
+                if not retry_after_send and response.status_code != 429:
+                    break
+            except requests.RequestException as e:
+                result = {'success': False, 'error': str(e)}
+                if not retry_after_send and not self._not_sent(e):
+                    break
+
+            if attempt == self.max_retries:
+                break
+            time.sleep(self.retry_backoff * (2 ** attempt))
+
+        latency = time.perf_counter() - start
+        INTEGRATION_REQUEST_SECONDS.observe(latency, endpoint=endpoint_name, method=method)
+        INTEGRATION_REQUESTS.inc(endpoint=endpoint_name, outcome='success' if result['success'] else 'error')
+        result['latency'] = latency
+        result['attempts'] = attempt + 1
+        if idempotency_key:
+            result['idempotency_key'] = idempotency_key
+        return result
+
+    def fan_out(self, calls: Dict[str, Callable[[], Dict[str, Any]]], timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Run several calls concurrently and collect every result.
+
+        A call that raises or does not finish within timeout is reported as
+        failed without affecting the others.
+        """
+        futures = {name: self._executor.submit(call) for name, call in calls.items()}
+        deadline = time.time() + timeout if timeout else None
+        results = {}
+        for name, future in futures.items():
+            try:
+                remaining = max(0.0, deadline - time.time()) if deadline else None
+                results[name] = future.result(timeout=remaining)
+            except FutureTimeoutError:
+                results[name] = {'success': False, 'error': 'Timed out'}
+            except Exception as e:
+                results[name] = {'success': False, 'error': str(e)}
+
+        failed = [name for name, result in results.items() if not self._succeeded(result)]
+        return {
+            'success': not failed,
+            'partial': bool(failed) and len(failed) < len(results),
+            'failed': failed,
+            'results': results
+        }
+
+    def get_latency_histograms(self) -> Dict[str, Dict[str, Any]]:
+        """Latency percentiles and error rate for this client's endpoints (across all methods)"""
+        summaries = INTEGRATION_REQUEST_SECONDS.summaries(by=('endpoint',))
+        with self._lock:
+            names = list(self.endpoints)
+        latency = {}
+        for name in names:
+            summary = summaries.get((name,))
+            errors = INTEGRATION_REQUESTS.value(endpoint=name, outcome='error')
+            calls = errors + INTEGRATION_REQUESTS.value(endpoint=name, outcome='success')
+            latency[name] = {
+                'count': summary['count'] if summary else 0,
+                'mean_seconds': summary['mean'] if summary else None,
+                'p50_seconds': summary['p50'] if summary else None,
+                'p95_seconds': summary['p95'] if summary else None,
+                'p99_seconds': summary['p99'] if summary else None,
+                'error_rate': errors / calls if calls else 0.0
+            }
+        return latency
+
+    @staticmethod
+    def _not_sent(error: requests.RequestException) -> bool:
+        """True when no connection was made, so the server cannot have seen the request"""
+        if isinstance(error, requests.ConnectTimeout):
+            return True
+        if isinstance(error, requests.ConnectionError) and error.args:
+            return isinstance(getattr(error.args[0], 'reason', None), NewConnectionError)
+        return False
+
+    @staticmethod
+    def _succeeded(result: Any) -> bool:
+        if not isinstance(result, dict):
+            return result is not None
+        return bool(result.get('success', result.get('available', True)))
+
+    @staticmethod
+    def _to_result(response: requests.Response) -> Dict[str, Any]:
+        try:
+            body = response.json() if response.content else {}
+        except ValueError:
+            body = response.text
+        if response.status_code == 304:
+            return {'success': True, 'status_code': 304, 'not_modified': True, 'data': None,
+                    'etag': response.headers.get('ETag')}
+        if 200 <= response.status_code < 300:
+            return {'success': True, 'status_code': response.status_code, 'data': body,
+                    'etag': response.headers.get('ETag')}
+        return {'success': False, 'status_code': response.status_code, 'error': body or response.reason}
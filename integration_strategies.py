@@ -323,14 +323,17 @@ class HubAPIIntegration:
     Sample code for connecting your existing apps to the Hub AI
     """
     
+    def __init__(self, hub_url="http://your-hub-app.com"):
+        from integration_client import IntegrationClient
+        
+        # One pooled client; AI calls can take a while, so allow long reads
+        self.client = IntegrationClient(read_timeout=60.0)
+        self.client.register_endpoint('hub', hub_url)
+    
     def designer_to_hub_api(self, design_data):
         """
         Example: Designer app sends data to Hub AI
         """
-        import requests
-        
-        hub_url = "http://your-hub-app.com/api/ai/design"
-        
         payload = {
             'customer_name': design_data['customer_name'],
             'artwork_description': design_data['artwork_description'],
@@ -338,10 +341,10 @@ class HubAPIIntegration:
             'budget': design_data['budget']
         }
         
-        response = requests.post(hub_url, json=payload)
+        result = self.client.request('hub', 'POST', '/api/ai/design', json=payload)
         
-        if response.status_code == 200:
-            ai_recommendation = response.json()
+        if result['success']:
+            ai_recommendation = result['data']
             return ai_recommendation['design_recommendation']
         else:
             return "AI service temporarily unavailable"
@@ -350,18 +353,17 @@ class HubAPIIntegration:
         """
         Example: POS app validates order through Hub AI
         """
-        import requests
-        
-        hub_url = "http://your-hub-app.com/api/ai/order"
-        
-        response = requests.post(hub_url, json=order_data)
+        result = self.client.request(
+            'hub', 'POST', '/api/ai/order', json=order_data,
+            idempotency_key=f"order-{order_data['order_id']}" if order_data.get('order_id') else None
+        )
         
-        if response.status_code == 200:
-            validation_result = response.json()
+        if result['success']:
+            validation_result = result['data']
             return {
                 'is_valid': validation_result['valid'],
                 'cost_estimate': validation_result['cost'],
                 'suggestions': validation_result['recommendations']
             }
         else:
-            return {'is_valid': True, 'cost_estimate': 0, 'suggestions': []}
\ No newline at end of file
+            return {'is_valid': True, 'cost_estimate': 0, 'suggestions': []}
@@ -0,0 +1,365 @@
+"""
+Durable job queue for long-running AI work behind the Hub API
+
+Jobs are stored in SQLite so they survive restarts and can be shared by several
+Flask processes. Workers claim a job by making it invisible for a visibility
+timeout; if the worker dies the job becomes visible again and is retried.
+Workers heartbeat while a job runs so long jobs are not claimed twice.
+
+Webhooks are only delivered to URLs whose scheme and host are allowed
+(HUB_WEBHOOK_ALLOWED_HOSTS, HUB_WEBHOOK_SCHEMES), so clients cannot make the
+hub POST to internal addresses.
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+import requests
+
+from model_usage_tracker import ModelUsageTracker
+
+
+def _env_list(name: str, default: str = "") -> List[str]:
+    return [item.strip().lower() for item in os.getenv(name, default).split(",") if item.strip()]
+
+
+def validate_webhook_url(url: str, allowed_hosts: Iterable[str], allowed_schemes: Iterable[str] = ("https",)):
+    """
+    Raise ValueError unless the URL uses an allowed scheme and host. Hosts match
+    exactly, or by suffix when given as "*.example.com".
+    """
+    parsed = urlparse(url or "")
+    if parsed.scheme.lower() not in allowed_schemes:
+        raise ValueError(f"webhook_url scheme must be one of: {', '.join(allowed_schemes)}")
+    host = (parsed.hostname or "").lower()
+    for allowed in allowed_hosts:
+        if host == allowed or (allowed.startswith("*.") and host.endswith(allowed[1:])):
+            return
+    raise ValueError(f"webhook_url host is not allowed: {host or url}")
+
+
+class DurableJobQueue:
+    """SQLite-backed job queue with visibility timeouts and retries"""
+
+    def __init__(self, db_path: str = "hub_jobs.db", visibility_timeout: int = 300,
+                 max_attempts: int = 3, retry_backoff: float = 5.0):
+        self.db_path = db_path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self._local = threading.local()
+        self._create_tables()
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread; WAL lets readers run alongside the writer"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _create_tables(self):
+        connection = self._connect()
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                job_type TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                visible_at REAL NOT NULL,
+                locked_by TEXT,
+                webhook_url TEXT,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            )
+        """)
+        connection.execute("CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs (status, visible_at)")
+        connection.execute("CREATE INDEX IF NOT EXISTS idx_jobs_finished ON jobs (finished_at)")
+
+    def enqueue(self, job_type: str, payload: Dict[str, Any], webhook_url: Optional[str] = None,
+                max_attempts: Optional[int] = None) -> str:
+        """Add a job and return its ID"""
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        self._connect().execute(
+            "INSERT INTO jobs (id, job_type, payload, status, max_attempts, visible_at, webhook_url, created_at) "
+            "VALUES (?, ?, ?, 'queued', ?, ?, ?, ?)",
+            (job_id, job_type, json.dumps(payload, default=str), max_attempts or self.max_attempts, now, webhook_url, now)
+        )
+        return job_id
+
+    def claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Claim the oldest visible job for a worker.
+
+        Running jobs whose visibility timeout has passed (their worker crashed or
+        hung) are claimed again.
+        """
+        connection = self._connect()
+        now = time.time()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT * FROM jobs WHERE status IN ('queued', 'running') AND visible_at <= ? "
+                "ORDER BY created_at LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row is None:
+                connection.execute("COMMIT")
+                return None
+
+            if row["attempts"] >= row["max_attempts"]:
+                # Visibility expired on the final attempt: give up on it
+                connection.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ?",
+                    ("Visibility timeout expired on final attempt", now, row["id"])
+                )
+                connection.execute("COMMIT")
+                return self.claim(worker_id)
+
+            connection.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, locked_by = ?, "
+                "visible_at = ?, started_at = COALESCE(started_at, ?) WHERE id = ?",
+                (worker_id, now + self.visibility_timeout, now, row["id"])
+            )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+        job = self._row_to_dict(row)
+        job["attempts"] += 1
+        return job
+
+    def extend_visibility(self, job_id: str, worker_id: str, seconds: Optional[int] = None):
+        """Keep a long-running job invisible to other workers"""
+        self._connect().execute(
+            "UPDATE jobs SET visible_at = ? WHERE id = ? AND locked_by = ? AND status = 'running'",
+            (time.time() + (seconds or self.visibility_timeout), job_id, worker_id)
+        )
+
+    def complete(self, job_id: str, worker_id: str, result: Any) -> bool:
+        """Mark a job as succeeded; returns False if the worker no longer owns it"""
+        cursor = self._connect().execute(
+            "UPDATE jobs SET status = 'succeeded', result = ?, error = NULL, finished_at = ? "
+            "WHERE id = ? AND locked_by = ? AND status = 'running'",
+            (json.dumps(result, default=str), time.time(), job_id, worker_id)
+        )
+        return cursor.rowcount == 1
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> str:
+        """
+        Record a failed attempt; the job is retried with backoff until max_attempts.
+        Returns 'queued', 'failed', 'missing', or 'lost' when the worker no longer
+        owns the job (its visibility expired and another worker claimed it).
+        """
+        connection = self._connect()
+        row = connection.execute("SELECT attempts, max_attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return "missing"
+
+        now = time.time()
+        if row["attempts"] < row["max_attempts"]:
+            cursor = connection.execute(
+                "UPDATE jobs SET status = 'queued', error = ?, locked_by = NULL, visible_at = ? "
+                "WHERE id = ? AND locked_by = ? AND status = 'running'",
+                (error, now + self.retry_backoff * (2 ** (row["attempts"] - 1)), job_id, worker_id)
+            )
+            return "queued" if cursor.rowcount == 1 else "lost"
+
+        cursor = connection.execute(
+            "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? "
+            "WHERE id = ? AND locked_by = ? AND status = 'running'",
+            (error, now, job_id, worker_id)
+        )
+        return "failed" if cursor.rowcount == 1 else "lost"
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job by ID"""
+        row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def purge(self, older_than_seconds: int = 7 * 24 * 3600) -> int:
+        """Delete finished jobs older than the given age"""
+        cursor = self._connect().execute(
+            "DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND finished_at < ?",
+            (time.time() - older_than_seconds,)
+        )
+        return cursor.rowcount
+
+    def get_stats(self, window: int = 1000) -> Dict[str, Any]:
+        """Queue depth by status and latency percentiles of recently finished jobs"""
+        connection = self._connect()
+        counts = {row["status"]: row["count"] for row in connection.execute(
+            "SELECT status, COUNT(*) AS count FROM jobs GROUP BY status"
+        )}
+        rows = connection.execute(
+            "SELECT created_at, started_at, finished_at FROM jobs WHERE status = 'succeeded' "
+            "ORDER BY finished_at DESC LIMIT ?",
+            (window,)
+        ).fetchall()
+
+        total = sorted(row["finished_at"] - row["created_at"] for row in rows)
+        wait_times = sorted(row["started_at"] - row["created_at"] for row in rows if row["started_at"])
+
+        def percentiles(samples: List[float]) -> Dict[str, Optional[float]]:
+            return {f"p{p}": ModelUsageTracker._percentile(samples, p) for p in (50, 95, 99)}
+
+        return {
+            "queue_depth": counts.get("queued", 0),
+            "running": counts.get("running", 0),
+            "succeeded": counts.get("succeeded", 0),
+            "failed": counts.get("failed", 0),
+            "job_latency_seconds": percentiles(total),
+            "queue_wait_seconds": percentiles(wait_times),
+        }
+
+    @staticmethod
+    def _row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        for key in ("created_at", "started_at", "finished_at"):
+            if job[key]:
+                job[key] = datetime.fromtimestamp(job[key]).isoformat()
+        return job
+
+
+class JobWorkerPool:
+    """Background worker threads that run queued jobs and deliver webhooks"""
+
+    def __init__(self, queue: DurableJobQueue, handlers: Dict[str, Callable[[Dict[str, Any]], Any]],
+                 workers: int = 4, poll_interval: float = 0.5, webhook_timeout: int = 5,
+                 webhook_hosts: Optional[Iterable[str]] = None, webhook_schemes: Optional[Iterable[str]] = None):
+        self.queue = queue
+        self.handlers = handlers
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.webhook_timeout = webhook_timeout
+        self.webhook_hosts = [host.lower() for host in webhook_hosts] if webhook_hosts is not None \
+            else _env_list("HUB_WEBHOOK_ALLOWED_HOSTS")
+        self.webhook_schemes = [scheme.lower() for scheme in webhook_schemes] if webhook_schemes is not None \
+            else _env_list("HUB_WEBHOOK_SCHEMES", "https")
+        # Extend the claim well before it expires so a running job is never handed out again
+        self.heartbeat_interval = max(1.0, queue.visibility_timeout / 3)
+        self.busy_workers = 0
+        self._threads: List[threading.Thread] = []
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._worker_prefix = f"{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+    def start(self):
+        """Start worker threads (idempotent)"""
+        with self._lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            for index in range(self.workers):
+                thread = threading.Thread(
+                    target=self._worker_loop,
+                    args=(f"{self._worker_prefix}-{index}",),
+                    name=f"job-worker-{index}",
+                    daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0):
+        """Signal workers to stop after their current job"""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _worker_loop(self, worker_id: str):
+        while not self._stop.is_set():
+            try:
+                job = self.queue.claim(worker_id)
+            except sqlite3.OperationalError:
+                job = None  # Database busy; try again shortly
+            if job is None:
+                self._stop.wait(self.poll_interval)
+                continue
+            self._run_job(worker_id, job)
+
+    def validate_webhook_url(self, url: str):
+        """Raise ValueError if webhooks may not be sent to this URL"""
+        validate_webhook_url(url, self.webhook_hosts, self.webhook_schemes)
+
+    def _heartbeat(self, job_id: str, worker_id: str, done: threading.Event):
+        while not done.wait(self.heartbeat_interval):
+            try:
+                self.queue.extend_visibility(job_id, worker_id)
+            except sqlite3.OperationalError:
+                pass  # Database busy; the next beat is still well inside the timeout
+
+    def _run_job(self, worker_id: str, job: Dict[str, Any]):
+        with self._lock:
+            self.busy_workers += 1
+        done = threading.Event()
+        heartbeat = threading.Thread(
+            target=self._heartbeat, args=(job["id"], worker_id, done),
+            name=f"job-heartbeat-{worker_id}", daemon=True
+        )
+        heartbeat.start()
+        try:
+            handler = self.handlers.get(job["job_type"])
+            if handler is None:
+                raise ValueError(f"No handler for job type: {job['job_type']}")
+            result = handler(job["payload"])
+            if self.queue.complete(job["id"], worker_id, result):
+                self._send_webhook(job, "succeeded", result=result)
+        except Exception as e:
+            status = self.queue.fail(job["id"], worker_id, str(e))
+            if status == "failed":
+                self._send_webhook(job, "failed", error=str(e))
+        finally:
+            done.set()
+            heartbeat.join()
+            with self._lock:
+                self.busy_workers -= 1
+
+    def _send_webhook(self, job: Dict[str, Any], status: str, result: Any = None, error: Optional[str] = None):
+        if not job.get("webhook_url"):
+            return
+        try:
+            # Checked again at delivery: jobs may have been queued under an older allow-list
+            self.validate_webhook_url(job["webhook_url"])
+        except ValueError as e:
+            print(f"Skipping webhook for job {job['id']}: {e}")
+            return
+        try:
+            requests.post(job["webhook_url"], json={
+                "job_id": job["id"],
+                "job_type": job["job_type"],
+                "status": status,
+                "result": result,
+                "error": error,
+                "finished_at": datetime.now().isoformat()
+            }, timeout=self.webhook_timeout, allow_redirects=False)
+        except requests.RequestException:
+            pass  # Clients can still poll the status endpoint
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Worker pool and queue statistics"""
+        stats = self.queue.get_stats()
+        stats.update({
+            "workers": len(self._threads),
+            "busy_workers": self.busy_workers,
+        })
+        return stats
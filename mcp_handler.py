@@ -1,5 +1,7 @@
 import json
 import re
+from document_retrieval import get_document_index, has_document_index
+from tracing import tracer
 
 class MCPHandler:
     """
@@ -39,9 +41,12 @@ class MCPHandler:
             "```"
         )
     
-    def prepare_messages(self, messages):
+    @tracer.traced("mcp.prepare_messages")
+    def prepare_messages(self, messages, conversation_id=None, top_k=4, max_context_chars=4000):
         """
         Prepares messages for API calls, adding MCP context if needed.
+        When the conversation has indexed uploads, the top_k chunks most relevant
+        to the latest user message are added (at most max_context_chars).
         """
         # Deep copy to avoid modifying original
         messages_for_api = []
@@ -52,6 +57,10 @@ class MCPHandler:
             "content": self.mcp_system_message.format(version=self.mcp_version)
         })
         
+        document_context = self.retrieve_document_context(messages, conversation_id, top_k, max_context_chars)
+        if document_context:
+            messages_for_api.append({"role": "system", "content": document_context})
+        
         # Add user and assistant messages
         for message in messages:
             if message["role"] in ["user", "assistant"]:
@@ -62,6 +71,28 @@ class MCPHandler:
         
         return messages_for_api
     
+    def retrieve_document_context(self, messages, conversation_id, top_k=4, max_context_chars=4000):
+        """
+        Relevant excerpts from the conversation's uploaded files, or None.
+        """
+        if not conversation_id or not has_document_index(conversation_id):
+            return None
+        query = next((message["content"] for message in reversed(messages) if message["role"] == "user"), "")
+        if not query:
+            return None
+        
+        excerpts, used = [], 0
+        for chunk in get_document_index(conversation_id).search(query, top_k):
+            excerpt = f"[{chunk['source']} #{chunk['part']}]\n{chunk['text']}"
+            if excerpts and used + len(excerpt) > max_context_chars:
+                break
+            excerpts.append(excerpt[:max_context_chars])
+            used += len(excerpt)
+        if not excerpts:
+            return None
+        return ("Relevant excerpts from the user's uploaded files (retrieved for the latest message; "
+                "cite the source in brackets when you use them):\n\n" + "\n\n".join(excerpts))
+    
     def extract_mcp_context(self, response):
         """
         Extracts MCP context from a model response if present.
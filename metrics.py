@@ -0,0 +1,323 @@
+"""
+Process-wide metrics registry (counters, gauges and latency histograms)
+
+Latency histograms are HDR-style: values are kept in log-linear buckets (32
+linear sub-buckets per power of two, ~1.6% relative error) at microsecond
+resolution, so p50/p95/p99 stay accurate over any range without storing
+samples. Everything registered here is exposed in the Prometheus text format
+by the /metrics endpoints of api_server.py and hub_api_endpoints.py.
+
+Existing stores (usage_monitor, model_usage_tracker, system resources) are
+exported through collectors that refresh gauges at scrape time.
+"""
+
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import psutil
+except ImportError:
+    # System gauges are skipped without psutil
+    psutil = None
+
+SUB_BUCKET_BITS = 5
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+QUANTILES = (50, 95, 99)
+
+LabelValues = Tuple[str, ...]
+
+
+def bucket_index(value: int) -> int:
+    """Log-linear bucket for a non-negative integer value"""
+    if value < 2 * SUB_BUCKET_COUNT:
+        return max(0, value)
+    shift = value.bit_length() - SUB_BUCKET_BITS - 1
+    return (shift << SUB_BUCKET_BITS) + (value >> shift)
+
+
+def bucket_value(index: int) -> float:
+    """Midpoint of the values mapped to a bucket"""
+    if index < 2 * SUB_BUCKET_COUNT:
+        return float(index)
+    shift = (index >> SUB_BUCKET_BITS) - 1
+    low = (index - (shift << SUB_BUCKET_BITS)) << shift
+    return low + ((1 << shift) - 1) / 2
+
+
+class _Metric:
+    metric_type = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _label_dict(self, key: LabelValues) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+
+class Counter(_Metric):
+    metric_type = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            return [(self.name + '_total', self._label_dict(key), value) for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    metric_type = 'gauge'
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            return [(self.name, self._label_dict(key), value) for key, value in self._values.items()]
+
+
+class _HistogramSeries:
+    __slots__ = ('buckets', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def merge(self, other: '_HistogramSeries'):
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        """Value (in recorded units) at the percentile, or None if empty"""
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(self.count * percentile / 100))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return bucket_value(index)
+        return bucket_value(max(self.buckets))
+
+
+class Histogram(_Metric):
+    """Latency histogram in seconds, stored as log-linear microsecond buckets"""
+    metric_type = 'summary'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._series: Dict[LabelValues, _HistogramSeries] = {}
+
+    def observe(self, seconds: float, **labels):
+        key = self._key(labels)
+        index = bucket_index(int(seconds * 1_000_000))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _HistogramSeries()
+            series.buckets[index] = series.buckets.get(index, 0) + 1
+            series.count += 1
+            series.total += seconds
+            if seconds > series.max:
+                series.max = seconds
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def summaries(self, by: Iterable[str] = None) -> Dict[LabelValues, Dict[str, float]]:
+        """
+        count, sum, mean, max and p50/p95/p99 (seconds) per label set. With by, series
+        are merged over the other labels (e.g. by=('provider',) across models).
+        """
+        by = tuple(self.labelnames if by is None else by)
+        positions = [self.labelnames.index(name) for name in by]
+        merged: Dict[LabelValues, _HistogramSeries] = {}
+        with self._lock:
+            for key, series in self._series.items():
+                group = tuple(key[position] for position in positions)
+                merged.setdefault(group, _HistogramSeries()).merge(series)
+
+        result = {}
+        for group, series in merged.items():
+            summary = {'count': series.count, 'sum': series.total, 'mean': series.total / series.count,
+                       'max': series.max}
+            for quantile in QUANTILES:
+                summary[f'p{quantile}'] = series.percentile(quantile) / 1_000_000
+            result[group] = summary
+        return result
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        samples = []
+        for key, summary in self.summaries().items():
+            labels = self._label_dict(key)
+            for quantile in QUANTILES:
+                samples.append((self.name, dict(labels, quantile=str(quantile / 100)), summary[f'p{quantile}']))
+            samples.append((self.name + '_sum', labels, summary['sum']))
+            samples.append((self.name + '_count', labels, summary['count']))
+        return samples
+
+
+class MetricsRegistry:
+    """Named metrics plus collectors that refresh gauges before each export"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, metric_class, name: str, documentation: str, labelnames: Iterable[str]):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = metric_class(name, documentation, labelnames)
+            elif type(metric) is not metric_class or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} is already registered with a different type or labels")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames)
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def register_collector(self, collector: Callable[[], None]):
+        """collector() is called before every export to refresh gauges from other stores"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def collect(self):
+        for collector in list(self._collectors):
+            try:
+                collector()
+            except Exception as e:
+                print(f"Metrics collector {getattr(collector, '__name__', collector)} failed: {e}")
+
+    def render_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format (0.0.4)"""
+        self.collect()
+        lines = []
+        for metric in sorted(self._metrics.values(), key=lambda m: m.name):
+            samples = metric.samples()
+            if not samples:
+                continue
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.metric_type}")
+            for name, labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self) -> Dict[str, Any]:
+        """JSON-friendly view of every metric (histograms as percentile summaries)"""
+        self.collect()
+        result = {}
+        for name, metric in sorted(self._metrics.items()):
+            if isinstance(metric, Histogram):
+                series = [dict(metric._label_dict(key), **summary) for key, summary in metric.summaries().items()]
+            else:
+                series = [dict(labels, value=value) for _, labels, value in metric.samples()]
+            result[name] = {'type': metric.metric_type, 'help': metric.documentation, 'series': series}
+        return result
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    escaped = (
+        name + '="' + value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for name, value in labels.items()
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return 'NaN'
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+metrics = MetricsRegistry()
+
+# Shared metric families; modules record into these at their hot paths
+MODEL_REQUEST_SECONDS = metrics.histogram(
+    'model_request_seconds', 'Provider call latency per model', ('model', 'provider'))
+MODEL_REQUESTS = metrics.counter(
+    'model_requests', 'Provider calls by outcome', ('model', 'provider', 'status'))
+MODEL_TOKENS = metrics.counter(
+    'model_tokens', 'Estimated tokens per model and direction', ('model', 'direction'))
+ROUTE_REQUEST_SECONDS = metrics.histogram(
+    'route_request_seconds', 'End-to-end response time per routing mode, including fallbacks', ('route',))
+CACHE_REQUESTS = metrics.counter(
+    'cache_requests', 'Cache and request-coalescing lookups', ('cache', 'result'))
+DB_QUERY_SECONDS = metrics.histogram(
+    'db_query_seconds', 'SQL statement latency', ('operation',))
+HTTP_REQUEST_SECONDS = metrics.histogram(
+    'http_request_seconds', 'Request latency of our HTTP APIs per route', ('app', 'route', 'method', 'status'))
+HUB_REQUEST_SECONDS = metrics.histogram(
+    'hub_request_seconds', 'HTTP round trips to the Central Hub', ('endpoint', 'method'))
+HUB_REQUESTS = metrics.counter(
+    'hub_requests', 'HTTP requests to the Central Hub by status code', ('endpoint', 'status'))
+INTEGRATION_REQUEST_SECONDS = metrics.histogram(
+    'integration_request_seconds', 'Outbound business-system calls, including retries', ('endpoint', 'method'))
+INTEGRATION_REQUESTS = metrics.counter(
+    'integration_requests', 'Outbound business-system calls by outcome', ('endpoint', 'outcome'))
+
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _collect_process():
+    if psutil is None:
+        return
+    metrics.gauge('process_resident_memory_bytes', 'Resident memory of this process').set(
+        psutil.Process(os.getpid()).memory_info().rss)
+    metrics.gauge('system_cpu_percent', 'System-wide CPU usage since the last scrape').set(
+        psutil.cpu_percent(interval=None))
+    metrics.gauge('system_memory_percent', 'System-wide memory usage').set(psutil.virtual_memory().percent)
+
+
+metrics.register_collector(_collect_process)
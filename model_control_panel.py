@@ -272,7 +272,8 @@ class ModelControlPanel:
         - **Open (🔴)**: Model has failed multiple times and is temporarily disabled
         - **Half-Open (🟡)**: Testing if model has recovered after timeout
         
-        Models automatically move from Open to Half-Open after 60 seconds, then back to Closed if successful.
+        Models automatically move from Open to Half-Open after their configured timeout, then back to Closed if successful.
+        While a model is unavailable, requests are automatically routed to the next healthy model in its fallback chain.
         """)
         
         # Circuit breaker status table
@@ -281,6 +282,7 @@ class ModelControlPanel:
             state = circuit.get("state", "closed")
             error_count = circuit.get("error_count", 0)
             last_error = circuit.get("last_error")
+            settings = self.tracker.get_circuit_breaker_settings(model_id)
             
             # Color code based on state
             if state == "closed":
@@ -311,7 +313,7 @@ class ModelControlPanel:
                         st.warning(state_text)
                 
                 with col3:
-                    st.caption(f"Errors: {error_count}/3")
+                    st.caption(f"Errors: {error_count}/{settings.error_threshold}")
                 
                 with col4:
                     if state in ["open", "half_open"]:
@@ -324,6 +326,13 @@ class ModelControlPanel:
                     error_time = datetime.fromisoformat(last_error)
                     st.caption(f"Last error: {error_time.strftime('%Y-%m-%d %H:%M:%S')}")
                 
+                if settings.fallback_models:
+                    fallback_names = [
+                        self.tracker.model_metrics[m].model_name if m in self.tracker.model_metrics else m
+                        for m in settings.fallback_models
+                    ]
+                    st.caption(f"Fallback chain: {' → '.join(fallback_names)} (timeout {settings.timeout_seconds}s)")
+                
                 st.divider()
     
     def _render_analytics(self):
@@ -1,9 +1,150 @@
 import os
+import time
+import hashlib
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait, FIRST_COMPLETED
 import openai
 from anthropic import Anthropic
 import json
 import google.generativeai as genai
 from model_usage_tracker import model_usage_tracker
+from file_ingestion import file_ingestor
+from metrics import CACHE_REQUESTS, MODEL_REQUEST_SECONDS, MODEL_REQUESTS, MODEL_TOKENS, ROUTE_REQUEST_SECONDS
+from tracing import tracer
+
+
+class ProviderError(Exception):
+    """A provider call that produced no usable answer (missing key, API failure)"""
+
+
+class HedgeBudget:
+    """
+    Caps how often hedged requests fire per route.
+    
+    A route may hedge at most `max_hedge_ratio` of its requests within a rolling
+    time window, so a slow provider cannot double the spend of a whole route.
+    A ratio of 0 disables hedging on the route.
+    """
+    
+    def __init__(self, max_hedge_ratio=0.1, window_seconds=300):
+        self.default_ratio = max_hedge_ratio
+        self.window_seconds = window_seconds
+        self.route_ratios = {}
+        self.requests = {}
+        self.hedges = {}
+        self._lock = threading.Lock()
+    
+    def set_route_budget(self, route, max_hedge_ratio):
+        """Set the maximum fraction of requests that may hedge on a route"""
+        with self._lock:
+            self.route_ratios[route] = max_hedge_ratio
+    
+    def _trim(self, events, now):
+        while events and now - events[0] > self.window_seconds:
+            events.popleft()
+    
+    def record_request(self, route):
+        """Record a hedge-eligible request on a route"""
+        now = time.time()
+        with self._lock:
+            events = self.requests.setdefault(route, deque())
+            events.append(now)
+            self._trim(events, now)
+    
+    def try_acquire(self, route):
+        """Return True (and count the hedge) if the route still has hedge budget"""
+        now = time.time()
+        with self._lock:
+            requests = self.requests.setdefault(route, deque())
+            hedges = self.hedges.setdefault(route, deque())
+            self._trim(requests, now)
+            self._trim(hedges, now)
+            ratio = self.route_ratios.get(route, self.default_ratio)
+            if ratio <= 0:
+                # A zero budget turns hedging off for the route
+                return False
+            # Low-traffic routes may still hedge once per window
+            allowed = max(1, int(len(requests) * ratio))
+            if len(hedges) >= allowed:
+                return False
+            hedges.append(now)
+            return True
+    
+    def get_stats(self):
+        """Get request and hedge counts per route within the current window"""
+        now = time.time()
+        with self._lock:
+            stats = {}
+            for route, requests in self.requests.items():
+                hedges = self.hedges.get(route, deque())
+                self._trim(requests, now)
+                self._trim(hedges, now)
+                stats[route] = {
+                    "requests": len(requests),
+                    "hedges": len(hedges),
+                    "max_hedge_ratio": self.route_ratios.get(route, self.default_ratio)
+                }
+            return stats
+
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight requests.
+    
+    The first caller for a key runs the work; callers that arrive with the same
+    key while it is running wait on the same future instead of repeating it.
+    """
+    
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "coalesced": 0}
+    
+    def do(self, key, fn):
+        """Run fn once per key at a time; returns (result, ran_by_this_caller)"""
+        with self._lock:
+            self.stats["requests"] += 1
+            call = self._calls.get(key)
+            if call is not None:
+                self.stats["coalesced"] += 1
+                leader = False
+            else:
+                call = Future()
+                self._calls[key] = call
+                leader = True
+        
+        if not leader:
+            return call.result(), False
+        
+        try:
+            result = fn()
+            call.set_result(result)
+            return result, True
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+    
+    def get_stats(self):
+        """Get coalescing counters and the number of requests currently in flight"""
+        with self._lock:
+            requests = self.stats["requests"]
+            coalesced = self.stats["coalesced"]
+            return {
+                "requests": requests,
+                "coalesced": coalesced,
+                "coalesced_rate": coalesced / requests if requests else 0.0,
+                "in_flight": len(self._calls)
+            }
+
+
+# Shared across handler instances (Streamlit builds a new handler on every rerun)
+request_coalescer = SingleFlight()
+hedge_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hedge")
+
 
 class ModelHandler:
     """
@@ -201,6 +342,48 @@ class ModelHandler:
                 "provider": "google"
             }
         }
+        
+        # Routing details for the most recent get_response call (per thread)
+        self._local = threading.local()
+        self.last_served_model = None
+        self.last_routing = []
+        
+        # Hedging: cheaper equivalent model raced against a slow primary
+        self.hedge_models = {
+            "gpt-4o": "gpt-4o-mini",
+            "gpt-4o-mini": "claude-3-haiku-20240307",
+            "gpt-3.5-turbo": "claude-3-haiku-20240307",
+            "claude-3-5-sonnet-20241022": "claude-3-haiku-20240307",
+            "claude-3-sonnet-20240229": "claude-3-haiku-20240307",
+            "claude-3-opus-20240229": "claude-3-5-sonnet-20241022",
+            "claude-3-haiku-20240307": "gpt-4o-mini",
+            "gemini-pro": "gpt-4o-mini",
+        }
+        self.default_hedge_delay = 3.0  # Seconds to wait when no latency history exists
+        self.hedge_budget = HedgeBudget()
+        
+        # Identical concurrent requests share one provider call
+        self.single_flight = request_coalescer
+    
+    @property
+    def last_served_model(self):
+        """Model that served the calling thread's most recent request"""
+        return getattr(self._local, "last_served_model", None)
+    
+    @last_served_model.setter
+    def last_served_model(self, value):
+        self._local.last_served_model = value
+    
+    @property
+    def last_routing(self):
+        """Routing attempts made for the calling thread's most recent request"""
+        if not hasattr(self._local, "last_routing"):
+            self._local.last_routing = []
+        return self._local.last_routing
+    
+    @last_routing.setter
+    def last_routing(self, value):
+        self._local.last_routing = value
     
     def get_model_keys(self):
         """Returns a list of model names (keys)"""
@@ -215,36 +398,215 @@ class ModelHandler:
             "provider": "unknown"
         })
     
-    def get_response(self, messages, model_id, deep_thinking=False, uploaded_files=None):
-        """Get a response from the specified AI model"""
+    def get_response(self, messages, model_id, deep_thinking=False, uploaded_files=None, allow_fallback=True,
+                     coalesce=True):
+        """
+        Get a response from the specified AI model.
+        
+        If the requested model is unavailable (disabled, over its limits, or its
+        circuit breaker is open) or the call fails, the request is retried on the
+        next healthy model in the model's fallback chain. The model that actually
+        served the request is recorded in `last_served_model`.
+        
+        Identical requests already in flight are coalesced into one provider call
+        unless coalesce=False.
+        """
+        self.last_served_model = None
+        self.last_routing = []
+        
         try:
+            self._prepare_messages(messages, deep_thinking, uploaded_files)
+        except Exception as e:
+            # Track failed attempt
+            model_usage_tracker.track_usage(model_id, 0, 0, success=False)
+            return f"Error getting response: {str(e)}"
+        
+        route = "fallback" if allow_fallback else "direct"
+        with ROUTE_REQUEST_SECONDS.time(route=route), \
+                tracer.span("model.get_response", model=model_id, route=route) as span:
+            if not coalesce:
+                response = self._route_response(messages, model_id, allow_fallback)
+            else:
+                key = self._request_key(messages, model_id, route)
+                response = self._coalesced(key, lambda: self._route_response(messages, model_id, allow_fallback))
+            span.set_attribute("served_model", self.last_served_model)
+            return response
+    
+    def _route_response(self, messages, model_id, allow_fallback=True, exclude=(), last_response=None):
+        """
+        Try the requested model, then its fallback chain, until one succeeds.
+        Models in exclude were already tried by the caller; last_response is
+        their error, returned if nothing else can serve the request.
+        """
+        candidates = model_usage_tracker.get_fallback_chain(model_id) if allow_fallback else [model_id]
+        first_reason = None
+        response = last_response
+        
+        for candidate_id in candidates:
+            if candidate_id in exclude:
+                continue
             # Check if model is available (respects toggles, limits, and circuit breakers)
-            available, reason = model_usage_tracker.is_model_available(model_id)
+            available, reason = model_usage_tracker.is_model_available(candidate_id)
             if not available:
-                return f"❌ Model not available: {reason}\n\nPlease select a different model or adjust limits in the Model Control Panel."
+                self.last_routing.append({"model_id": candidate_id, "status": "skipped", "reason": reason})
+                first_reason = first_reason or reason
+                continue
             
-            # Add file context if files are uploaded
-            if uploaded_files:
-                file_context = self._process_uploaded_files(uploaded_files)
-                if file_context:
-                    # Add file information to the last user message
-                    if messages and messages[-1]["role"] == "user":
-                        messages[-1]["content"] += f"\n\n[Uploaded files context: {file_context}]"
+            response, success = self._call_model(messages, candidate_id)
+            self.last_routing.append({"model_id": candidate_id, "status": "served" if success else "failed"})
             
-            # Add deep thinking prompt if enabled
-            if deep_thinking:
-                thinking_prompt = "\n\nPlease show your reasoning process step by step before providing your final answer. Use a 'Thinking:' section to show your thought process transparently."
-                
-                # Add screen analysis guidance if screen capture detected
-                if uploaded_files:
-                    for file in uploaded_files:
-                        if 'screen-capture' in file.name.lower() or 'screenshot' in file.name.lower():
-                            thinking_prompt += "\n\nFor screen captures, please analyze: UI elements, applications visible, potential workflows, any text content, layout patterns, and provide actionable insights about what's shown."
-                            break
-                
+            if success:
+                self.last_served_model = candidate_id
+                if candidate_id != model_id:
+                    model_usage_tracker.logger.info(f"Request for {model_id} served by fallback model {candidate_id}")
+                return response
+            
+            first_reason = first_reason or response
+        
+        if response is not None:
+            # Every available model failed; surface the last provider error
+            return response
+        
+        return f"❌ Model not available: {first_reason}\n\nPlease select a different model or adjust limits in the Model Control Panel."
+    
+    def get_hedged_response(self, messages, model_id, route="default", deep_thinking=False, uploaded_files=None,
+                            coalesce=True):
+        """
+        Get a response with hedging for latency-critical traffic (opt-in).
+        
+        If the primary model has not answered within its observed p95 latency, a
+        second request goes to a cheaper equivalent model and whichever succeeds
+        first is returned. Both calls are tracked in the usage tracker. Hedges per
+        route are capped by `hedge_budget`.
+        
+        A primary that fails outright is hedged immediately (outside the budget,
+        since nothing is duplicated), and if every raced call fails the request
+        continues down the primary's fallback chain like get_response.
+        """
+        hedge_id = self.hedge_models.get(model_id)
+        available, _ = model_usage_tracker.is_model_available(model_id)
+        if not hedge_id or not available:
+            # Nothing to race against; use the normal fallback routing
+            return self.get_response(messages, model_id, deep_thinking=deep_thinking, uploaded_files=uploaded_files,
+                                     coalesce=coalesce)
+        
+        self.last_served_model = None
+        self.last_routing = []
+        
+        try:
+            self._prepare_messages(messages, deep_thinking, uploaded_files)
+        except Exception as e:
+            model_usage_tracker.track_usage(model_id, 0, 0, success=False)
+            return f"Error getting response: {str(e)}"
+        
+        with ROUTE_REQUEST_SECONDS.time(route=f"hedged:{route}"), \
+                tracer.span("model.get_response", model=model_id, route=f"hedged:{route}") as span:
+            if not coalesce:
+                response = self._race_response(messages, model_id, hedge_id, route)
+            else:
+                key = self._request_key(messages, model_id, f"hedged:{route}")
+                response = self._coalesced(key, lambda: self._race_response(messages, model_id, hedge_id, route))
+            span.set_attribute("served_model", self.last_served_model)
+            return response
+    
+    def _race_response(self, messages, model_id, hedge_id, route):
+        """Run the primary call and hedge it with hedge_id once it fails or exceeds its p95 latency"""
+        self.hedge_budget.record_request(route)
+        hedge_delay = model_usage_tracker.get_latency_percentile(model_id, 95) or self.default_hedge_delay
+        
+        # Worker threads continue the caller's trace
+        primary = hedge_executor.submit(tracer.wrap(self._call_model), messages, model_id)
+        pending = {primary: model_id}
+        raced = [model_id]
+        
+        try:
+            _, primary_succeeded = primary.result(timeout=hedge_delay)
+            hedge_reason = None if primary_succeeded else "failed"
+        except FutureTimeoutError:
+            hedge_reason = f"slow after {hedge_delay:.2f}s"
+        
+        if hedge_reason:
+            hedge_available, _ = model_usage_tracker.is_model_available(hedge_id)
+            if hedge_available and (hedge_reason == "failed" or self.hedge_budget.try_acquire(route)):
+                model_usage_tracker.logger.info(f"Hedging {model_id} with {hedge_id} on route '{route}' ({hedge_reason})")
+                pending[hedge_executor.submit(tracer.wrap(self._call_model), messages, hedge_id)] = hedge_id
+                raced.append(hedge_id)
+        
+        response = None
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                served_id = pending.pop(future)
+                response, success = future.result()
+                self.last_routing.append({"model_id": served_id, "status": "served" if success else "failed"})
+                if success:
+                    # The loser cannot be interrupted mid-call; drop its result (its usage is still tracked)
+                    for loser in pending:
+                        loser.cancel()
+                        self.last_routing.append({"model_id": pending[loser], "status": "cancelled"})
+                    self.last_served_model = served_id
+                    return response
+        
+        # Every raced call failed: continue down the fallback chain without repeating them
+        return self._route_response(messages, model_id, exclude=raced, last_response=response)
+    
+    def _request_key(self, messages, model_id, mode):
+        """Canonical hash of a request, used to coalesce identical in-flight calls"""
+        canonical = json.dumps({
+            "model_id": model_id,
+            "mode": mode,
+            "messages": [
+                [msg.get("role"), msg.get("content")] if isinstance(msg, dict) else [None, str(msg)]
+                for msg in messages
+            ]
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+    
+    def _coalesced(self, key, fn):
+        """Run fn through the single-flight layer and copy routing details to followers"""
+        def run():
+            response = fn()
+            return response, self.last_served_model, list(self.last_routing)
+        
+        (response, served_model, routing), leader = self.single_flight.do(key, run)
+        CACHE_REQUESTS.inc(cache="single_flight", result="miss" if leader else "hit")
+        if not leader:
+            self.last_served_model = served_model
+            self.last_routing = routing + [{"model_id": served_model, "status": "coalesced"}]
+        return response
+    
+    def _prepare_messages(self, messages, deep_thinking=False, uploaded_files=None):
+        """Add uploaded file context and the deep thinking prompt to the last user message"""
+        # Add file context if files are uploaded
+        if uploaded_files:
+            file_context = self._process_uploaded_files(uploaded_files)
+            if file_context:
+                # Add file information to the last user message
                 if messages and messages[-1]["role"] == "user":
-                    messages[-1]["content"] += thinking_prompt
+                    messages[-1]["content"] += f"\n\n[Uploaded files context: {file_context}]"
+        
+        # Add deep thinking prompt if enabled
+        if deep_thinking:
+            thinking_prompt = "\n\nPlease show your reasoning process step by step before providing your final answer. Use a 'Thinking:' section to show your thought process transparently."
+            
+            # Add screen analysis guidance if screen capture detected
+            if uploaded_files:
+                for file in uploaded_files:
+                    if 'screen-capture' in file.name.lower() or 'screenshot' in file.name.lower():
+                        thinking_prompt += "\n\nFor screen captures, please analyze: UI elements, applications visible, potential workflows, any text content, layout patterns, and provide actionable insights about what's shown."
+                        break
             
+            if messages and messages[-1]["role"] == "user":
+                messages[-1]["content"] += thinking_prompt
+    
+    def _call_model(self, messages, model_id):
+        """
+        Call a single model, track its usage, and return (response, success).
+        Adapters raise ProviderError on failure; any returned text is a successful answer.
+        """
+        start_time = time.time()
+        provider = "unknown"
+        try:
             # Get the provider from model info
             model_info = self.get_model_info(model_id)
             provider = model_info.get("provider", "unknown")
@@ -267,78 +629,52 @@ class ModelHandler:
                 response = f"Unsupported model: {model_id}"
                 success = False
             
-            # Check if response indicates an error
-            if response and ("Error" in response or "error" in response[:50].lower()):
-                success = False
-            
             # Estimate token usage (rough approximation: 1 token ≈ 4 characters)
             input_text = " ".join([msg.get("content", "") for msg in messages if isinstance(msg, dict)])
             input_tokens = len(input_text) // 4
             output_tokens = len(response) // 4 if response else 0
             
             # Track usage
-            model_usage_tracker.track_usage(model_id, input_tokens, output_tokens, success)
+            response_time = time.time() - start_time
+            model_usage_tracker.track_usage(model_id, input_tokens, output_tokens, success,
+                                            response_time=response_time)
+            MODEL_REQUEST_SECONDS.observe(response_time, model=model_id, provider=provider)
+            MODEL_REQUESTS.inc(model=model_id, provider=provider, status="success" if success else "error")
+            MODEL_TOKENS.inc(input_tokens, model=model_id, direction="input")
+            MODEL_TOKENS.inc(output_tokens, model=model_id, direction="output")
             
-            return response
+            return response, success
+        
+        except ProviderError as e:
+            # The adapter reported a failure; fallback and the circuit breaker act on this, not on the text
+            model_usage_tracker.track_usage(model_id, 0, 0, success=False, response_time=time.time() - start_time)
+            MODEL_REQUESTS.inc(model=model_id, provider=provider, status="error")
+            return str(e), False
         
         except Exception as e:
             # Track failed attempt
             model_usage_tracker.track_usage(model_id, 0, 0, success=False)
-            return f"Error getting response: {str(e)}"
+            MODEL_REQUESTS.inc(model=model_id, provider=provider, status="exception")
+            return f"Error getting response: {str(e)}", False
     
     def _process_uploaded_files(self, uploaded_files):
-        """Process uploaded files and return context string"""
+        """Process uploaded files and return context string (streamed, memory-bounded)"""
         file_info = []
         
         for file in uploaded_files:
             try:
-                file_type = file.type
-                file_name = file.name
-                
-                if file_type.startswith('text/') or file_name.endswith('.txt'):
-                    # Read text files
-                    content = file.read().decode('utf-8')[:2000]  # Limit to first 2000 chars
-                    file_info.append(f"Text file '{file_name}': {content[:500]}{'...' if len(content) > 500 else ''}")
-                
-                elif file_type.startswith('image/'):
-                    # For images, provide detailed context
-                    if 'screen-capture' in file_name.lower() or 'screenshot' in file_name.lower():
-                        file_info.append(f"Screen capture '{file_name}' ({file_type}) - This appears to be a screenshot that may contain UI elements, applications, or desktop content for analysis")
-                    else:
-                        file_info.append(f"Image file '{file_name}' ({file_type}) uploaded")
-                
-                elif file_name.endswith('.csv'):
-                    # Read CSV files
-                    import csv
-                    import io
-                    content = file.read().decode('utf-8')
-                    csv_reader = csv.reader(io.StringIO(content))
-                    rows = list(csv_reader)[:10]  # First 10 rows
-                    file_info.append(f"CSV file '{file_name}' with {len(rows)} rows (showing first 10): {str(rows)}")
-                
-                elif file_name.endswith('.json'):
-                    # Read JSON files
-                    content = file.read().decode('utf-8')
-                    json_data = json.loads(content)
-                    file_info.append(f"JSON file '{file_name}': {str(json_data)[:500]}{'...' if len(str(json_data)) > 500 else ''}")
-                
-                else:
-                    # For other file types, just note the presence
-                    file_info.append(f"File '{file_name}' ({file_type}) uploaded")
-                
-                # Reset file pointer for potential future reads
-                file.seek(0)
-                
+                file_info.append(file_ingestor.describe(file))
             except Exception as e:
                 file_info.append(f"Error processing file '{file.name}': {str(e)}")
         
         return " | ".join(file_info) if file_info else None
     
+    @tracer.traced("provider.openai")
     def _get_openai_response(self, messages, model_id):
         """Get a response from OpenAI models"""
         api_key = os.environ.get("OPENAI_API_KEY")
         if not api_key:
-            return "OpenAI API key not found. Please add your API key in the settings."
+            raise ProviderError("OpenAI API key not found. Please add your API key in the settings.")
         
         try:
             client = openai.OpenAI(api_key=api_key)
@@ -361,13 +697,14 @@ class ModelHandler:
             return response.choices[0].message.content
         
         except Exception as e:
-            return f"OpenAI API Error: {str(e)}"
+            raise ProviderError(f"OpenAI API Error: {str(e)}") from e
     
+    @tracer.traced("provider.anthropic")
     def _get_anthropic_response(self, messages, model_id):
         """Get a response from Anthropic models"""
         api_key = os.environ.get("ANTHROPIC_API_KEY")
         if not api_key:
-            return "Anthropic API key not found. Please add your API key in the settings."
+            raise ProviderError("Anthropic API key not found. Please add your API key in the settings.")
         
         try:
             client = Anthropic(api_key=api_key)
@@ -389,18 +726,20 @@ class ModelHandler:
             return response.content[0].text
         
         except Exception as e:
-            return f"Anthropic API Error: {str(e)}"
+            raise ProviderError(f"Anthropic API Error: {str(e)}") from e
     
+    @tracer.traced("provider.meta")
     def _get_meta_response(self, messages, model_id):
         """Get a response from Meta AI models"""
         # For now, we'll use OpenAI API as a fallback with a note
         return self._get_openai_response(messages, "gpt-4o") + "\n\n[Note: Meta AI integration is simulated using OpenAI's API. In a production environment, you would use Meta's API directly.]"
     
+    @tracer.traced("provider.gemini")
     def _get_gemini_response(self, messages, model_id):
         """Get a response from Google Gemini models"""
         api_key = os.environ.get("GEMINI_API_KEY")
         if not api_key:
-            return "Gemini API key not found. Please add your GEMINI_API_KEY to Secrets."
+            raise ProviderError("Gemini API key not found. Please add your GEMINI_API_KEY to Secrets.")
         
         try:
             genai.configure(api_key=api_key)
@@ -424,8 +763,9 @@ class ModelHandler:
             return response.text
         
         except Exception as e:
-            return f"Gemini API Error: {str(e)}"
+            raise ProviderError(f"Gemini API Error: {str(e)}") from e
     
+    @tracer.traced("provider.mistral")
     def _get_mistral_response(self, messages, model_id):
         """Get a response from Mistral AI models"""
         # For now, we'll use OpenAI API as a fallback with a note
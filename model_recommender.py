@@ -1,18 +1,48 @@
 import os
 import json
+import time
+import uuid
+import threading
+from collections import OrderedDict
 import openai
 from model_handler import ModelHandler
+from recommendation_classifier import RecommendationClassifier
 
 class ModelRecommender:
     """
     Recommends the optimal AI model based on user task descriptions.
-    Uses the capabilities of GPT-4o to analyze the task and suggest the best model.
+    A local classifier answers confident cases without an API call; GPT-4o
+    analyzes the task only when the classifier is unsure.
     """
     
-    def __init__(self):
+    def __init__(self, db=None, confidence_threshold=0.6, retrain_interval=3600):
         # Initialize the model handler to access model information
         self.model_handler = ModelHandler()
         
+        # Stored recommendations train the local classifier (optional)
+        if db is None:
+            try:
+                from database import DatabaseManager
+                db = DatabaseManager()
+            except Exception:
+                db = None
+        self.db = db
+        
+        self.classifier = RecommendationClassifier()
+        self.confidence_threshold = confidence_threshold
+        self.retrain_interval = retrain_interval
+        # Shared across Streamlit sessions; only one caller retrains at a time
+        self._retrain_lock = threading.Lock()
+        
+        # Local predictions awaiting feedback, by recommendation_id. They are only
+        # written to the database once accepted, keeping I/O off the prediction path.
+        self._pending_local = OrderedDict()
+        self._pending_lock = threading.Lock()
+        self.max_pending_local = 1000
+        
+        # Model details never change at runtime, so build the prompt section once
+        self.model_details = self._build_model_details()
+        
         # Template for the recommendation prompt
         self.recommendation_template = """
 You are an AI model recommendation expert. Your task is to analyze the user's description and recommend 
@@ -41,10 +71,88 @@ Provide your recommendation in JSON format with the following structure:
 }}
 """
         
+    def _build_model_details(self):
+        """Build the model details section of the recommendation prompt"""
+        model_details = ""
+        for model_name, model_id in self.model_handler.models.items():
+            model_info = self.model_handler.get_model_info(model_id)
+            model_details += f"- {model_name}: {model_info['description']}\n"
+            model_details += f"  Strengths: {', '.join(model_info['strengths'])}\n"
+            model_details += f"  Use cases: {', '.join(model_info['use_cases'])}\n\n"
+        return model_details
+    
+    def retrain(self):
+        """Retrain the local classifier from seed data and stored recommendations"""
+        try:
+            self.classifier.fit(self.model_handler, self.db)
+        except Exception:
+            # Database unavailable: train on seed data only
+            self.classifier.fit(self.model_handler)
+    
+    def _needs_retrain(self):
+        trained_at = self.classifier.trained_at
+        return trained_at is None or time.time() - trained_at > self.retrain_interval
+    
+    def _get_local_recommendation(self, task_description):
+        """Predict a model locally; returns None when the classifier is not confident"""
+        if self._needs_retrain():
+            with self._retrain_lock:
+                if self._needs_retrain():
+                    self.retrain()
+        
+        prediction = self.classifier.predict(task_description)
+        if not prediction or prediction["confidence"] < self.confidence_threshold:
+            return None
+        
+        model_name = prediction["model_name"]
+        if model_name not in self.model_handler.models:
+            return None
+        model_info = self.model_handler.get_model_info(self.model_handler.models[model_name])
+        alternatives = [m for m in prediction["alternatives"] if m in self.model_handler.models]
+        
+        recommendation = {
+            "model_name": model_name,
+            "explanation": f"{model_name} is a strong fit for tasks like this. {model_info['description']} It is well suited for {', '.join(model_info['use_cases']).lower()}.",
+            "alternative_models": alternatives,
+            "alternative_explanation": "These models were the next closest matches for similar tasks.",
+            "confidence": prediction["confidence"],
+            "source": "local"
+        }
+        # Not stored yet: the classifier must not train on its own guesses, so
+        # record_feedback() saves it only if the user accepts it
+        recommendation_id = str(uuid.uuid4())
+        recommendation["recommendation_id"] = recommendation_id
+        with self._pending_lock:
+            self._pending_local[recommendation_id] = (task_description, dict(recommendation))
+            while len(self._pending_local) > self.max_pending_local:
+                self._pending_local.popitem(last=False)
+        return recommendation
+    
+    def record_feedback(self, recommendation_id, accepted):
+        """Record whether the user accepted a recommendation (improves the local classifier)"""
+        if self.db is None or not recommendation_id:
+            return False
+        with self._pending_lock:
+            pending = self._pending_local.pop(recommendation_id, None)
+        if pending is not None:
+            if not accepted:
+                return True
+            task_description, recommendation = pending
+            return self._save_recommendation(task_description, recommendation, user_accepted=True,
+                                             recommendation_id=recommendation_id)
+        try:
+            return self.db.update_recommendation_feedback(recommendation_id, accepted)
+        except Exception:
+            return False
+    
     def get_recommendation(self, task_description):
         """
         Analyzes the user's task description and recommends the optimal model.
         """
+        local_recommendation = self._get_local_recommendation(task_description)
+        if local_recommendation:
+            return local_recommendation
+        
         # Get the API key
         api_key = os.environ.get("OPENAI_API_KEY")
         if not api_key:
@@ -55,17 +163,9 @@ Provide your recommendation in JSON format with the following structure:
                 "alternative_explanation": "Consider Claude 3.5 Sonnet for long-form content or GPT-4o Mini for faster, more cost-effective responses."
             }
         
-        # Build model details information
-        model_details = ""
-        for model_name, model_id in self.model_handler.models.items():
-            model_info = self.model_handler.get_model_info(model_id)
-            model_details += f"- {model_name}: {model_info['description']}\n"
-            model_details += f"  Strengths: {', '.join(model_info['strengths'])}\n"
-            model_details += f"  Use cases: {', '.join(model_info['use_cases'])}\n\n"
-        
         # Format the prompt
         prompt = self.recommendation_template.format(
-            model_details=model_details,
+            model_details=self.model_details,
             task_description=task_description
         )
         
@@ -90,6 +190,8 @@ Provide your recommendation in JSON format with the following structure:
             # Convert the JSON string to a Python dict
             try:
                 recommendation_data = json.loads(recommendation)
+                recommendation_data["source"] = "llm"
+                self._save_recommendation(task_description, recommendation_data)
                 return recommendation_data
             except json.JSONDecodeError:
                 # Fallback if JSON parsing fails
@@ -108,3 +210,24 @@ Provide your recommendation in JSON format with the following structure:
                 "alternative_models": ["Claude 3.5 Sonnet", "GPT-4o Mini"],
                 "alternative_explanation": "Consider Claude 3.5 Sonnet for long-form content or GPT-4o Mini for faster, more cost-effective responses."
             }
+    
+    def _save_recommendation(self, task_description, recommendation_data, user_accepted=None,
+                             recommendation_id=None):
+        """Store a recommendation so it can train the local classifier; returns whether it was saved"""
+        if self.db is None:
+            return False
+        try:
+            recommendation_id = recommendation_id or str(uuid.uuid4())
+            self.db.save_recommendation(
+                user_id=None,
+                task_description=task_description,
+                recommended_model=recommendation_data.get("model_name"),
+                explanation=recommendation_data.get("explanation", ""),
+                alternative_models=recommendation_data.get("alternative_models", []),
+                user_accepted=user_accepted,
+                recommendation_id=recommendation_id
+            )
+            recommendation_data["recommendation_id"] = recommendation_id
+            return True
+        except Exception:
+            return False
@@ -0,0 +1,333 @@
+import random
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from model_usage_tracker import model_usage_tracker, ModelPricing, ModelUsageTracker
+
+
+@dataclass
+class RoutingPolicy:
+    """Constraints and weights used when scoring candidate models"""
+    latency_slo_seconds: float = 10.0  # p95 latency a model must stay under
+    max_cost_per_call: float = 0.0  # 0 = unlimited
+    min_success_rate: float = 0.8
+    quality_weight: float = 1.0
+    cost_weight: float = 0.3
+    latency_weight: float = 0.3
+
+
+@dataclass
+class RoutingDecision:
+    """Result of a routing decision"""
+    model_id: str
+    task_type: str
+    score: float
+    estimated_latency: float
+    estimated_cost: float
+    success_rate: float
+    within_constraints: bool = True
+    alternatives: List[str] = field(default_factory=list)
+
+
+class ModelRouter:
+    """
+    Picks a model for a task from live per-model statistics.
+
+    Candidates are scored on task quality, rolling p95 latency and success rate
+    (from ModelUsageTracker) and estimated cost (from MODEL_PRICING), subject to a
+    latency SLO and cost budget. No LLM call is made, so a decision is cheap
+    enough to run on every request.
+    """
+
+    # Baseline quality tier of each model (0-1)
+    MODEL_QUALITY = {
+        "gpt-4o": 0.92,
+        "gpt-4o-mini": 0.78,
+        "gpt-3.5-turbo": 0.65,
+        "claude-3-5-sonnet-20241022": 0.93,
+        "claude-3-haiku-20240307": 0.72,
+        "claude-3-sonnet-20240229": 0.82,
+        "claude-3-opus-20240229": 0.95,
+        "gemini-pro": 0.78,
+        "gemini-pro-vision": 0.78,
+        "llama-3-70b-chat": 0.80,
+        "mistral-large-latest": 0.84,
+    }
+
+    # Task-specific quality adjustments on top of the baseline tier
+    TASK_AFFINITY = {
+        "coding": {"gpt-4o": 0.04, "claude-3-5-sonnet-20241022": 0.04, "mistral-large-latest": 0.02},
+        "reasoning": {"claude-3-opus-20240229": 0.03, "gpt-4o": 0.02},
+        "creative": {"claude-3-5-sonnet-20241022": 0.04, "claude-3-opus-20240229": 0.03},
+        "summarization": {"claude-3-haiku-20240307": 0.06, "gpt-4o-mini": 0.06},
+        "vision": {"gemini-pro-vision": 0.12, "gpt-4o": 0.05},
+        "design_consultation": {"claude-3-5-sonnet-20241022": 0.05},
+        "cost_analysis": {"gpt-4o": 0.04},
+        "production_planning": {"claude-3-opus-20240229": 0.04},
+        "customer_service": {"gpt-4o": 0.03},
+        "customer_notifications": {"claude-3-haiku-20240307": 0.08, "gpt-4o-mini": 0.06},
+    }
+
+    # Minimum quality a model needs to be considered for a task
+    TASK_MIN_QUALITY = {
+        "general": 0.6,
+        "coding": 0.8,
+        "reasoning": 0.85,
+        "creative": 0.75,
+        "summarization": 0.6,
+        "vision": 0.8,
+        "design_consultation": 0.8,
+        "cost_analysis": 0.8,
+        "production_planning": 0.85,
+        "customer_service": 0.7,
+        "customer_notifications": 0.6,
+    }
+
+    # Prior p95 latency (seconds) used until enough live samples exist
+    DEFAULT_LATENCY = {
+        "gpt-4o": 4.0,
+        "gpt-4o-mini": 2.0,
+        "gpt-3.5-turbo": 1.5,
+        "claude-3-5-sonnet-20241022": 4.5,
+        "claude-3-haiku-20240307": 1.5,
+        "claude-3-sonnet-20240229": 4.0,
+        "claude-3-opus-20240229": 10.0,
+        "gemini-pro": 3.0,
+        "gemini-pro-vision": 4.0,
+        "llama-3-70b-chat": 5.0,
+        "mistral-large-latest": 5.0,
+    }
+
+    PRIOR_SUCCESS_RATE = 0.98
+    PRIOR_WEIGHT = 5  # Pseudo-samples backing the prior success rate
+    MIN_LATENCY_SAMPLES = 5
+
+    def __init__(self, tracker: ModelUsageTracker = None, stats_ttl_seconds: float = 2.0):
+        self.tracker = tracker or model_usage_tracker
+        self.stats_ttl_seconds = stats_ttl_seconds
+        self.default_policy = RoutingPolicy()
+        self.candidates: Optional[List[str]] = None  # Restrict routing to these models (None = all)
+        self._stats_cache: Dict[str, Dict] = {}
+        self._stats_refreshed_at = 0.0
+
+    def get_quality(self, model_id: str, task_type: str) -> float:
+        """Quality estimate of a model for a task type"""
+        base = self.MODEL_QUALITY.get(model_id, 0.5)
+        return min(1.0, base + self.TASK_AFFINITY.get(task_type, {}).get(model_id, 0.0))
+
+    def estimate_cost(self, model_id: str, input_tokens: int, output_tokens: int) -> float:
+        """Estimated cost of a call using MODEL_PRICING"""
+        pricing = self.tracker.MODEL_PRICING.get(model_id, ModelPricing(input_cost=0.0, output_cost=0.0))
+        return pricing.calculate_cost(input_tokens, output_tokens)
+
+    def _refresh_stats(self):
+        """Snapshot rolling statistics so routing decisions stay cheap"""
+        now = time.monotonic()
+        if self._stats_cache and now - self._stats_refreshed_at < self.stats_ttl_seconds:
+            return
+
+        snapshot = {}
+        for model_id in self.MODEL_QUALITY:
+            stats = self.tracker.get_model_stats(model_id)
+            samples = stats["samples"]
+            success_rate = (stats["successes"] + self.PRIOR_SUCCESS_RATE * self.PRIOR_WEIGHT) / (samples + self.PRIOR_WEIGHT)
+
+            p95 = stats["p95_latency"]
+            if p95 is None or samples < self.MIN_LATENCY_SAMPLES:
+                p95 = self.DEFAULT_LATENCY.get(model_id, 5.0)
+
+            snapshot[model_id] = {"p95_latency": p95, "success_rate": success_rate}
+
+        self._stats_cache = snapshot
+        self._stats_refreshed_at = now
+
+    def invalidate_stats(self):
+        """Force the next routing decision to re-read live statistics"""
+        self._stats_refreshed_at = 0.0
+
+    def route(self, task_type: str = "general", input_tokens: int = 500, output_tokens: int = 500,
+              policy: Optional[RoutingPolicy] = None, candidates: Optional[List[str]] = None) -> Optional[RoutingDecision]:
+        """
+        Pick the best available model for a task under the policy's latency SLO and cost budget.
+        If no candidate meets the constraints the best relaxed choice is returned with
+        within_constraints=False; callers with their own fallback should check it.
+        """
+        policy = policy or self.default_policy
+        self._refresh_stats()
+        min_quality = self.TASK_MIN_QUALITY.get(task_type, self.TASK_MIN_QUALITY["general"])
+        cost_scale = policy.max_cost_per_call or None
+
+        scored = []
+        for model_id in candidates or self.candidates or self.MODEL_QUALITY:
+            stats = self._stats_cache.get(model_id)
+            if stats is None or not self.tracker.is_model_available(model_id)[0]:
+                continue
+
+            quality = self.get_quality(model_id, task_type)
+            if quality < min_quality:
+                continue
+
+            cost = self.estimate_cost(model_id, input_tokens, output_tokens)
+            latency = stats["p95_latency"]
+            success_rate = stats["success_rate"]
+            within = (
+                latency <= policy.latency_slo_seconds
+                and (not policy.max_cost_per_call or cost <= policy.max_cost_per_call)
+                and success_rate >= policy.min_success_rate
+            )
+            scored.append((model_id, quality, cost, latency, success_rate, within))
+
+        if not scored:
+            return None
+
+        if cost_scale is None:
+            cost_scale = max(item[2] for item in scored) or 1.0
+
+        decisions = []
+        for model_id, quality, cost, latency, success_rate, within in scored:
+            score = (
+                policy.quality_weight * quality * success_rate
+                - policy.cost_weight * (cost / cost_scale)
+                - policy.latency_weight * (latency / policy.latency_slo_seconds)
+            )
+            decisions.append(RoutingDecision(
+                model_id=model_id,
+                task_type=task_type,
+                score=score,
+                estimated_latency=latency,
+                estimated_cost=cost,
+                success_rate=success_rate,
+                within_constraints=within
+            ))
+
+        # Prefer models that satisfy the constraints; relax them rather than fail
+        decisions.sort(key=lambda d: (d.within_constraints, d.score), reverse=True)
+        best = decisions[0]
+        best.alternatives = [d.model_id for d in decisions[1:3]]
+        return best
+
+
+class _ReplayStats:
+    """Minimal stand-in for ModelUsageTracker that the simulator feeds with replayed outcomes"""
+
+    MODEL_PRICING = ModelUsageTracker.MODEL_PRICING
+
+    def __init__(self, window_size: int = 200):
+        self.recent_calls: Dict[str, deque] = {}
+        self.window_size = window_size
+
+    def record(self, model_id: str, latency: float, success: bool):
+        self.recent_calls.setdefault(model_id, deque(maxlen=self.window_size)).append((latency, success))
+
+    def is_model_available(self, model_id: str):
+        return True, "Available"
+
+    def get_model_stats(self, model_id: str) -> Dict:
+        samples = self.recent_calls.get(model_id, ())
+        latencies = sorted(latency for latency, success in samples if success)
+        successes = sum(1 for _, success in samples if success)
+        return {
+            "samples": len(samples),
+            "successes": successes,
+            "success_rate": successes / len(samples) if samples else None,
+            "p50_latency": ModelUsageTracker._percentile(latencies, 50),
+            "p95_latency": ModelUsageTracker._percentile(latencies, 95),
+        }
+
+
+class RoutingSimulator:
+    """
+    Replays logged requests to compare routing policies offline.
+
+    Each log record is a dict with `task_type`, `model_id`, `response_time`,
+    `success` and optionally `input_tokens` / `output_tokens`. Outcomes for a
+    model chosen by a policy are sampled from that model's logged behaviour.
+    """
+
+    def __init__(self, records: List[Dict], seed: int = 42):
+        self.records = records
+        self.seed = seed
+        self.outcomes: Dict[str, List[Dict]] = {}
+        for record in records:
+            self.outcomes.setdefault(record["model_id"], []).append(record)
+
+    @classmethod
+    def from_database(cls, db, days: int = 30, seed: int = 42) -> "RoutingSimulator":
+        """Build a simulator from ModelUsage rows in the database"""
+        return cls(db.get_model_usage_records(days=days), seed=seed)
+
+    def _sample_outcome(self, model_id: str, rng: random.Random) -> Dict:
+        outcomes = self.outcomes.get(model_id)
+        if outcomes:
+            return rng.choice(outcomes)
+        # No history for this model: fall back to the router's priors
+        return {
+            "response_time": ModelRouter.DEFAULT_LATENCY.get(model_id, 5.0),
+            "success": rng.random() < ModelRouter.PRIOR_SUCCESS_RATE
+        }
+
+    def run(self, policy: Callable[[str, ModelRouter], str], latency_slo_seconds: float = 10.0) -> Dict:
+        """Replay all records through a policy and summarise cost, latency and success"""
+        rng = random.Random(self.seed)
+        stats = _ReplayStats()
+        router = ModelRouter(tracker=stats, stats_ttl_seconds=0)
+        # Only route to models whose behaviour is present in the log
+        router.candidates = list(self.outcomes) or None
+
+        latencies = []
+        total_cost = 0.0
+        successes = 0
+        slo_violations = 0
+        model_mix: Dict[str, int] = {}
+
+        for record in self.records:
+            model_id = policy(record.get("task_type") or "general", router)
+            outcome = self._sample_outcome(model_id, rng)
+            input_tokens = record.get("input_tokens", 500)
+            output_tokens = record.get("output_tokens", 500)
+
+            latency = outcome.get("response_time") or 0.0
+            success = bool(outcome.get("success", True))
+            stats.record(model_id, latency, success)
+
+            latencies.append(latency)
+            total_cost += router.estimate_cost(model_id, input_tokens, output_tokens)
+            successes += success
+            slo_violations += latency > latency_slo_seconds
+            model_mix[model_id] = model_mix.get(model_id, 0) + 1
+
+        latencies.sort()
+        count = len(latencies) or 1
+        return {
+            "requests": len(latencies),
+            "total_cost": total_cost,
+            "avg_cost": total_cost / count,
+            "p50_latency": ModelUsageTracker._percentile(latencies, 50),
+            "p95_latency": ModelUsageTracker._percentile(latencies, 95),
+            "success_rate": successes / count,
+            "slo_violation_rate": slo_violations / count,
+            "model_mix": model_mix,
+        }
+
+    def compare(self, policies: Dict[str, Callable[[str, ModelRouter], str]], latency_slo_seconds: float = 10.0) -> Dict[str, Dict]:
+        """Run several policies over the same log and return their summaries by name"""
+        return {name: self.run(policy, latency_slo_seconds) for name, policy in policies.items()}
+
+
+def static_policy(mapping: Dict[str, str], default_model: str = "gpt-4o") -> Callable[[str, ModelRouter], str]:
+    """Policy that always uses a fixed model per task type (today's hardcoded behaviour)"""
+    return lambda task_type, router: mapping.get(task_type, default_model)
+
+
+def router_policy(policy: Optional[RoutingPolicy] = None, default_model: str = "gpt-4o") -> Callable[[str, ModelRouter], str]:
+    """Policy that asks the live router for every request"""
+    def choose(task_type, router):
+        decision = router.route(task_type, policy=policy)
+        return decision.model_id if decision and decision.within_constraints else default_model
+    return choose
+
+
+# Global instance
+model_router = ModelRouter()
@@ -1,9 +1,14 @@
 import json
 import os
+import threading
+import time
+from collections import deque
 from datetime import datetime, timedelta
 from dataclasses import dataclass, asdict, field
 from typing import Dict, List, Optional
 import logging
+from metrics import metrics
+from tracing import tracer
 
 @dataclass
 class ModelPricing:
@@ -65,9 +70,25 @@ class ModelUsageTracker:
         "mistral-large-latest": ModelPricing(input_cost=4.00, output_cost=12.00),
     }
     
+    # Default ordered fallback chains (used when no settings are saved for a model)
+    DEFAULT_FALLBACK_MODELS = {
+        "gpt-4o": ["claude-3-5-sonnet-20241022", "gpt-4o-mini"],
+        "gpt-4o-mini": ["claude-3-haiku-20240307", "gpt-3.5-turbo"],
+        "gpt-3.5-turbo": ["gpt-4o-mini", "claude-3-haiku-20240307"],
+        "claude-3-5-sonnet-20241022": ["gpt-4o", "claude-3-sonnet-20240229"],
+        "claude-3-haiku-20240307": ["gpt-4o-mini", "gpt-3.5-turbo"],
+        "claude-3-sonnet-20240229": ["claude-3-5-sonnet-20241022", "gpt-4o"],
+        "claude-3-opus-20240229": ["claude-3-5-sonnet-20241022", "gpt-4o"],
+        "gemini-pro": ["gpt-4o-mini", "claude-3-haiku-20240307"],
+        "gemini-pro-vision": ["gpt-4o", "claude-3-5-sonnet-20241022"],
+        "llama-3-70b-chat": ["gpt-4o", "claude-3-5-sonnet-20241022"],
+        "mistral-large-latest": ["gpt-4o", "claude-3-5-sonnet-20241022"],
+    }
+    
     def __init__(self):
         self.metrics_file = "model_usage_metrics.json"
         self.circuit_breaker_file = "circuit_breaker_state.json"
+        self.circuit_breaker_settings_file = "circuit_breaker_settings.json"
         self.log_file = "model_usage_tracker.log"
         
         # Setup logging
@@ -78,8 +99,16 @@ class ModelUsageTracker:
         )
         self.logger = logging.getLogger(__name__)
         
+        # Guards metric updates when calls are tracked from worker threads
+        self._lock = threading.RLock()
+        
+        # Rolling window of recent calls per model: (timestamp, response_time, success)
+        self.latency_window_size = 200
+        self.recent_calls: Dict[str, deque] = {}
+        
         self.model_metrics: Dict[str, ModelUsageMetrics] = self.load_metrics()
         self.circuit_breakers: Dict[str, Dict] = self.load_circuit_breaker_state()
+        self.circuit_breaker_settings: Dict[str, CircuitBreakerSettings] = self.load_circuit_breaker_settings()
         
         # Initialize metrics for all known models
         self._initialize_model_metrics()
@@ -116,6 +145,11 @@ class ModelUsageTracker:
                     "last_error": None,
                     "opened_at": None
                 }
+            
+            if model_id not in self.circuit_breaker_settings:
+                self.circuit_breaker_settings[model_id] = CircuitBreakerSettings(
+                    fallback_models=list(self.DEFAULT_FALLBACK_MODELS.get(model_id, []))
+                )
     
     def load_metrics(self) -> Dict[str, ModelUsageMetrics]:
         """Load model usage metrics from file"""
@@ -141,6 +175,20 @@ class ModelUsageTracker:
             self.logger.error(f"Error loading circuit breaker state: {e}")
         return {}
     
+    def load_circuit_breaker_settings(self) -> Dict[str, CircuitBreakerSettings]:
+        """Load per-model circuit breaker settings from file"""
+        try:
+            if os.path.exists(self.circuit_breaker_settings_file):
+                with open(self.circuit_breaker_settings_file, 'r') as f:
+                    data = json.load(f)
+                    return {
+                        model_id: CircuitBreakerSettings(**settings)
+                        for model_id, settings in data.items()
+                    }
+        except Exception as e:
+            self.logger.error(f"Error loading circuit breaker settings: {e}")
+        return {}
+    
     def save_metrics(self):
         """Save model usage metrics to file"""
         try:
@@ -161,6 +209,48 @@ class ModelUsageTracker:
         except Exception as e:
             self.logger.error(f"Error saving circuit breaker state: {e}")
     
+    def save_circuit_breaker_settings(self):
+        """Save per-model circuit breaker settings to file"""
+        try:
+            data = {
+                model_id: asdict(settings)
+                for model_id, settings in self.circuit_breaker_settings.items()
+            }
+            with open(self.circuit_breaker_settings_file, 'w') as f:
+                json.dump(data, f, indent=2)
+        except Exception as e:
+            self.logger.error(f"Error saving circuit breaker settings: {e}")
+    
+    def get_circuit_breaker_settings(self, model_id: str) -> CircuitBreakerSettings:
+        """Get circuit breaker settings for a model (defaults if none are configured)"""
+        settings = self.circuit_breaker_settings.get(model_id)
+        if settings is None:
+            settings = CircuitBreakerSettings(
+                fallback_models=list(self.DEFAULT_FALLBACK_MODELS.get(model_id, []))
+            )
+        return settings
+    
+    def set_circuit_breaker_settings(self, model_id: str, enabled: bool = True, error_threshold: int = 3,
+                                     timeout_seconds: int = 60, fallback_models: Optional[List[str]] = None):
+        """Update circuit breaker settings for a specific model"""
+        if model_id in self.model_metrics:
+            self.circuit_breaker_settings[model_id] = CircuitBreakerSettings(
+                enabled=enabled,
+                error_threshold=max(1, error_threshold),
+                timeout_seconds=max(0, timeout_seconds),
+                fallback_models=[m for m in (fallback_models or []) if m != model_id]
+            )
+            self.save_circuit_breaker_settings()
+            self.logger.info(f"Updated circuit breaker settings for {model_id}: threshold={error_threshold}, timeout={timeout_seconds}s, fallbacks={fallback_models}")
+    
+    def get_fallback_chain(self, model_id: str) -> List[str]:
+        """Get the ordered list of models to try, starting with the requested model"""
+        chain = [model_id]
+        for fallback_id in self.get_circuit_breaker_settings(model_id).fallback_models:
+            if fallback_id not in chain:
+                chain.append(fallback_id)
+        return chain
+    
     def is_model_available(self, model_id: str) -> tuple[bool, str]:
         """Check if a model is available for use"""
         if model_id not in self.model_metrics:
@@ -173,13 +263,14 @@ class ModelUsageTracker:
             return False, f"Model {metrics.model_name} is disabled"
         
         # Check circuit breaker
+        settings = self.get_circuit_breaker_settings(model_id)
         circuit_state = self.circuit_breakers.get(model_id, {})
-        if circuit_state.get("state") == "open":
+        if settings.enabled and circuit_state.get("state") == "open":
             # Check if timeout has passed
             opened_at = circuit_state.get("opened_at")
             if opened_at:
                 opened_time = datetime.fromisoformat(opened_at)
-                if datetime.now() - opened_time < timedelta(seconds=60):
+                if datetime.now() - opened_time < timedelta(seconds=settings.timeout_seconds):
                     return False, f"Model {metrics.model_name} circuit breaker is open (too many errors)"
                 else:
                     # Move to half-open state
@@ -198,14 +289,27 @@ class ModelUsageTracker:
         
         return True, "Available"
     
-    def track_usage(self, model_id: str, input_tokens: int, output_tokens: int, success: bool = True):
+    @tracer.traced("usage.track_model")
+    def track_usage(self, model_id: str, input_tokens: int, output_tokens: int, success: bool = True,
+                    response_time: Optional[float] = None):
         """Track usage for a model"""
+        with self._lock:
+            self._track_usage(model_id, input_tokens, output_tokens, success, response_time)
+    
+    def _track_usage(self, model_id: str, input_tokens: int, output_tokens: int, success: bool,
+                     response_time: Optional[float]):
+        """Update metrics, latency samples and circuit breaker state (caller holds the lock)"""
         if model_id not in self.model_metrics:
             self.logger.warning(f"Tracking usage for unknown model: {model_id}")
             return
         
         metrics = self.model_metrics[model_id]
         
+        # Record latency sample for rolling statistics
+        self.recent_calls.setdefault(model_id, deque(maxlen=self.latency_window_size)).append(
+            (time.time(), response_time, success)
+        )
+        
         # Calculate cost
         pricing = self.MODEL_PRICING.get(model_id, ModelPricing(input_cost=0.0, output_cost=0.0))
         cost = pricing.calculate_cost(input_tokens, output_tokens)
@@ -239,7 +343,8 @@ class ModelUsageTracker:
             self.circuit_breakers[model_id]["last_error"] = datetime.now().isoformat()
             
             # Open circuit if threshold exceeded
-            if self.circuit_breakers[model_id]["error_count"] >= 3:
+            settings = self.get_circuit_breaker_settings(model_id)
+            if settings.enabled and self.circuit_breakers[model_id]["error_count"] >= settings.error_threshold:
                 self.circuit_breakers[model_id]["state"] = "open"
                 self.circuit_breakers[model_id]["opened_at"] = datetime.now().isoformat()
                 self.logger.warning(f"Circuit breaker opened for {model_id} due to repeated errors")
@@ -249,6 +354,38 @@ class ModelUsageTracker:
         
         self.logger.info(f"Tracked usage for {model_id}: {input_tokens} input, {output_tokens} output, ${cost:.4f}")
     
+    def get_latency_percentile(self, model_id: str, percentile: float = 95) -> Optional[float]:
+        """Get a latency percentile (seconds) over the model's recent successful calls"""
+        with self._lock:
+            samples = sorted(
+                latency for _, latency, success in self.recent_calls.get(model_id, ())
+                if success and latency is not None
+            )
+        return self._percentile(samples, percentile)
+    
+    @staticmethod
+    def _percentile(sorted_samples: List[float], percentile: float) -> Optional[float]:
+        """Nearest-rank percentile of an already sorted list"""
+        if not sorted_samples:
+            return None
+        index = min(len(sorted_samples) - 1, max(0, int(round(percentile / 100 * len(sorted_samples))) - 1))
+        return sorted_samples[index]
+    
+    def get_model_stats(self, model_id: str) -> Dict:
+        """Get rolling latency and success statistics for a model"""
+        with self._lock:
+            samples = list(self.recent_calls.get(model_id, ()))
+        latencies = sorted(latency for _, latency, success in samples if success and latency is not None)
+        successes = sum(1 for _, _, success in samples if success)
+        
+        return {
+            "samples": len(samples),
+            "successes": successes,
+            "success_rate": successes / len(samples) if samples else None,
+            "p50_latency": self._percentile(latencies, 50),
+            "p95_latency": self._percentile(latencies, 95),
+        }
+    
     def reset_daily_metrics(self, model_id: Optional[str] = None):
         """Reset daily metrics for one or all models"""
         if model_id:
@@ -335,3 +472,19 @@ class ModelUsageTracker:
 
 # Global instance
 model_usage_tracker = ModelUsageTracker()
+
+
+def _collect_model_metrics():
+    """Export per-model daily usage and circuit breaker state as gauges"""
+    calls = metrics.gauge('model_daily_calls', 'Calls today per model', ('model',))
+    cost = metrics.gauge('model_daily_cost_dollars', 'Estimated spend today per model', ('model',))
+    circuit = metrics.gauge('model_circuit_open', '1 if the model circuit breaker is open', ('model',))
+    with model_usage_tracker._lock:
+        for model_id, model_metrics in model_usage_tracker.model_metrics.items():
+            calls.set(model_metrics.daily_calls, model=model_id)
+            cost.set(model_metrics.daily_cost, model=model_id)
+            state = model_usage_tracker.circuit_breakers.get(model_id, {}).get("state")
+            circuit.set(1 if state == "open" else 0, model=model_id)
+
+
+metrics.register_collector(_collect_model_metrics)
@@ -0,0 +1,128 @@
+"""
+Password hashing off the request thread
+
+Hashes are computed in a small process pool so a burst of logins does not hold
+the GIL of the Streamlit/Flask process. The algorithm and its parameters are
+stored in the hash string:
+
+    $scrypt$n=16384,r=8,p=1$<salt>$<hash>
+    $pbkdf2-sha256$i=600000$<salt>$<hash>
+
+Legacy "<hex>:<salt>" hashes (PBKDF2-SHA256, 100k rounds) still verify, and
+needs_rehash() reports any hash whose algorithm or parameters are not the
+current ones so it can be upgraded on the next successful login.
+"""
+
+import os
+import hmac
+import base64
+import hashlib
+import secrets
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Tuple
+
+DEFAULT_PARAMS = {
+    'scrypt': {'n': 16384, 'r': 8, 'p': 1},
+    'pbkdf2-sha256': {'i': 600000},
+}
+
+LEGACY_PBKDF2_ROUNDS = 100000
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.b64encode(data).decode('ascii').rstrip('=')
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+
+def derive_key(algorithm: str, params: Dict[str, int], password: str, salt: bytes) -> bytes:
+    """Raw key derivation; module-level so it can run in a worker process"""
+    if algorithm == 'scrypt':
+        n, r, p = params['n'], params['r'], params['p']
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                              maxmem=256 * n * r + 1024 * 1024, dklen=32)
+    if algorithm == 'pbkdf2-sha256':
+        return hashlib.pbkdf2_hmac('sha256', password.encode(), salt, params['i'])
+    raise ValueError(f"Unsupported hash algorithm: {algorithm}")
+
+
+def _legacy_digest(password: str, salt: str) -> str:
+    return hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), LEGACY_PBKDF2_ROUNDS).hex()
+
+
+class PasswordHasher:
+    """Versioned password hashes computed in a bounded process pool"""
+
+    def __init__(self, algorithm: Optional[str] = None, params: Optional[Dict[str, int]] = None,
+                 workers: Optional[int] = None, max_pending: Optional[int] = None):
+        self.algorithm = algorithm or os.environ.get('AUTH_HASH_ALGORITHM', 'scrypt')
+        if self.algorithm not in DEFAULT_PARAMS:
+            raise ValueError(f"Unsupported hash algorithm: {self.algorithm}")
+        self.params = dict(params or DEFAULT_PARAMS[self.algorithm])
+        # workers=0 (or AUTH_HASH_WORKERS=0) hashes on the calling thread without a pool
+        self.workers = workers if workers is not None else \
+            int(os.environ.get('AUTH_HASH_WORKERS', min(4, os.cpu_count() or 1)))
+        # Callers beyond this wait for a slot instead of piling work onto the pool
+        self._slots = threading.BoundedSemaphore(max_pending or max(1, self.workers) * 4)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def _run(self, function, *args):
+        """Run in the process pool; falls back to the calling thread if no pool can be started"""
+        with self._slots:
+            with self._executor_lock:
+                if self._executor is None and self.workers > 0:
+                    try:
+                        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                    except (OSError, NotImplementedError) as e:
+                        print(f"Password hashing pool unavailable ({e}); hashing inline")
+                        self.workers = 0
+                executor = self._executor
+            if executor is None:
+                return function(*args)
+            return executor.submit(function, *args).result()
+
+    def format_params(self, params: Dict[str, int]) -> str:
+        return ','.join(f"{key}={value}" for key, value in params.items())
+
+    @staticmethod
+    def parse(password_hash: str) -> Tuple[str, Dict[str, int], bytes, bytes]:
+        """Split a versioned hash into (algorithm, params, salt, key)"""
+        _, algorithm, params, salt, key = password_hash.split('$')
+        parsed = {name: int(value) for name, value in (item.split('=') for item in params.split(','))}
+        return algorithm, parsed, _b64decode(salt), _b64decode(key)
+
+    def hash(self, password: str) -> str:
+        salt = secrets.token_bytes(16)
+        key = self._run(derive_key, self.algorithm, self.params, password, salt)
+        return f"${self.algorithm}${self.format_params(self.params)}${_b64encode(salt)}${_b64encode(key)}"
+
+    def verify(self, password: str, password_hash: str) -> bool:
+        """Constant-time check against a versioned or legacy hash"""
+        try:
+            if not password_hash.startswith('$'):
+                hash_part, salt = password_hash.split(':')
+                return hmac.compare_digest(self._run(_legacy_digest, password, salt), hash_part)
+            algorithm, params, salt, key = self.parse(password_hash)
+            return hmac.compare_digest(self._run(derive_key, algorithm, params, password, salt), key)
+        except Exception:
+            return False
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """True if the hash is legacy or uses another algorithm or parameters"""
+        if not password_hash.startswith('$'):
+            return True
+        try:
+            algorithm, params, _, _ = self.parse(password_hash)
+        except ValueError:
+            return True
+        return algorithm != self.algorithm or params != self.params
+
+    def shutdown(self):
+        with self._executor_lock:
+            if self._executor:
+                self._executor.shutdown(wait=False)
+                self._executor = None
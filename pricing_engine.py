@@ -0,0 +1,308 @@
+"""
+Deterministic pricing engine for custom framing quotes
+
+Prices come from a material catalog (moulding per foot, mat board and glazing
+per square foot), united-inch labor brackets and a retail markup. Per-united-
+inch labor and per-square-foot rates are precomputed at startup so a quote is a
+handful of lookups and multiplications.
+"""
+
+import re
+import math
+import time
+from itertools import product
+from typing import Any, Dict, List, Optional, Tuple
+
+# Moulding cost per linear foot (wholesale) and face width in inches
+FRAME_MOULDINGS = {
+    'Pine Wood': {'per_foot': 3.50, 'width': 1.0},
+    'Aluminum Silver': {'per_foot': 4.75, 'width': 0.75},
+    'Aluminum Black': {'per_foot': 4.75, 'width': 0.75},
+    'Modern Steel': {'per_foot': 6.25, 'width': 1.0},
+    'Hardwood Oak': {'per_foot': 7.50, 'width': 1.5},
+    'Hardwood Cherry': {'per_foot': 9.00, 'width': 1.5},
+    'Ornate Gold': {'per_foot': 12.50, 'width': 2.5},
+    'Hand-crafted Walnut': {'per_foot': 15.00, 'width': 2.0},
+}
+
+# Mat layers per style; mat board cost per square foot per layer
+MAT_STYLES = {'No Mat': 0, 'Single Mat': 1, 'Double Mat': 2, 'Triple Mat': 3}
+MAT_BOARD_PER_SQFT = 2.40
+
+# Glazing cost per square foot
+GLAZING = {
+    'Standard Glass': 2.75,
+    'Acrylic': 4.00,
+    'Non-Glare Glass': 4.50,
+    'UV Protection': 6.00,
+    'Museum Glass': 14.00,
+    'Museum UV Acrylic': 16.00,
+}
+
+# Backing cost per square foot
+BACKING = {'Standard': 0.90, 'Acid-Free': 1.60, 'Museum Board': 2.80}
+
+# Labor minutes by united-inch bracket (upper bound inclusive), plus per mat layer
+LABOR_BRACKETS = [(40, 30), (60, 40), (80, 50), (100, 65), (120, 80), (160, 100), (200, 130)]
+LABOR_MINUTES_PER_MAT = 10
+LABOR_RATE_PER_HOUR = 45.0
+
+RETAIL_MARKUP = 2.2  # Applied to materials
+MOULDING_WASTE = 1.15
+RUSH_FEE = 0.5  # Fraction of the order total
+MAX_UNITED_INCHES = 200
+
+DIMENSIONS_PATTERN = re.compile(r"(\d+(?:\.\d+)?)\s*[xX×]\s*(\d+(?:\.\d+)?)")
+NUMBER_PATTERN = re.compile(r"-?\d+(?:\.\d+)?")
+AMOUNT_PATTERN = re.compile(r"\$?\s*(\d[\d,]*(?:\.\d+)?)")
+
+TRUE_VALUES = {'true', '1', 'yes', 'y', 'on'}
+FALSE_VALUES = {'false', '0', 'no', 'n', 'off', ''}
+
+
+def parse_flag(value: Any) -> Optional[bool]:
+    """
+    Strict boolean for POS/form fields: True/False, 1/0 and 'true'/'yes'/'1' vs
+    'false'/'no'/'0'/'' (missing is False). Anything else returns None.
+    """
+    if value is None or isinstance(value, bool):
+        return bool(value)
+    if isinstance(value, (int, float)) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str):
+        text = value.strip().lower()
+        if text in TRUE_VALUES:
+            return True
+        if text in FALSE_VALUES:
+            return False
+    return None
+
+
+class PricingError(ValueError):
+    """Raised when a quote cannot be computed from the given specification"""
+
+
+class PricingEngine:
+    """Exact, local framing quotes and in-budget alternatives"""
+
+    def __init__(self):
+        # Labor cost (before mats) for every whole united inch up to the maximum
+        self.labor_table = [self._labor_minutes(ui) / 60.0 * LABOR_RATE_PER_HOUR
+                            for ui in range(MAX_UNITED_INCHES + 1)]
+        self.mat_labor_cost = LABOR_MINUTES_PER_MAT / 60.0 * LABOR_RATE_PER_HOUR
+        self.glazing_rates = {name: rate * RETAIL_MARKUP for name, rate in GLAZING.items()}
+        self.backing_rates = {name: rate * RETAIL_MARKUP for name, rate in BACKING.items()}
+        self.moulding_rates = {name: spec['per_foot'] * MOULDING_WASTE * RETAIL_MARKUP
+                               for name, spec in FRAME_MOULDINGS.items()}
+        self.mat_rate = MAT_BOARD_PER_SQFT * RETAIL_MARKUP
+
+    @staticmethod
+    def _labor_minutes(united_inches: int) -> int:
+        for upper, minutes in LABOR_BRACKETS:
+            if united_inches <= upper:
+                return minutes
+        return LABOR_BRACKETS[-1][1]
+
+    @staticmethod
+    def parse_inches(value: Any, default: Optional[float] = None) -> Optional[float]:
+        """Accept 2, 2.5, '2 inch' or '2.5 inches'"""
+        if isinstance(value, (int, float)):
+            return float(value)
+        match = NUMBER_PATTERN.search(str(value or ''))
+        return float(match.group()) if match else default
+
+    @staticmethod
+    def parse_amount(value: Any) -> Optional[float]:
+        """Accept 300, 299.5, '300', '$300' or '$1,200.00'; None if not a plain amount"""
+        if isinstance(value, bool):
+            return None
+        if isinstance(value, (int, float)):
+            return float(value) if math.isfinite(value) else None
+        match = AMOUNT_PATTERN.fullmatch(str(value).strip())
+        return float(match.group(1).replace(',', '')) if match else None
+
+    @staticmethod
+    def parse_dimensions(spec: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+        """
+        Artwork size from width/height fields ('16' or '16 in'), a dimensions dict
+        or text like '16x20'. Sizes are not range-checked here; quote() rejects
+        non-positive ones.
+        """
+        dimensions = spec.get('dimensions')
+        for fields in (spec, dimensions):
+            if isinstance(fields, dict) and fields.get('width') is not None and fields.get('height') is not None:
+                width = PricingEngine.parse_inches(fields['width'])
+                height = PricingEngine.parse_inches(fields['height'])
+                if width is not None and height is not None:
+                    return width, height
+        for text in (dimensions, spec.get('artwork_size'), spec.get('artwork_description'), spec.get('notes')):
+            match = DIMENSIONS_PATTERN.search(str(text or ''))
+            if match:
+                return float(match.group(1)), float(match.group(2))
+        return None
+
+    def _components(self, width: float, height: float, mat_layers: int, mat_width: float) -> Dict[str, float]:
+        """Geometry shared by every material choice for one artwork size"""
+        if width <= 0 or height <= 0:
+            raise PricingError(f"Artwork width and height must be positive, got {width:g} x {height:g}")
+        if mat_width < 0:
+            raise PricingError(f"Mat width cannot be negative, got {mat_width:g}")
+        outer_width = width + 2 * mat_width * (mat_layers > 0)
+        outer_height = height + 2 * mat_width * (mat_layers > 0)
+        united_inches = outer_width + outer_height
+        if united_inches > MAX_UNITED_INCHES:
+            raise PricingError(f"{united_inches:.0f} united inches exceeds the {MAX_UNITED_INCHES} inch maximum")
+        return {
+            'united_inches': united_inches,
+            'area_sqft': outer_width * outer_height / 144.0,
+            'perimeter_in': 2 * united_inches,
+            'labor': self.labor_table[int(math.ceil(united_inches))] + mat_layers * self.mat_labor_cost
+        }
+
+    def quote(self, width: float, height: float, frame_type: str = 'Hardwood Oak', mat_style: str = 'Single Mat',
+              glass_type: str = 'Standard Glass', backing_type: str = 'Standard', mat_width: float = 2.5,
+              frame_width: Optional[float] = None, rush: bool = False) -> Dict[str, Any]:
+        """Price one framing specification; raises PricingError for unknown materials or sizes"""
+        if frame_type not in self.moulding_rates:
+            raise PricingError(f"Unknown frame type: {frame_type}")
+        if mat_style not in MAT_STYLES:
+            raise PricingError(f"Unknown mat style: {mat_style}")
+        if glass_type not in self.glazing_rates:
+            raise PricingError(f"Unknown glass type: {glass_type}")
+        if backing_type not in self.backing_rates:
+            raise PricingError(f"Unknown backing type: {backing_type}")
+
+        mat_layers = MAT_STYLES[mat_style]
+        geometry = self._components(width, height, mat_layers, mat_width)
+        face = frame_width if frame_width is not None else FRAME_MOULDINGS[frame_type]['width']
+
+        # Moulding is cut on the outside edge: add 8 face widths for the mitred corners
+        frame_cost = (geometry['perimeter_in'] + 8 * face) / 12.0 * self.moulding_rates[frame_type]
+        mat_cost = geometry['area_sqft'] * self.mat_rate * mat_layers
+        glass_cost = geometry['area_sqft'] * self.glazing_rates[glass_type]
+        backing_cost = geometry['area_sqft'] * self.backing_rates[backing_type]
+        labor = geometry['labor']
+        materials_total = frame_cost + mat_cost + glass_cost + backing_cost
+        rush_fee = (materials_total + labor) * RUSH_FEE if rush else 0.0
+
+        return {
+            'specification': {
+                'width': width, 'height': height, 'frame_type': frame_type, 'mat_style': mat_style,
+                'glass_type': glass_type, 'backing_type': backing_type, 'mat_width': mat_width, 'rush': rush
+            },
+            'united_inches': round(geometry['united_inches'], 2),
+            'materials': {
+                'frame': round(frame_cost, 2),
+                'mat': round(mat_cost, 2),
+                'glass': round(glass_cost, 2),
+                'backing': round(backing_cost, 2)
+            },
+            'labor': round(labor, 2),
+            'material_cost': round(materials_total / RETAIL_MARKUP, 2),
+            'markup': round(materials_total - materials_total / RETAIL_MARKUP, 2),
+            'rush_fee': round(rush_fee, 2),
+            'total': round(materials_total + labor + rush_fee, 2)
+        }
+
+    def quote_order(self, order_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Price a POS/designer order dict.
+
+        Returns {'valid', 'errors', 'quote', 'budget'}; missing, unknown or
+        malformed fields (including rush_order and budget) are reported as
+        validation errors instead of raising.
+        """
+        started = time.perf_counter()
+        errors = []
+        dimensions = self.parse_dimensions(order_data)
+        if not dimensions:
+            errors.append("Artwork dimensions missing (width/height or e.g. '16x20')")
+
+        rush = parse_flag(order_data.get('rush_order'))
+        if rush is None:
+            errors.append(f"rush_order must be true or false, got {order_data.get('rush_order')!r}")
+
+        budget = None
+        if order_data.get('budget') not in (None, ''):
+            budget = self.parse_amount(order_data['budget'])
+            if budget is None or budget < 0:
+                errors.append(f"budget must be an amount like 300 or '$300', got {order_data['budget']!r}")
+                budget = None
+
+        quote = None
+        if dimensions and rush is not None:
+            try:
+                quote = self.quote(
+                    dimensions[0], dimensions[1],
+                    frame_type=order_data.get('frame_material') or order_data.get('frame_type') or 'Hardwood Oak',
+                    mat_style=order_data.get('mat_style', 'Single Mat'),
+                    glass_type=order_data.get('glass_type', 'Standard Glass'),
+                    backing_type=order_data.get('backing_type', 'Standard'),
+                    mat_width=self.parse_inches(order_data.get('mat_width'), 2.5),
+                    frame_width=self.parse_inches(order_data.get('frame_width')),
+                    rush=rush
+                )
+            except PricingError as e:
+                errors.append(str(e))
+
+        return {
+            'valid': not errors,
+            'errors': errors,
+            'quote': quote,
+            'budget': budget,
+            'compute_us': round((time.perf_counter() - started) * 1e6, 1)
+        }
+
+    def alternatives(self, width: float, height: float, budget: float, current: Optional[Dict[str, Any]] = None,
+                     mat_width: float = 2.5, rush: bool = False, limit: int = 3) -> List[Dict[str, Any]]:
+        """
+        In-budget alternatives across every frame, mat and glazing combination.
+
+        Each component is priced once per mat layout and combinations are only
+        summed, so the full catalog is searched in well under a millisecond.
+        """
+        current = current or {}
+        rush_factor = 1.0 + RUSH_FEE if rush else 1.0
+        backing_type = current.get('backing_type', 'Standard')
+        options = []
+        for mat_style, mat_layers in MAT_STYLES.items():
+            geometry = self._components(width, height, mat_layers, mat_width)
+            base = geometry['area_sqft'] * (self.mat_rate * mat_layers + self.backing_rates[backing_type]) \
+                + geometry['labor']
+            frame_costs = {name: (geometry['perimeter_in'] + 8 * FRAME_MOULDINGS[name]['width']) / 12.0 * rate
+                           for name, rate in self.moulding_rates.items()}
+            glass_costs = {name: geometry['area_sqft'] * rate for name, rate in self.glazing_rates.items()}
+            for (frame_type, frame_cost), (glass_type, glass_cost) in product(frame_costs.items(), glass_costs.items()):
+                total = (base + frame_cost + glass_cost) * rush_factor
+                if total <= budget:
+                    options.append((total, frame_type, mat_style, glass_type))
+
+        if not options:
+            return []
+
+        def changes(option):
+            return sum(1 for key, value in zip(('frame_type', 'mat_style', 'glass_type'), option[1:])
+                       if current.get(key) and current.get(key) != value)
+
+        picks = [
+            ('Budget-Friendly Option', min(options)),
+            ('Premium Option', max(options)),
+            ('Closest to Requested', min(options, key=lambda option: (changes(option), -option[0]))),
+        ]
+        alternatives, seen = [], set()
+        for name, (total, frame_type, mat_style, glass_type) in picks:
+            if (frame_type, mat_style, glass_type) in seen:
+                continue
+            seen.add((frame_type, mat_style, glass_type))
+            alternatives.append({
+                'name': name,
+                'frame_type': frame_type,
+                'mat_style': mat_style,
+                'glass_type': glass_type,
+                'estimated_cost': round(total, 2),
+                'under_budget_by': round(budget - total, 2)
+            })
+        return alternatives[:limit]
+
+
+pricing_engine = PricingEngine()
@@ -0,0 +1,337 @@
+"""
+Deterministic production scheduler for the framing workshop
+
+A priority- and deadline-aware list scheduler. Orders are ranked by a modified
+due date (deadline pulled earlier for higher priority), materials are reserved
+in that order, and each order is placed on the first free bench slot that
+respects the daily frame limit. The result is a structured kanban plan; the
+same inputs always give the same plan.
+
+Material stock is keyed by normalized names ('Cherry Frames' and
+'cherry_frames' are the same key). Orders either list their materials
+explicitly or have them derived from frame_type and glass_type, matched
+against the most specific stock key the shop tracks (e.g. 'cherry_frames',
+then 'hardwood_frames').
+"""
+
+import re
+import math
+import heapq
+import random
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from pricing_engine import parse_flag
+
+PRIORITY_WEIGHTS = {'urgent': 4, 'high': 3, 'normal': 2, 'medium': 2, 'low': 1}
+
+# Days a deadline is pulled forward when ranking, by priority weight
+PRIORITY_LEAD_DAYS = {4: 3, 3: 2, 2: 0, 1: -1}
+
+# Bench hours for one order by complexity
+COMPLEXITY_HOURS = {'low': 1.5, 'medium': 3.0, 'high': 5.0}
+
+# Stock keys an order's frame or glazing draws from, most specific first
+FRAME_STOCK_KEYS = {
+    'pine wood': ('pine_frames', 'wood_frames'),
+    'aluminum silver': ('aluminum_silver_frames', 'aluminum_frames'),
+    'aluminum black': ('aluminum_black_frames', 'aluminum_frames'),
+    'modern steel': ('steel_frames', 'metal_frames'),
+    'hardwood oak': ('oak_frames', 'hardwood_frames'),
+    'hardwood cherry': ('cherry_frames', 'hardwood_frames'),
+    'ornate gold': ('gold_frames', 'ornate_frames'),
+    'hand-crafted walnut': ('walnut_frames', 'hardwood_frames'),
+}
+GLASS_STOCK_KEYS = {
+    'standard glass': ('standard_glass',),
+    'acrylic': ('acrylic',),
+    'non-glare glass': ('non_glare_glass', 'standard_glass'),
+    'uv protection': ('uv_glass', 'uv_protection'),
+    'museum glass': ('museum_glass',),
+    'museum uv acrylic': ('museum_uv_acrylic', 'museum_acrylic', 'museum_glass'),
+}
+
+
+class SchedulingError(ValueError):
+    """Raised when orders, capacity or stock are malformed"""
+
+
+def stock_key(name: Any) -> str:
+    """Normalized material name: 'Hardwood Frames' -> 'hardwood_frames'"""
+    return re.sub(r'[^a-z0-9]+', '_', str(name).lower()).strip('_')
+
+
+def _quantity(value: Any, what: str) -> float:
+    try:
+        quantity = float(value)
+    except (TypeError, ValueError):
+        raise SchedulingError(f"{what} must be a number, got {value!r}") from None
+    if not math.isfinite(quantity) or quantity < 0:
+        raise SchedulingError(f"{what} must be a non-negative number, got {value!r}")
+    return quantity
+
+
+class ProductionScheduler:
+    """List scheduler with material and capacity constraints"""
+
+    def __init__(self, hours_per_day: float = 8.0, overtime_hours: float = 2.0,
+                 working_weekdays: Tuple[int, ...] = (0, 1, 2, 3, 4, 5), horizon_days: int = 60,
+                 priority_weights: Optional[Dict[str, int]] = None):
+        self.priority_weights = priority_weights or PRIORITY_WEIGHTS
+        self.hours_per_day = hours_per_day
+        self.overtime_hours = overtime_hours
+        self.working_weekdays = working_weekdays
+        self.horizon_days = horizon_days
+
+    def priority_weight(self, order: Dict[str, Any]) -> int:
+        return self.priority_weights.get(str(order.get('priority', 'normal')).lower(), 2)
+
+    @staticmethod
+    def order_hours(order: Dict[str, Any]) -> float:
+        """Bench hours from estimated_hours, a complexity label or a 0-1 complexity score"""
+        if order.get('estimated_hours'):
+            return float(order['estimated_hours'])
+        complexity = order.get('complexity', 'medium')
+        if isinstance(complexity, (int, float)):
+            return 1.0 + 4.0 * float(complexity)
+        hours = COMPLEXITY_HOURS.get(str(complexity).lower(), COMPLEXITY_HOURS['medium'])
+        return hours * (0.8 if parse_flag(order.get('rush_order')) else 1.0)
+
+    @staticmethod
+    def parse_stock(material_availability: Optional[Dict[str, Any]]) -> Dict[str, float]:
+        """{stock key: quantity}; raises SchedulingError for anything but a dict of numbers"""
+        if material_availability is None:
+            return {}
+        if not isinstance(material_availability, dict):
+            raise SchedulingError("material_availability must be an object of {material: quantity}")
+        stock = {}
+        for material, quantity in material_availability.items():
+            key = stock_key(material)
+            stock[key] = stock.get(key, 0.0) + _quantity(quantity, f"material_availability[{material!r}]")
+        return stock
+
+    @staticmethod
+    def order_materials(order: Dict[str, Any], stock: Dict[str, float]) -> Tuple[Dict[str, float], List[str]]:
+        """
+        (materials needed as {stock key: quantity}, materials the shop does not track).
+
+        An explicit 'materials' object of {material: quantity} is used as given;
+        otherwise one frame and one glazing unit are derived from frame_type (or
+        frame_material) and glass_type.
+        """
+        label = f"Order {order.get('order_id', '?')}"
+        explicit = order.get('materials')
+        if explicit is not None:
+            if not isinstance(explicit, dict):
+                raise SchedulingError(f"{label}: materials must be an object of {{material: quantity}}")
+            needed = {}
+            for material, quantity in explicit.items():
+                key = stock_key(material)
+                needed[key] = needed.get(key, 0.0) + _quantity(quantity, f"{label}: materials[{material!r}]")
+            return needed, []
+
+        needed, untracked = {}, []
+        for value, table in ((order.get('frame_type') or order.get('frame_material'), FRAME_STOCK_KEYS),
+                             (order.get('glass_type'), GLASS_STOCK_KEYS)):
+            if not value:
+                continue
+            candidates = table.get(str(value).lower(), (stock_key(value),))
+            key = next((candidate for candidate in candidates if candidate in stock), None)
+            if key is None:
+                untracked.append(str(value))
+            else:
+                needed[key] = needed.get(key, 0.0) + 1
+        return needed, untracked
+
+    @staticmethod
+    def parse_deadline(value: Any) -> Optional[date]:
+        if not value:
+            return None
+        if isinstance(value, datetime):
+            return value.date()
+        if isinstance(value, date):
+            return value
+        try:
+            return datetime.fromisoformat(str(value)).date()
+        except ValueError:
+            return None
+
+    def sort_key(self, order: Dict[str, Any]) -> Tuple:
+        """Modified due date first, then priority, then shortest job"""
+        weight = self.priority_weight(order)
+        deadline = self.parse_deadline(order.get('deadline')) or date.max - timedelta(days=7)
+        due = deadline - timedelta(days=PRIORITY_LEAD_DAYS.get(weight, 0))
+        return (due, -weight, self.order_hours(order), str(order.get('order_id', '')))
+
+    def working_dates(self, start: date, count: int) -> List[date]:
+        dates = []
+        current = start
+        while len(dates) < count:
+            if current.weekday() in self.working_weekdays:
+                dates.append(current)
+            current += timedelta(days=1)
+        return dates
+
+    def schedule(self, orders: List[Dict[str, Any]], workshop_capacity: Optional[Dict[str, Any]] = None,
+                 material_availability: Optional[Dict[str, float]] = None,
+                 start_date: Optional[date] = None) -> Dict[str, Any]:
+        """
+        Build a production plan.
+
+        Orders may carry priority, deadline, complexity or estimated_hours, and
+        either a 'materials' object of {material: quantity} or a frame_type and
+        glass_type; see order_materials. Requirements are checked against
+        material_availability and orders whose materials are short are blocked
+        rather than scheduled. Frame and glazing types the shop does not track
+        are listed in 'untracked_materials'. Malformed input raises
+        SchedulingError.
+        """
+        started = time.perf_counter()
+        capacity = workshop_capacity or {}
+        staff = max(1, int(_quantity(capacity.get('staff_available', 1), 'staff_available')))
+        day_hours = self.hours_per_day + (self.overtime_hours if parse_flag(capacity.get('overtime_available')) else 0.0)
+        # 0 is a real limit (no new frames); only a missing value means unlimited
+        daily_frames = int(_quantity(capacity['daily_frames'], 'daily_frames')) \
+            if capacity.get('daily_frames') is not None else 10 ** 6
+        stock = self.parse_stock(material_availability)
+        requirements = {id(order): self.order_materials(order, stock) for order in orders}
+        untracked = sorted({name for _, names in requirements.values() for name in names})
+        dates = self.working_dates(start_date or date.today(), self.horizon_days)
+
+        # Bench workers as a heap of (time free on the working-hour axis, worker index)
+        workers = [(0.0, index) for index in range(staff)]
+        starts_per_day = [0] * len(dates)
+        hours_per_day = [0.0] * len(dates)
+
+        scheduled, blocked = [], []
+        for order in sorted(orders, key=self.sort_key):
+            needed, _ = requirements[id(order)]
+            shortages = {
+                material: quantity - stock.get(material, 0)
+                for material, quantity in needed.items()
+                if stock.get(material, 0) < quantity
+            }
+            if shortages:
+                blocked.append({'order_id': order.get('order_id'), 'reason': 'materials', 'shortages': shortages})
+                continue
+
+            hours = self.order_hours(order)
+            free_at, worker = heapq.heappop(workers)
+            start = free_at
+            day = int(start // day_hours)
+            while day < len(dates) and starts_per_day[day] >= daily_frames:
+                day += 1
+                start = day * day_hours
+            if day >= len(dates):
+                heapq.heappush(workers, (free_at, worker))
+                blocked.append({'order_id': order.get('order_id'), 'reason': 'capacity', 'shortages': {}})
+                continue
+
+            end = start + hours
+            heapq.heappush(workers, (end, worker))
+            starts_per_day[day] += 1
+            self._add_load(hours_per_day, start, end, day_hours)
+            for material, quantity in needed.items():
+                stock[material] -= quantity
+
+            end_day = min(int((end - 1e-9) // day_hours), len(dates) - 1)
+            deadline = self.parse_deadline(order.get('deadline'))
+            slack = (deadline - dates[end_day]).days if deadline else None
+            scheduled.append({
+                'order_id': order.get('order_id'),
+                'priority': order.get('priority', 'Normal'),
+                'deadline': deadline.isoformat() if deadline else None,
+                'worker': worker + 1,
+                'hours': round(hours, 2),
+                'start_date': dates[day].isoformat(),
+                'end_date': dates[end_day].isoformat(),
+                'start_hour': round(start - day * day_hours, 2),
+                'slack_days': slack,
+                'late': slack is not None and slack < 0,
+                'kanban_column': self._kanban_column(day, dates)
+            })
+
+        total_capacity = staff * day_hours
+        used_days = max((index + 1 for index, load in enumerate(hours_per_day) if load > 0), default=0)
+        return {
+            'scheduled': scheduled,
+            'blocked': blocked,
+            'late_orders': [entry['order_id'] for entry in scheduled if entry['late']],
+            'kanban': self._kanban(scheduled, blocked),
+            'daily_load': [
+                {'date': dates[index].isoformat(), 'hours': round(hours_per_day[index], 2),
+                 'capacity_hours': total_capacity, 'frames_started': starts_per_day[index]}
+                for index in range(used_days)
+            ],
+            'utilization': (sum(hours_per_day[:used_days]) / (total_capacity * used_days)) if used_days else 0.0,
+            'remaining_materials': stock,
+            'untracked_materials': untracked,
+            'generated_at': datetime.now().isoformat(),
+            'compute_ms': (time.perf_counter() - started) * 1000
+        }
+
+    @staticmethod
+    def _add_load(hours_per_day: List[float], start: float, end: float, day_hours: float):
+        """Spread an order's bench hours over the days it spans"""
+        position = start
+        while position < end - 1e-9:
+            day = int(position // day_hours)
+            if day >= len(hours_per_day):
+                break
+            day_end = min(end, (day + 1) * day_hours)
+            hours_per_day[day] += day_end - position
+            position = day_end
+
+    @staticmethod
+    def _kanban_column(day: int, dates: List[date]) -> str:
+        if day == 0:
+            return 'Today'
+        if dates[day] - dates[0] < timedelta(days=7):
+            return 'This Week'
+        return 'Later'
+
+    @staticmethod
+    def _kanban(scheduled: List[Dict], blocked: List[Dict]) -> Dict[str, List]:
+        board = {'Today': [], 'This Week': [], 'Later': [], 'Blocked': [entry['order_id'] for entry in blocked]}
+        for entry in scheduled:
+            board[entry['kanban_column']].append(entry['order_id'])
+        return board
+
+
+def synthetic_orders(count: int, seed: int = 42) -> Tuple[List[Dict], Dict, Dict]:
+    """Random but reproducible orders, capacity and materials for benchmarking"""
+    rng = random.Random(seed)
+    materials = ['Hardwood Frames', 'Aluminum Frames', 'Museum Glass', 'Standard Glass', 'Mat Board']
+    today = date.today()
+    orders = [{
+        'order_id': f"ORD{index:05d}",
+        'priority': rng.choice(['High', 'Normal', 'Normal', 'Low']),
+        'deadline': (today + timedelta(days=rng.randint(1, 45))).isoformat(),
+        'complexity': rng.choice(['Low', 'Medium', 'High']),
+        'materials': {rng.choice(materials[:2]): 1, rng.choice(materials[2:4]): 1, 'Mat Board': rng.randint(0, 2)}
+    } for index in range(count)]
+    capacity = {'daily_frames': max(5, count // 20), 'staff_available': max(2, count // 40), 'overtime_available': True}
+    stock = {material: count for material in materials}
+    return orders, capacity, stock
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the production scheduler on synthetic orders")
+    parser.add_argument('--orders', type=int, nargs='+', default=[50, 200, 500, 1000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    scheduler = ProductionScheduler()
+    for count in args.orders:
+        orders, capacity, stock = synthetic_orders(count)
+        timings = []
+        for _ in range(args.repeat):
+            plan = scheduler.schedule(orders, capacity, stock)
+            timings.append(plan['compute_ms'])
+        timings.sort()
+        print(f"{count:5d} orders: median {timings[len(timings) // 2]:7.2f}ms  max {timings[-1]:7.2f}ms  "
+              f"scheduled {len(plan['scheduled'])}  late {len(plan['late_orders'])}  "
+              f"blocked {len(plan['blocked'])}  utilization {plan['utilization']:.0%}")
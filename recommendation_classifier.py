@@ -0,0 +1,129 @@
+import math
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Very common words that carry no signal about the task
+STOP_WORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "for", "from", "have", "help",
+    "how", "i", "in", "is", "it", "me", "my", "need", "of", "on", "or", "please", "some", "that",
+    "the", "this", "to", "want", "was", "we", "what", "with", "would", "you", "your"
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word unigrams and bigrams with stop words removed"""
+    words = [w for w in TOKEN_PATTERN.findall(text.lower()) if w not in STOP_WORDS]
+    return words + [f"{a}_{b}" for a, b in zip(words, words[1:])]
+
+
+class RecommendationClassifier:
+    """
+    Local multinomial Naive Bayes model that predicts a model name from a task description.
+
+    Trained from ModelRecommendation rows (user-accepted recommendations count
+    extra, rejected ones are skipped) plus seed examples built from the model
+    descriptions, so it runs on CPU with no API call.
+    """
+
+    def __init__(self, smoothing: float = 0.5, accepted_weight: float = 3.0, seed_weight: float = 0.5):
+        self.smoothing = smoothing
+        self.accepted_weight = accepted_weight
+        self.seed_weight = seed_weight
+        self.classes: List[str] = []
+        self.log_priors: Dict[str, float] = {}
+        self.token_log_probs: Dict[str, Dict[str, float]] = {}
+        self.unknown_log_probs: Dict[str, float] = {}
+        self.training_examples = 0
+        self.trained_at: Optional[float] = None
+
+    @staticmethod
+    def seed_examples(model_handler, weight: float = 0.5) -> List[Tuple[str, str, float]]:
+        """Build (text, model_name, weight) examples from the model handler's model information"""
+        examples = []
+        for model_name, model_id in model_handler.models.items():
+            info = model_handler.get_model_info(model_id)
+            for text in [info["description"]] + info["strengths"] + info["use_cases"]:
+                examples.append((text, model_name, weight))
+        return examples
+
+    @staticmethod
+    def database_examples(db, accepted_weight: float = 3.0) -> List[Tuple[str, str, float]]:
+        """Build (text, model_name, weight) examples from stored recommendations"""
+        examples = []
+        for row in db.get_recommendation_training_data():
+            if row["user_accepted"] is False:
+                continue
+            weight = accepted_weight if row["user_accepted"] else 1.0
+            examples.append((row["task_description"], row["recommended_model"], weight))
+        return examples
+
+    def fit(self, model_handler, db=None):
+        """Train from seed examples plus stored recommendations when a database is available"""
+        examples = self.seed_examples(model_handler, self.seed_weight)
+        if db is not None:
+            examples += self.database_examples(db, self.accepted_weight)
+        self.train(examples)
+
+    def train(self, examples: List[Tuple[str, str, float]]):
+        """Fit class priors and token likelihoods from weighted examples"""
+        class_weights: Dict[str, float] = {}
+        token_counts: Dict[str, Dict[str, float]] = {}
+        class_token_totals: Dict[str, float] = {}
+        vocabulary = set()
+
+        for text, label, weight in examples:
+            class_weights[label] = class_weights.get(label, 0.0) + weight
+            counts = token_counts.setdefault(label, {})
+            for token in tokenize(text):
+                counts[token] = counts.get(token, 0.0) + weight
+                class_token_totals[label] = class_token_totals.get(label, 0.0) + weight
+                vocabulary.add(token)
+
+        total_weight = sum(class_weights.values()) or 1.0
+        vocab_size = len(vocabulary) or 1
+
+        self.classes = sorted(class_weights)
+        self.log_priors = {label: math.log(w / total_weight) for label, w in class_weights.items()}
+        self.unknown_log_probs = {}
+        self.token_log_probs = {}
+
+        for label in self.classes:
+            denominator = class_token_totals.get(label, 0.0) + self.smoothing * vocab_size
+            self.unknown_log_probs[label] = math.log(self.smoothing / denominator)
+            for token, count in token_counts.get(label, {}).items():
+                self.token_log_probs.setdefault(token, {})[label] = math.log((count + self.smoothing) / denominator)
+
+        self.training_examples = len(examples)
+        self.trained_at = time.time()
+
+    def predict(self, text: str) -> Optional[Dict]:
+        """Predict the best model name with a confidence in [0, 1] and ranked alternatives"""
+        if not self.classes:
+            return None
+
+        scores = dict(self.log_priors)
+        seen = False
+        for token in tokenize(text):
+            token_probs = self.token_log_probs.get(token)
+            if token_probs is None:
+                continue  # Token never seen in training: no evidence either way
+            seen = True
+            for label in self.classes:
+                scores[label] += token_probs.get(label, self.unknown_log_probs[label])
+
+        if not seen:
+            return {"model_name": max(scores, key=scores.get), "confidence": 0.0, "alternatives": []}
+
+        best_score = max(scores.values())
+        exp_scores = {label: math.exp(score - best_score) for label, score in scores.items()}
+        total = sum(exp_scores.values())
+        ranked = sorted(exp_scores, key=exp_scores.get, reverse=True)
+
+        return {
+            "model_name": ranked[0],
+            "confidence": exp_scores[ranked[0]] / total,
+            "alternatives": ranked[1:3]
+        }
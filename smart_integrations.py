@@ -1,9 +1,18 @@
 
 import requests
 import json
+import time
+import heapq
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+from integration_client import IntegrationClient
+from pricing_engine import parse_flag
 
 @dataclass
 class IntegrationEndpoint:
@@ -43,62 +52,71 @@ class SmartIntegrationManager:
             )
         }
     
+        self.client = IntegrationClient()
+        self.register_integrations()
+    
+    def register_integrations(self):
+        """(Re)create pooled sessions after endpoints or credentials change"""
+        for key, endpoint in self.integrations.items():
+            self.client.register_endpoint(key, endpoint.url, headers=self.get_auth_headers(endpoint))
+    
+    @staticmethod
+    def _idempotency_key(operation: str, data: Dict) -> Optional[str]:
+        """Stable key per business object so caller retries are not applied twice"""
+        object_id = data.get('order_id') or data.get('appointment_id')
+        return f"{operation}-{object_id}" if object_id else None
+    
     def sync_order_data(self, order_data: Dict) -> Dict:
         """Sync order data with POS system"""
-        pos_endpoint = self.integrations['pos_system']
+        result = self.client.request(
+            'pos_system', 'POST', '/orders', json=order_data,
+            idempotency_key=self._idempotency_key('pos-order', order_data)
+        )
         
-        try:
-            response = requests.post(
-                f"{pos_endpoint.url}/orders",
-                json=order_data,
-                headers=self.get_auth_headers(pos_endpoint),
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                return {'success': True, 'data': response.json()}
-            else:
-                return {'success': False, 'error': response.text}
-                
-        except Exception as e:
-            return {'success': False, 'error': str(e)}
+        if result['success']:
+            return {'success': True, 'data': result['data']}
+        return {'success': False, 'error': str(result['error'])}
     
     def check_inventory_availability(self, materials: List[str]) -> Dict:
         """Check real-time inventory availability"""
-        inventory_endpoint = self.integrations['inventory_system']
+        result = self.client.request(
+            'inventory_system', 'POST', '/check-availability', json={'materials': materials}
+        )
         
-        try:
-            response = requests.post(
-                f"{inventory_endpoint.url}/check-availability",
-                json={'materials': materials},
-                headers=self.get_auth_headers(inventory_endpoint),
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                return response.json()
-            else:
-                return {'available': False, 'error': 'Inventory check failed'}
-                
-        except Exception as e:
-            return {'available': False, 'error': str(e)}
+        if result['success']:
+            return result['data']
+        return {'available': False, 'error': str(result.get('error', 'Inventory check failed'))}
     
     def schedule_appointment(self, appointment_data: Dict) -> Dict:
         """Automatically schedule appointments"""
-        calendar_endpoint = self.integrations['calendar_system']
+        result = self.client.request(
+            'calendar_system', 'POST', '/appointments', json=appointment_data,
+            idempotency_key=self._idempotency_key('appointment', appointment_data)
+        )
         
-        try:
-            response = requests.post(
-                f"{calendar_endpoint.url}/appointments",
-                json=appointment_data,
-                headers=self.get_auth_headers(calendar_endpoint),
-                timeout=10
-            )
-            
-            return {'success': response.status_code == 200, 'data': response.json() if response.status_code == 200 else response.text}
-            
-        except Exception as e:
-            return {'success': False, 'error': str(e)}
+        if result['success']:
+            return {'success': True, 'data': result['data']}
+        return {'success': False, 'error': str(result['error'])}
+    
+    def sync_order_everywhere(self, order_data: Dict, materials: Optional[List[str]] = None,
+                              appointment_data: Optional[Dict] = None, timeout: float = 15.0) -> Dict:
+        """
+        Sync an order to POS, inventory and calendar concurrently.
+        
+        Returns per-system results plus the list of systems that failed, so the
+        caller can retry only those (idempotency keys make that safe).
+        """
+        calls = {'pos_system': lambda: self.sync_order_data(order_data)}
+        if materials:
+            calls['inventory_system'] = lambda: self.check_inventory_availability(materials)
+        if appointment_data:
+            calls['calendar_system'] = lambda: self.schedule_appointment(appointment_data)
+        
+        return self.client.fan_out(calls, timeout=timeout)
+    
+    def get_integration_latency(self) -> Dict:
+        """Per-endpoint latency percentiles and error rates"""
+        return self.client.get_latency_histograms()
     
     def get_auth_headers(self, endpoint: IntegrationEndpoint) -> Dict:
         """Generate authentication headers"""
@@ -110,31 +128,225 @@ class SmartIntegrationManager:
             return {'Authorization': f"Bearer {endpoint.credentials.get('access_token', '')}"}
         return {}
 
+class SyncScheduler:
+    """
+    Shared scheduler that runs periodic jobs on a small worker pool.
+    
+    Each run is jittered so endpoints registered together do not fire in
+    lockstep, and failing jobs back off exponentially up to max_backoff.
+    """
+    
+    def __init__(self, max_workers: int = 4, jitter: float = 0.1, max_backoff: int = 3600):
+        self.jitter = jitter
+        self.max_backoff = max_backoff
+        self.jobs = {}
+        self._heap = []
+        self._lock = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sync")
+        self._thread = None
+    
+    def schedule(self, name: str, func: Callable[[], bool], interval: float, run_now: bool = True):
+        """Run func every interval seconds; func returns False (or raises) on failure"""
+        with self._lock:
+            self.jobs[name] = {'func': func, 'interval': interval, 'failures': 0, 'running': False, 'next_run': None}
+            self._push(name, 0 if run_now else self._delay(interval))
+            self._start()
+    
+    def unschedule(self, name: str):
+        with self._lock:
+            self.jobs.pop(name, None)
+    
+    def run_now(self, name: str):
+        """Move a job to the front of the queue"""
+        with self._lock:
+            if name in self.jobs:
+                self._push(name, 0)
+    
+    def _delay(self, interval: float) -> float:
+        return max(0.0, interval * (1 + random.uniform(-self.jitter, self.jitter)))
+    
+    def _push(self, name: str, delay: float):
+        run_at = time.time() + delay
+        self.jobs[name]['next_run'] = run_at
+        heapq.heappush(self._heap, (run_at, name))
+        self._lock.notify()
+    
+    def _start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._loop, name="sync-scheduler", daemon=True)
+            self._thread.start()
+    
+    def _loop(self):
+        while True:
+            with self._lock:
+                while not self._heap or self._heap[0][0] > time.time():
+                    self._lock.wait(self._heap[0][0] - time.time() if self._heap else None)
+                run_at, name = heapq.heappop(self._heap)
+                job = self.jobs.get(name)
+                # Skip removed jobs, stale heap entries and jobs still running
+                if job is None or job['next_run'] != run_at or job['running']:
+                    continue
+                job['running'] = True
+            self._executor.submit(self._run, name, job)
+    
+    def _run(self, name: str, job: Dict):
+        try:
+            succeeded = job['func']() is not False
+        except Exception:
+            succeeded = False
+        
+        with self._lock:
+            job['running'] = False
+            if self.jobs.get(name) is not job:
+                return
+            job['failures'] = 0 if succeeded else job['failures'] + 1
+            delay = job['interval'] if succeeded else min(job['interval'] * (2 ** job['failures']), self.max_backoff)
+            self._push(name, self._delay(delay))
+
+sync_scheduler = SyncScheduler()
+
 class RealtimeDataSync:
     """
     Real-time data synchronization with business systems
+    
+    Registered endpoints are polled on their interval by the shared scheduler.
+    Responses are merged into a local materialized cache keyed by record ID, so
+    dashboards read from memory instead of calling out. ETags (If-None-Match)
+    and since-cursors keep each poll incremental.
     """
     
-    def __init__(self):
+    def __init__(self, client: Optional[IntegrationClient] = None, scheduler: Optional[SyncScheduler] = None):
+        self.client = client or IntegrationClient()
+        self.scheduler = scheduler or sync_scheduler
         self.sync_endpoints = {}
         self.last_sync_times = {}
+        self.cache = {}
+        self._lock = threading.Lock()
     
-    def register_sync_endpoint(self, name: str, endpoint: str, sync_interval: int = 300):
-        """Register a new sync endpoint"""
+    def register_sync_endpoint(self, name: str, endpoint: str, sync_interval: int = 300,
+                               headers: Optional[Dict] = None, items_field: str = 'orders',
+                               key_field: str = 'order_id', cursor_param: str = 'since'):
+        """
+        Register a new sync endpoint and start polling it.
+        
+        The endpoint may return a list of records or an object with the records
+        under items_field plus an optional 'cursor'. Records with 'deleted': true
+        are removed from the cache.
+        """
+        self.client.register_endpoint(name, endpoint, headers=headers)
         self.sync_endpoints[name] = {
             'endpoint': endpoint,
             'interval': sync_interval,
-            'last_sync': None
+            'last_sync': None,
+            'items_field': items_field,
+            'key_field': key_field,
+            'cursor_param': cursor_param,
+            'etag': None,
+            'cursor': None,
+            'syncs': 0,
+            'not_modified': 0,
+            'failures': 0,
+            'consecutive_failures': 0,
+            'last_error': None,
+            'last_duration': None
         }
+        with self._lock:
+            self.cache[name] = {}
+        self.scheduler.schedule(self._job_name(name), lambda: self.sync_endpoint(name), sync_interval)
+    
+    def _job_name(self, name: str) -> str:
+        # The scheduler is shared, so scope job names to this instance
+        return f"{type(self).__name__}-{id(self):x}:{name}"
+    
+    def sync_endpoint(self, name: str) -> bool:
+        """Fetch changes since the last sync and merge them into the cache"""
+        state = self.sync_endpoints[name]
+        headers = {'If-None-Match': state['etag']} if state['etag'] else None
+        params = {state['cursor_param']: state['cursor']} if state['cursor'] else None
+        
+        result = self.client.request(name, 'GET', '', params=params, headers=headers)
+        state['last_duration'] = result['latency']
+        
+        if not result['success']:
+            state['failures'] += 1
+            state['consecutive_failures'] += 1
+            state['last_error'] = str(result.get('error'))
+            return False
+        
+        if result.get('not_modified'):
+            state['not_modified'] += 1
+        else:
+            body = result['data']
+            records = body.get(state['items_field'], []) if isinstance(body, dict) else body
+            if not isinstance(records, list):
+                # A JSON scalar, string or malformed items field counts as a failed sync
+                state['failures'] += 1
+                state['consecutive_failures'] += 1
+                state['last_error'] = f"Unexpected response body: {type(body).__name__}"
+                return False
+            self._merge(name, records, state['key_field'])
+            if isinstance(body, dict) and body.get('cursor'):
+                state['cursor'] = body['cursor']
+            state['etag'] = result.get('etag') or state['etag']
+        
+        state['syncs'] += 1
+        state['consecutive_failures'] = 0
+        state['last_sync'] = datetime.now()
+        self.last_sync_times[name] = time.time()
+        return True
+    
+    def _merge(self, name: str, records: List[Dict], key_field: str):
+        with self._lock:
+            # Copy-on-write so readers never see a half-applied sync
+            cached = dict(self.cache.get(name, {}))
+            for record in records:
+                if not isinstance(record, dict):
+                    continue
+                key = record.get(key_field)
+                if key is None:
+                    continue
+                if record.get('deleted'):
+                    cached.pop(key, None)
+                else:
+                    cached[key] = record
+            self.cache[name] = cached
+    
+    def get_cached(self, name: str) -> List[Dict]:
+        """Records currently in the local cache for an endpoint"""
+        return list(self.cache.get(name, {}).values())
+    
+    def get_staleness(self, name: str) -> Optional[float]:
+        """Seconds since the last successful sync (None if never synced)"""
+        last_sync = self.last_sync_times.get(name)
+        return time.time() - last_sync if last_sync else None
+    
+    def get_sync_metrics(self) -> Dict:
+        """Per-endpoint sync counters, staleness and next scheduled run"""
+        metrics = {}
+        for name, state in self.sync_endpoints.items():
+            job = self.scheduler.jobs.get(self._job_name(name), {})
+            metrics[name] = {
+                'records': len(self.cache.get(name, {})),
+                'staleness_seconds': self.get_staleness(name),
+                'stale': (self.get_staleness(name) or float('inf')) > 2 * state['interval'],
+                'syncs': state['syncs'],
+                'not_modified': state['not_modified'],
+                'failures': state['failures'],
+                'consecutive_failures': state['consecutive_failures'],
+                'last_error': state['last_error'],
+                'last_duration': state['last_duration'],
+                'next_run_in': max(0.0, job['next_run'] - time.time()) if job.get('next_run') else None
+            }
+        return metrics
     
     def sync_production_status(self) -> Dict:
-        """Sync production status from kanban board"""
+        """Production status from the local kanban cache"""
         try:
-            # This would connect to your actual kanban system
             production_data = {
                 'orders_in_progress': self.get_kanban_orders(),
                 'completion_estimates': self.calculate_completion_times(),
-                'resource_utilization': self.get_resource_usage()
+                'resource_utilization': self.get_resource_usage(),
+                'staleness_seconds': self.get_staleness('kanban')
             }
             
             return {'success': True, 'data': production_data}
@@ -143,7 +355,10 @@ class RealtimeDataSync:
     
     def get_kanban_orders(self) -> List[Dict]:
         """Get orders from kanban board"""
-        # Mock data - replace with actual API call
+        if 'kanban' in self.sync_endpoints:
+            return self.get_cached('kanban')
+        
+        # Mock data until a kanban endpoint is registered
         return [
             {'order_id': 'ORD001', 'status': 'cutting', 'progress': 60},
             {'order_id': 'ORD002', 'status': 'assembly', 'progress': 80},
@@ -170,50 +385,324 @@ class RealtimeDataSync:
 class PredictiveAnalytics:
     """
     Predictive analytics for business optimization
+    
+    All computations are vectorized with NumPy/pandas over the whole order
+    history at once, and results are cached per data snapshot so dashboards
+    can call these on every render.
     """
     
-    def __init__(self):
-        self.model_handler = None  # Would be initialized with ML models
+    DATE_COLUMNS = ['date', 'order_date', 'created_at', 'timestamp']
+    REVENUE_COLUMNS = ['revenue', 'total', 'amount', 'price']
+    CATEGORY_COLUMNS = ['category', 'frame_material', 'product']
+    ID_COLUMNS = ['order_id', 'id']
+    COMPLEXITY_SCORES = {'low': 0.2, 'medium': 0.5, 'high': 0.8}
+    PRIORITY_SCORES = {'urgent': 1.0, 'high': 0.75, 'normal': 0.5, 'medium': 0.5, 'low': 0.25}
+    
+    # Materials consumed per order, used to turn demand into inventory
+    MATERIALS_PER_ORDER = {'frames': 1.0, 'mats': 0.8, 'glass': 0.9}
+    
+    def __init__(self, cache_size: int = 32, lead_time_days: int = 7, service_level_z: float = 1.65):
+        self.model_handler = None  # Forecasts are computed locally; no model calls
+        self.cache_size = cache_size
+        self.lead_time_days = lead_time_days
+        self.service_level_z = service_level_z
+        self._cache = {}
     
-    def predict_demand(self, historical_data: List[Dict]) -> Dict:
-        """Predict future demand patterns"""
-        # Mock predictive analysis - replace with actual ML model
+    @classmethod
+    def _pick(cls, frame: pd.DataFrame, candidates: List[str]) -> Optional[str]:
+        return next((column for column in candidates if column in frame.columns), None)
+    
+    def orders_frame(self, data) -> pd.DataFrame:
+        """Normalize a list of order dicts or a DataFrame to date/revenue/category columns"""
+        frame = data if isinstance(data, pd.DataFrame) else pd.DataFrame(list(data or []))
+        if frame.empty:
+            return pd.DataFrame({'date': pd.Series(dtype='datetime64[ns]'), 'revenue': pd.Series(dtype=float),
+                                 'category': pd.Series(dtype=object)})
+        
+        date_column = self._pick(frame, self.DATE_COLUMNS)
+        revenue_column = self._pick(frame, self.REVENUE_COLUMNS)
+        category_column = self._pick(frame, self.CATEGORY_COLUMNS)
+        normalized = pd.DataFrame({
+            'date': pd.to_datetime(frame[date_column], errors='coerce') if date_column else pd.NaT,
+            'revenue': pd.to_numeric(frame[revenue_column], errors='coerce').fillna(0.0) if revenue_column else 0.0,
+            'category': frame[category_column].astype(str) if category_column else 'General'
+        })
+        for column in ('customer_id', 'completed_at', 'quantity'):
+            if column in frame.columns:
+                normalized[column] = frame[column].values
+        return normalized.dropna(subset=['date'])
+    
+    def _cached(self, key: Tuple, compute: Callable[[], Dict]) -> Dict:
+        if key not in self._cache:
+            if len(self._cache) >= self.cache_size:
+                self._cache.pop(next(iter(self._cache)))
+            self._cache[key] = compute()
+        return self._cache[key]
+    
+    def _snapshot(self, data, version=None) -> Tuple:
+        """
+        Cache key for a data snapshot: row count plus the newest timestamp and id.
+        
+        Hashing every row cost nearly as much as recomputing, so this only looks
+        at cheap markers; callers that edit rows in place pass their own version.
+        """
+        if version is not None:
+            return ('version', version)
+        if isinstance(data, pd.DataFrame):
+            columns = [column for column in (self._pick(data, self.DATE_COLUMNS), self._pick(data, self.ID_COLUMNS))
+                       if column]
+            if not columns:
+                # No timestamp or id to go by: fall back to the numeric column totals
+                return (len(data),) + tuple(data.select_dtypes('number').sum().round(6).tolist())
+            return (len(data),) + tuple(self._newest(data[column].dropna()) for column in columns)
+        
+        records = list(data or [])
+        if not records:
+            return (0,)
+        first = records[0]
+        columns = [next((column for column in candidates if column in first), None)
+                   for candidates in (self.DATE_COLUMNS, self.ID_COLUMNS)]
+        columns = [column for column in columns if column]
+        if not columns:
+            return self._snapshot(pd.DataFrame(records))
+        return (len(records),) + tuple(
+            self._newest([record[column] for record in records if record.get(column) is not None]) for column in columns
+        )
+    
+    @staticmethod
+    def _newest(values) -> Any:
+        # Mixed types (e.g. strings and timestamps) only need a stable marker, not a true maximum
+        if isinstance(values, pd.Series):
+            try:
+                return values.max()
+            except TypeError:
+                return values.astype(str).max()
+        try:
+            return max(values, default=None)
+        except TypeError:
+            return max(map(str, values))
+    
+    def predict_demand(self, historical_data, horizon_days: int = 30, version=None) -> Dict:
+        """
+        Forecast daily order counts for the next horizon_days.
+        
+        Model: linear trend over weekly totals, times a day-of-week index, times a
+        month-of-year index when there is at least a year of history. Pass version
+        to key the cache on the caller's own data version.
+        """
+        key = ('demand', self._snapshot(historical_data, version), horizon_days)
+        return self._cached(key, lambda: self._forecast_demand(self.orders_frame(historical_data), horizon_days))
+    
+    def _forecast_demand(self, frame: pd.DataFrame, horizon_days: int) -> Dict:
+        if frame.empty:
+            return {'next_month_demand': 0, 'peak_periods': [], 'recommended_inventory': {}, 'daily_forecast': []}
+        
+        daily = frame.set_index('date').resample('D').size().astype(float)
+        days = daily.index
+        t = np.arange(len(daily), dtype=float)
+        
+        # Day-of-week index: mean per weekday relative to overall mean
+        overall = daily.mean() or 1.0
+        dow_index = (daily.groupby(days.dayofweek).mean() / overall).reindex(range(7), fill_value=1.0).to_numpy()
+        
+        # Month-of-year index only when every month has been seen at least once
+        month_index = np.ones(13)
+        if (days[-1] - days[0]).days >= 365:
+            weekday_factor = dow_index[days.dayofweek]
+            deseasoned = (daily / weekday_factor)[weekday_factor > 0]
+            by_month = deseasoned.groupby(deseasoned.index.month).mean() / deseasoned.mean()
+            month_index[by_month.index.to_numpy()] = by_month.to_numpy()
+        
+        # Trend on the seasonally adjusted series. Weekdays (or months) without any
+        # orders have an index of 0: they are left out of the fit and forecast as 0.
+        season = dow_index[days.dayofweek] * month_index[days.month]
+        open_days = season > 0
+        adjusted = daily.to_numpy()[open_days] / season[open_days]
+        t_open = t[open_days]
+        slope, intercept = np.polyfit(t_open, adjusted, 1) if len(t_open) > 1 else (0.0, float(adjusted[0]))
+        
+        future_days = pd.date_range(days[-1] + pd.Timedelta(days=1), periods=horizon_days, freq='D')
+        future_t = np.arange(len(daily), len(daily) + horizon_days, dtype=float)
+        forecast = np.clip(intercept + slope * future_t, 0, None) \
+            * dow_index[future_days.dayofweek] * month_index[future_days.month]
+        
+        # Safety stock from the residual spread over the replenishment lead time
+        fitted = (intercept + slope * t) * dow_index[days.dayofweek] * month_index[days.month]
+        residual_std = float(np.std(daily.to_numpy() - fitted))
+        safety_orders = self.service_level_z * residual_std * np.sqrt(self.lead_time_days)
+        demand_total = float(forecast.sum())
+        
+        peak_count = max(1, horizon_days // 10)
+        peak_positions = np.sort(np.argsort(forecast)[-peak_count:])
+        
         return {
-            'next_month_demand': 145,
-            'peak_periods': ['2025-02-14', '2025-03-15', '2025-05-10'],
+            'next_month_demand': int(round(demand_total)),
+            'peak_periods': [future_days[i].strftime('%Y-%m-%d') for i in peak_positions],
             'recommended_inventory': {
-                'frames': 200,
-                'mats': 150,
-                'glass': 100
-            }
+                material: int(np.ceil((demand_total + safety_orders) * rate))
+                for material, rate in self.MATERIALS_PER_ORDER.items()
+            },
+            'trend_per_week': float(slope * 7),
+            'weekday_index': dict(zip(['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'], np.round(dow_index, 3).tolist())),
+            'daily_forecast': [
+                {'date': day.strftime('%Y-%m-%d'), 'orders': round(float(value), 2)}
+                for day, value in zip(future_days, forecast)
+            ]
         }
     
-    def predict_completion_delays(self, current_orders: List[Dict]) -> Dict:
-        """Predict potential completion delays"""
-        # AI analysis of delay patterns
-        risk_orders = []
-        for order in current_orders:
-            if order.get('complexity', 1) > 0.7:
-                risk_orders.append({
-                    'order_id': order['order_id'],
-                    'delay_probability': 0.65,
-                    'estimated_delay_days': 2
-                })
+    def predict_completion_delays(self, current_orders: List[Dict], as_of: Optional[datetime] = None) -> Dict:
+        """
+        Score delay risk for every open order at once.
+        
+        Risk is a logistic function of complexity, priority, rush flag and how
+        much of the remaining time to the deadline the estimated work consumes.
+        """
+        if not current_orders:
+            return {'high_risk_orders': [], 'overall_risk_level': 'low', 'recommendations': []}
+        
+        orders = pd.DataFrame(current_orders)
+        # Compare in UTC so timezone-aware and naive deadlines can be mixed; naive
+        # timestamps are taken as UTC
+        now = pd.Timestamp(as_of) if as_of else pd.Timestamp.now(tz='UTC')
+        now = now.tz_localize('UTC') if now.tzinfo is None else now.tz_convert('UTC')
+        count = len(orders)
+        
+        complexity = orders.get('complexity', pd.Series(['medium'] * count))
+        complexity_score = pd.to_numeric(complexity, errors='coerce').fillna(
+            complexity.astype(str).str.lower().map(self.COMPLEXITY_SCORES)).fillna(0.5).to_numpy()
+        priority_score = orders.get('priority', pd.Series(['normal'] * count)).astype(str).str.lower() \
+            .map(self.PRIORITY_SCORES).fillna(0.5).to_numpy()
+        # Strict flag parsing: 'false' or 'no' must not count as a rush order
+        rush = orders.get('rush_order', pd.Series([False] * count)).map(
+            lambda value: parse_flag(value) is True).to_numpy()
+        
+        estimated_days = pd.to_numeric(orders.get('estimated_hours', pd.Series([np.nan] * count)), errors='coerce') \
+            .fillna(pd.Series(1.0 + 4.0 * complexity_score)).to_numpy() / 8.0
+        deadlines = pd.to_datetime(orders.get('deadline', pd.Series([pd.NaT] * count)), errors='coerce', utc=True)
+        days_left = ((deadlines - now).dt.total_seconds() / 86400.0).fillna(30.0).to_numpy()
+        load_ratio = estimated_days / np.clip(days_left, 0.25, None)
+        
+        logit = -3.0 + 2.5 * complexity_score + 3.0 * np.clip(load_ratio, 0, 2) + 0.8 * rush - 0.5 * priority_score
+        probability = 1.0 / (1.0 + np.exp(-logit))
+        expected_delay = np.maximum(0.0, estimated_days - days_left) + probability * complexity_score * 3.0
+        
+        order_ids = orders.get('order_id', pd.Series(range(count))).astype(str).to_numpy()
+        risky = np.flatnonzero(probability >= 0.5)
+        risky = risky[np.argsort(-probability[risky])]
+        
+        mean_risk = float(probability.mean())
+        recommendations = []
+        if (days_left[risky] < 0).any():
+            recommendations.append('Contact customers with orders already past deadline')
+        if (complexity_score[risky] >= 0.7).any():
+            recommendations.append('Add extra quality check time for complex pieces')
+        if len(risky) > count * 0.25:
+            recommendations.append('Consider overtime or rush processing this week')
         
         return {
-            'high_risk_orders': risk_orders,
-            'overall_risk_level': 'medium',
-            'recommendations': ['Add extra quality check time', 'Consider rush processing']
+            'high_risk_orders': [
+                {'order_id': order_ids[i], 'delay_probability': round(float(probability[i]), 3),
+                 'estimated_delay_days': int(np.ceil(expected_delay[i]))}
+                for i in risky
+            ],
+            'overall_risk_level': 'high' if mean_risk >= 0.6 else 'medium' if mean_risk >= 0.35 else 'low',
+            'mean_delay_probability': round(mean_risk, 3),
+            'recommendations': recommendations
         }
     
     def optimize_pricing(self, market_data: Dict, cost_data: Dict) -> Dict:
-        """AI-powered pricing optimization"""
+        """
+        Price recommendations from estimated price elasticity.
+        
+        market_data['sales'] holds rows of {category, price, quantity}; elasticity
+        per category is the slope of log(quantity) on log(price). cost_data maps
+        category to unit cost. With constant elasticity e < -1 the profit
+        maximizing price is cost * e / (e + 1); moves are capped at max_change.
+        An optional market_data['version'] keys the cache instead of the sales rows.
+        """
+        sales = pd.DataFrame(market_data.get('sales', []))
+        if sales.empty or not {'category', 'price', 'quantity'} <= set(sales.columns):
+            return {'recommended_adjustments': {}, 'profit_impact': '+0%', 'market_positioning': 'insufficient_data'}
+        
+        key = ('pricing', self._snapshot(sales, market_data.get('version')), tuple(sorted(cost_data.items())),
+               market_data.get('max_change', 0.15))
+        return self._cached(key, lambda: self._price_elasticity(sales, cost_data, market_data.get('max_change', 0.15)))
+    
+    def _price_elasticity(self, sales: pd.DataFrame, cost_data: Dict, max_change: float) -> Dict:
+        sales = sales[(sales['price'] > 0) & (sales['quantity'] > 0)].copy()
+        sales['log_p'] = np.log(sales['price'].astype(float))
+        sales['log_q'] = np.log(sales['quantity'].astype(float))
+        
+        # Grouped least-squares slope: cov(log p, log q) / var(log p)
+        grouped = sales.groupby('category')
+        mean_p = grouped['log_p'].transform('mean')
+        mean_q = grouped['log_q'].transform('mean')
+        sales['cov'] = (sales['log_p'] - mean_p) * (sales['log_q'] - mean_q)
+        sales['var'] = (sales['log_p'] - mean_p) ** 2
+        stats = sales.groupby('category').agg(cov=('cov', 'sum'), var=('var', 'sum'),
+                                              price=('price', 'mean'), quantity=('quantity', 'mean'))
+        elasticity = (stats['cov'] / stats['var'].replace(0, np.nan)).to_numpy()
+        
+        price = stats['price'].to_numpy()
+        quantity = stats['quantity'].to_numpy()
+        cost = stats.index.map(lambda category: cost_data.get(category, np.nan)).to_numpy(dtype=float)
+        cost = np.where(np.isnan(cost), price * 0.5, cost)
+        
+        elastic = elasticity < -1.0
+        optimal = np.where(elastic, cost * elasticity / np.where(elastic, elasticity + 1.0, 1.0), price * (1 + max_change))
+        optimal = np.where(np.isnan(elasticity), price, optimal)
+        new_price = np.clip(optimal, price * (1 - max_change), price * (1 + max_change))
+        change = new_price / price - 1.0
+        
+        e = np.where(np.isnan(elasticity), 0.0, elasticity)
+        new_quantity = quantity * (1 + change) ** e
+        profit_now = ((price - cost) * quantity).sum()
+        profit_new = ((new_price - cost) * new_quantity).sum()
+        impact = (profit_new / profit_now - 1.0) if profit_now > 0 else 0.0
+        
+        mean_elasticity = float(np.nanmean(elasticity)) if np.isfinite(elasticity).any() else 0.0
         return {
             'recommended_adjustments': {
-                'premium_frames': '+5%',
-                'standard_frames': 'no_change',
-                'budget_frames': '-2%'
+                category: 'no_change' if abs(delta) < 0.005 else f"{delta:+.0%}"
+                for category, delta in zip(stats.index, change)
+            },
+            'elasticity': {category: None if np.isnan(value) else round(float(value), 3)
+                           for category, value in zip(stats.index, elasticity)},
+            'profit_impact': f"{impact:+.0%}",
+            'market_positioning': 'competitive_premium' if mean_elasticity > -1.5 else 'price_sensitive'
+        }
+    
+    def business_insights(self, historical_data, version=None) -> Dict:
+        """Revenue trend, customer and operational metrics from order history"""
+        return self._cached(('insights', self._snapshot(historical_data, version)),
+                            lambda: self._business_insights(self.orders_frame(historical_data)))
+    
+    def _business_insights(self, frame: pd.DataFrame) -> Dict:
+        if frame.empty:
+            return {}
+        end = frame['date'].max()
+        recent = frame['date'] > end - pd.Timedelta(days=30)
+        prior = (frame['date'] <= end - pd.Timedelta(days=30)) & (frame['date'] > end - pd.Timedelta(days=60))
+        recent_revenue = float(frame.loc[recent, 'revenue'].sum())
+        prior_revenue = float(frame.loc[prior, 'revenue'].sum())
+        
+        insights = {
+            'sales_trends': {
+                'total_revenue': round(float(frame['revenue'].sum()), 2),
+                'last_30_days_revenue': round(recent_revenue, 2),
+                'growth_rate': round((recent_revenue / prior_revenue - 1) * 100, 1) if prior_revenue else None,
+                'top_selling_categories': frame.groupby('category')['revenue'].sum().nlargest(3).index.tolist()
+            },
+            'customer_insights': {
+                'average_order_value': round(float(frame['revenue'].mean()), 2),
+                'orders': int(len(frame))
             },
-            'profit_impact': '+12%',
-            'market_positioning': 'competitive_premium'
+            'operational_metrics': {}
         }
+        if 'customer_id' in frame.columns:
+            orders_per_customer = frame.groupby('customer_id').size()
+            insights['customer_insights']['repeat_customer_rate'] = round(float((orders_per_customer > 1).mean() * 100), 1)
+        if 'completed_at' in frame.columns:
+            completion_days = (pd.to_datetime(frame['completed_at'], errors='coerce') - frame['date']).dt.total_seconds() / 86400
+            insights['operational_metrics']['average_completion_time'] = round(float(completion_days.mean()), 1)
+        return insights
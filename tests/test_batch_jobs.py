@@ -0,0 +1,58 @@
+import pytest
+
+from batch_jobs import JOB_TYPES, BatchJobRunner
+
+
+class FakeDB:
+    def __init__(self):
+        self.conversations = []
+        self.messages = []
+
+    def save_conversations_bulk(self, conversations):
+        self.conversations.extend(conversations)
+
+    def save_messages_bulk(self, messages):
+        self.messages.extend(messages)
+
+
+class FakeHandler:
+    last_served_model = 'gpt-4o-mini'
+
+    def get_response(self, messages, model_id):
+        return f"response for {messages[0]['content']}"
+
+
+class FakeAI:
+    def __init__(self):
+        self.db = FakeDB()
+        self.model_handler = FakeHandler()
+
+    def build_order_messages(self, item):
+        return 'gpt-4o-mini', [{'role': 'user', 'content': item['order_id']}]
+
+    def build_notification_messages(self, order_status, customer_info):
+        return 'gpt-4o-mini', [{'role': 'user', 'content': order_status.get('status', '')}]
+
+    def build_quality_messages(self, work_photos, quality_standards):
+        return 'gpt-4o-mini', [{'role': 'user', 'content': ','.join(work_photos)}]
+
+
+@pytest.mark.parametrize('job_type', list(JOB_TYPES))
+def test_default_write_back_saves_each_response(tmp_path, job_type):
+    ai = FakeAI()
+    runner = BatchJobRunner(framing_ai=ai, jobs_dir=str(tmp_path), concurrency=2)
+    items = [
+        {'order_id': 'A1', 'order_status': {'status': 'ready'}, 'work_photos': ['a.jpg']},
+        {'order_id': 'B2', 'order_status': {'status': 'cutting'}, 'work_photos': ['b.jpg']},
+    ]
+    state = runner.create_job(job_type, items)
+    runner.run(state.job_id)
+
+    conversation_ids = {row['id'] for row in ai.db.conversations}
+    assert len(conversation_ids) == 2
+    assert len(ai.db.messages) == 2
+    for message in ai.db.messages:
+        assert message['conversation_id'] in conversation_ids
+        assert message['role'] == 'assistant'
+        assert message['content'].startswith('response for')
+        assert message['model_id'] == 'gpt-4o-mini'
@@ -0,0 +1,63 @@
+import pytest
+
+import hub_websocket_client
+from hub_connection_manager import HubConnectionManager
+from hub_websocket_client import HubWebSocketClient
+from white_label_config import WhiteLabelConfig
+
+
+@pytest.fixture
+def config(tmp_path):
+    config = WhiteLabelConfig(config_file=str(tmp_path / 'white_label_config.json'))
+    config.connection.enable_hub_integration = True
+    config.connection.hub_dashboard_url = 'https://hub.example.com'
+    config.connection.hub_websocket_url = 'wss://hub.example.com'
+    config.connection.hub_api_key = 'local-key'
+    return config
+
+
+def test_push_applies_branding_and_features_only(config):
+    client = HubWebSocketClient(config)
+
+    ack = client._handle_config_update({'id': 'm1', 'config': {
+        'branding': {'app_title': 'Frame Shop', 'primary_color': 123, 'unknown': 'x'},
+        'features': {'enable_mcp': False, 'allowed_models': ['gpt-4o'], 'max_messages_per_session': '50'},
+        'connection': {'hub_dashboard_url': 'https://evil.example.com', 'hub_api_key': 'stolen'},
+        'deployment': {'server_port': 80},
+    }})
+
+    assert ack['changed'] == {'branding': ['app_title'], 'features': ['enable_mcp', 'allowed_models']}
+    assert sorted(ack['rejected']) == ['branding.primary_color', 'branding.unknown', 'connection',
+                                       'deployment', 'features.max_messages_per_session']
+    assert config.branding.app_title == 'Frame Shop'
+    assert config.connection.hub_dashboard_url == 'https://hub.example.com'
+    assert config.connection.hub_api_key == 'local-key'
+    assert 'connection' not in client.latest_config
+
+    saved = WhiteLabelConfig(config_file=config.config_file)
+    assert saved.branding.app_title == 'Frame Shop'
+    assert saved.connection.hub_api_key == 'local-key'
+
+
+def test_non_object_push_is_rejected(config):
+    client = HubWebSocketClient(config)
+
+    ack = client._handle_config_update({'config': ['branding']})
+
+    assert ack['changed'] == {}
+    assert ack['rejected']
+
+
+def test_read_paths_do_not_start_the_websocket_client(config, monkeypatch):
+    monkeypatch.setattr(hub_websocket_client, '_clients', {})
+    started = []
+    monkeypatch.setattr(HubWebSocketClient, 'start', lambda self: started.append(self))
+    manager = HubConnectionManager(config)
+    monkeypatch.setattr(manager.session, 'get', lambda *args, **kwargs: (_ for _ in ()).throw(OSError('offline')))
+
+    assert manager.get_realtime_status() == {'connected': False, 'enabled': True, 'started': False}
+    assert manager.get_hub_configuration() is None
+    assert started == []
+
+    assert manager.start_realtime_sync() is not None
+    assert len(started) == 1
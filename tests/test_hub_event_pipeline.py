@@ -0,0 +1,124 @@
+import gzip
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from hub_event_pipeline import HubEventPipeline, default_spill_path
+
+
+class MockHub:
+    """Local hub that records event batches and answers with scripted status codes"""
+
+    def __init__(self):
+        self.statuses = []
+        self.batches = []
+        hub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                hub.batches.append(json.loads(gzip.decompress(body)))
+                status = hub.statuses.pop(0) if hub.statuses else 202
+                self.send_response(status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/api/events/batch"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def hub():
+    mock = MockHub()
+    yield mock
+    mock.close()
+
+
+@pytest.fixture
+def make_pipeline(tmp_path):
+    pipelines = []
+
+    def make(url, **kwargs):
+        kwargs.setdefault('spill_path', str(tmp_path / 'spill.jsonl'))
+        pipeline = HubEventPipeline(url, app_id='test-app', flush_interval=0.05,
+                                    retry_backoff=0.01, max_retries=2, **kwargs)
+        pipelines.append(pipeline)
+        return pipeline
+
+    yield make
+    for pipeline in pipelines:
+        pipeline.close(timeout=2)
+
+
+def test_events_are_batched_into_one_post(hub, make_pipeline):
+    pipeline = make_pipeline(hub.url, batch_size=10)
+    for index in range(5):
+        assert pipeline.publish('chat', {'index': index})
+
+    assert pipeline.flush(5)
+    events = [event for batch in hub.batches for event in batch['events']]
+    assert [event['event_data']['index'] for event in events] == list(range(5))
+    assert all(batch['app_id'] == 'test-app' for batch in hub.batches)
+    assert pipeline.get_metrics()['sent'] == 5
+
+
+def test_client_error_is_dead_lettered_without_retry(hub, make_pipeline):
+    hub.statuses = [400]
+    pipeline = make_pipeline(hub.url)
+    pipeline.publish('chat', {'bad': True})
+
+    assert pipeline.flush(5)
+    metrics = pipeline.get_metrics()
+    assert len(hub.batches) == 1
+    assert metrics['rejected'] == 1
+    assert metrics['spilled'] == 0
+    assert metrics['spill_bytes'] == 0
+    with open(pipeline.dead_letter_path) as f:
+        assert json.loads(f.readline())[0]['event_data'] == {'bad': True}
+
+
+def test_unavailable_hub_spills_and_replays(hub, make_pipeline):
+    hub.statuses = [503, 503, 503]
+    pipeline = make_pipeline(hub.url)
+    pipeline.publish('chat', {'first': True})
+    assert pipeline.flush(5)
+    assert pipeline.get_metrics()['spilled'] == 1
+
+    pipeline.publish('chat', {'second': True})
+    assert pipeline.flush(5)
+    metrics = pipeline.get_metrics()
+    assert metrics['replayed'] == 1
+    assert metrics['spill_bytes'] == 0
+    delivered = [event['event_data'] for batch in hub.batches[3:] for event in batch['events']]
+    assert delivered == [{'second': True}, {'first': True}]
+
+
+def test_rate_limited_batch_is_retried(hub, make_pipeline):
+    hub.statuses = [429]
+    pipeline = make_pipeline(hub.url)
+    pipeline.publish('chat', {})
+
+    assert pipeline.flush(5)
+    assert len(hub.batches) == 2
+    assert pipeline.get_metrics()['sent'] == 1
+
+
+def test_default_spill_path_is_per_hub_and_app():
+    paths = {
+        default_spill_path('https://hub-a/api/events/batch', 'chat'),
+        default_spill_path('https://hub-b/api/events/batch', 'chat'),
+        default_spill_path('https://hub-a/api/events/batch', 'dashboard'),
+    }
+    assert len(paths) == 3
+    assert HubEventPipeline('https://hub-a/api/events/batch', app_id='chat').spill_path == \
+        default_spill_path('https://hub-a/api/events/batch', 'chat')
@@ -0,0 +1,26 @@
+import threading
+
+from image_asset_store import ImageAssetStore
+
+
+def test_finished_downloads_are_evicted_past_the_bound(tmp_path):
+    store = ImageAssetStore(root=str(tmp_path), max_downloads=2)
+    release = threading.Event()
+
+    def download(url):
+        if url == 'slow':
+            release.wait(5)
+        return {'asset_id': url}
+
+    store._download = download
+    slow = store.submit('slow')
+    for index in range(5):
+        store.fetch(f"https://images.example/{index}")
+
+    assert len(store._downloads) <= 3
+    assert 'slow' in store._downloads
+    assert store.lookup('https://images.example/4') == {'asset_id': 'https://images.example/4'}
+    assert store.lookup('https://images.example/0') is None
+
+    release.set()
+    assert slow.result(timeout=5) == {'asset_id': 'slow'}
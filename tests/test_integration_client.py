@@ -0,0 +1,157 @@
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from integration_client import IntegrationClient
+from metrics import metrics
+
+
+class StubServer:
+    """Local HTTP server answering with scripted (status, delay) responses"""
+
+    def __init__(self):
+        self.responses = []
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _handle(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                stub.requests.append({
+                    'method': self.command,
+                    'path': self.path,
+                    'idempotency_key': self.headers.get('Idempotency-Key'),
+                    'body': json.loads(self.rfile.read(length)) if length else None
+                })
+                status, delay = stub.responses.pop(0) if stub.responses else (200, 0)
+                time.sleep(delay)
+                body = json.dumps({'ok': status < 400}).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = do_POST = do_PUT = _handle
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub():
+    server = StubServer()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def client():
+    return IntegrationClient(read_timeout=0.3, max_retries=2, retry_backoff=0)
+
+
+def test_get_is_retried_on_server_error(stub, client):
+    stub.responses = [(503, 0), (200, 0)]
+    client.register_endpoint('stub', stub.url)
+
+    result = client.request('stub', 'GET', '/items')
+
+    assert result['success']
+    assert result['attempts'] == 2
+
+
+def test_post_is_not_retried_after_server_error(stub, client):
+    stub.responses = [(503, 0), (200, 0)]
+    client.register_endpoint('stub', stub.url)
+
+    result = client.request('stub', 'POST', '/orders', json={'order_id': 1})
+
+    assert not result['success']
+    assert result['status_code'] == 503
+    assert len(stub.requests) == 1
+
+
+def test_post_is_not_retried_after_read_timeout(stub, client):
+    stub.responses = [(200, 0.6)]
+    client.register_endpoint('stub', stub.url)
+
+    result = client.request('stub', 'POST', '/orders', json={'order_id': 1})
+
+    assert not result['success']
+    assert result['attempts'] == 1
+    time.sleep(0.4)
+    assert len(stub.requests) == 1
+
+
+def test_post_is_retried_when_rate_limited(stub, client):
+    stub.responses = [(429, 0), (201, 0)]
+    client.register_endpoint('stub', stub.url)
+
+    result = client.request('stub', 'POST', '/orders', json={'order_id': 1})
+
+    assert result['success']
+    assert len(stub.requests) == 2
+
+
+def test_post_retries_reuse_idempotency_key_when_honored(stub, client):
+    stub.responses = [(503, 0), (200, 0.6), (201, 0)]
+    client.register_endpoint('stub', stub.url, honors_idempotency_key=True)
+
+    result = client.request('stub', 'POST', '/orders', json={'order_id': 1}, idempotency_key='order-1')
+
+    assert result['success']
+    assert result['attempts'] == 3
+    assert result['idempotency_key'] == 'order-1'
+    assert {request['idempotency_key'] for request in stub.requests} == {'order-1'}
+
+
+def test_post_is_retried_when_connection_is_refused(client):
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    client.register_endpoint('down', f"http://127.0.0.1:{port}")
+
+    result = client.request('down', 'POST', '/orders', json={})
+
+    assert not result['success']
+    assert result['attempts'] == 3
+
+
+def test_fan_out_reports_partial_failure(stub, client):
+    stub.responses = [(200, 0)]
+    client.register_endpoint('stub', stub.url)
+
+    result = client.fan_out({
+        'ok': lambda: client.request('stub', 'GET', '/items'),
+        'broken': lambda: 1 / 0
+    })
+
+    assert result['partial']
+    assert result['failed'] == ['broken']
+    assert result['results']['ok']['success']
+
+
+def test_latency_is_recorded_in_metrics_registry(stub, client):
+    stub.responses = [(200, 0), (404, 0)]
+    client.register_endpoint('latency-stub', stub.url)
+
+    client.request('latency-stub', 'GET', '/items')
+    client.request('latency-stub', 'GET', '/missing')
+
+    latency = client.get_latency_histograms()['latency-stub']
+    assert latency['count'] == 2
+    assert latency['error_rate'] == 0.5
+    assert latency['p95_seconds'] >= latency['p50_seconds'] > 0
+    assert 'integration_request_seconds_count{endpoint="latency-stub",method="GET"} 2' in metrics.render_prometheus()
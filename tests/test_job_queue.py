@@ -0,0 +1,33 @@
+import importlib
+import time
+
+from job_queue import DurableJobQueue
+
+
+def test_fail_reports_lost_lease(tmp_path):
+    queue = DurableJobQueue(str(tmp_path / 'jobs.db'), visibility_timeout=0, retry_backoff=0)
+    job_id = queue.enqueue('report', {})
+    first = queue.claim('worker-a')
+    time.sleep(0.01)
+    second = queue.claim('worker-b')
+
+    assert first['id'] == second['id'] == job_id
+    assert queue.fail(job_id, 'worker-a', 'timed out') == 'lost'
+    assert queue.get(job_id)['locked_by'] == 'worker-b'
+    assert queue.fail(job_id, 'worker-b', 'boom') == 'queued'
+
+
+def test_fail_on_final_attempt(tmp_path):
+    queue = DurableJobQueue(str(tmp_path / 'jobs.db'), max_attempts=1)
+    job_id = queue.enqueue('report', {})
+    queue.claim('worker-a')
+
+    assert queue.fail(job_id, 'worker-a', 'boom') == 'failed'
+    assert queue.get(job_id)['status'] == 'failed'
+
+
+def test_importing_hub_endpoints_does_not_start_workers(tmp_path, monkeypatch):
+    monkeypatch.setenv('HUB_JOB_DB', str(tmp_path / 'hub_jobs.db'))
+    hub_api_endpoints = importlib.import_module('hub_api_endpoints')
+
+    assert hub_api_endpoints.job_workers._threads == []
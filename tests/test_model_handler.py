@@ -0,0 +1,70 @@
+import time
+
+import pytest
+
+import model_handler
+from model_handler import ModelHandler
+
+
+@pytest.fixture
+def handler(monkeypatch):
+    tracker = model_handler.model_usage_tracker
+    monkeypatch.setattr(tracker, 'is_model_available', lambda model_id: (True, ''))
+    monkeypatch.setattr(tracker, 'get_latency_percentile', lambda model_id, percentile=95: 5.0)
+    monkeypatch.setattr(tracker, 'get_fallback_chain',
+                        lambda model_id: [model_id, 'gpt-4o-mini', 'claude-3-5-sonnet-20241022'])
+    return ModelHandler()
+
+
+def fake_calls(handler, monkeypatch, outcomes):
+    """Replace provider calls with canned (response, success) pairs and record the order of calls"""
+    calls = []
+
+    def call_model(messages, model_id):
+        calls.append(model_id)
+        return outcomes[model_id]
+
+    monkeypatch.setattr(handler, '_call_model', call_model)
+    return calls
+
+
+def test_primary_failing_fast_is_hedged_immediately(handler, monkeypatch):
+    calls = fake_calls(handler, monkeypatch, {
+        'gpt-4o': ('OpenAI API error: 500', False),
+        'gpt-4o-mini': ('hedged answer', True),
+    })
+
+    start = time.perf_counter()
+    response = handler.get_hedged_response([{'role': 'user', 'content': 'hi'}], 'gpt-4o', coalesce=False)
+
+    assert response == 'hedged answer'
+    assert handler.last_served_model == 'gpt-4o-mini'
+    assert calls == ['gpt-4o', 'gpt-4o-mini']
+    assert time.perf_counter() - start < 1.0
+
+
+def test_all_raced_calls_failing_continues_down_fallback_chain(handler, monkeypatch):
+    calls = fake_calls(handler, monkeypatch, {
+        'gpt-4o': ('OpenAI API error: 500', False),
+        'gpt-4o-mini': ('OpenAI API error: 500', False),
+        'claude-3-5-sonnet-20241022': ('fallback answer', True),
+    })
+
+    response = handler.get_hedged_response([{'role': 'user', 'content': 'hi'}], 'gpt-4o', coalesce=False)
+
+    assert response == 'fallback answer'
+    assert handler.last_served_model == 'claude-3-5-sonnet-20241022'
+    assert calls == ['gpt-4o', 'gpt-4o-mini', 'claude-3-5-sonnet-20241022']
+
+
+def test_last_error_is_returned_when_nothing_can_serve(handler, monkeypatch):
+    fake_calls(handler, monkeypatch, {
+        'gpt-4o': ('OpenAI API error: 500', False),
+        'gpt-4o-mini': ('OpenAI API error: 503', False),
+        'claude-3-5-sonnet-20241022': ('Anthropic API error: 529', False),
+    })
+
+    response = handler.get_hedged_response([{'role': 'user', 'content': 'hi'}], 'gpt-4o', coalesce=False)
+
+    assert response == 'Anthropic API error: 529'
+    assert handler.last_served_model is None
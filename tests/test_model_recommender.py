@@ -0,0 +1,51 @@
+import pytest
+
+from model_recommender import ModelRecommender
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.saved = []
+        self.updated = []
+
+    def get_recommendation_training_data(self):
+        return []
+
+    def save_recommendation(self, **kwargs):
+        self.saved.append(kwargs)
+
+    def update_recommendation_feedback(self, recommendation_id, user_accepted):
+        self.updated.append((recommendation_id, user_accepted))
+        return True
+
+
+@pytest.fixture
+def recommender():
+    return ModelRecommender(db=FakeDatabase(), confidence_threshold=0.0)
+
+
+def test_local_prediction_does_not_write_to_database(recommender):
+    recommendation = recommender.get_recommendation('Analyze this image and describe the visual content')
+
+    assert recommendation['source'] == 'local'
+    assert recommendation['recommendation_id']
+    assert recommender.db.saved == []
+
+
+def test_accepted_local_prediction_is_saved_as_accepted(recommender):
+    recommendation = recommender.get_recommendation('Write a long essay about framing history')
+
+    assert recommender.record_feedback(recommendation['recommendation_id'], True)
+    assert len(recommender.db.saved) == 1
+    saved = recommender.db.saved[0]
+    assert saved['recommendation_id'] == recommendation['recommendation_id']
+    assert saved['recommended_model'] == recommendation['model_name']
+    assert saved['user_accepted'] is True
+
+
+def test_rejected_local_prediction_is_never_saved(recommender):
+    recommendation = recommender.get_recommendation('Summarize a contract')
+
+    assert recommender.record_feedback(recommendation['recommendation_id'], False)
+    assert recommender.db.saved == []
+    assert recommender.db.updated == []
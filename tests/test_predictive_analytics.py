@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+import pytest
+
+from smart_integrations import PredictiveAnalytics
+
+
+def orders_closed_on_sunday(start, days):
+    """Three orders a day, none on Sundays"""
+    orders = []
+    for offset in range(days):
+        day = pd.Timestamp(start) + pd.Timedelta(days=offset)
+        if day.dayofweek != 6:
+            orders.extend({'date': day, 'total': 100.0} for _ in range(3))
+    return orders
+
+
+@pytest.mark.parametrize('days', [60, 800])
+def test_demand_forecast_with_closed_weekday(days):
+    forecast = PredictiveAnalytics().predict_demand(orders_closed_on_sunday('2023-01-02', days), horizon_days=14)
+
+    assert forecast['weekday_index']['Sun'] == 0
+    by_day = {pd.Timestamp(row['date']).dayofweek: row['orders'] for row in forecast['daily_forecast']}
+    assert by_day[6] == 0
+    assert all(by_day[weekday] == pytest.approx(3.0, abs=0.2) for weekday in range(6))
+    assert forecast['next_month_demand'] == pytest.approx(36, abs=2)
+
+
+def test_delay_prediction_accepts_timezone_aware_deadlines():
+    as_of = datetime(2024, 6, 1, 12, tzinfo=timezone.utc)
+    orders = [
+        {'order_id': 'late', 'complexity': 'complex', 'estimated_hours': 40,
+         'deadline': (as_of + timedelta(days=1)).isoformat()},
+        {'order_id': 'easy', 'complexity': 'simple', 'estimated_hours': 2,
+         'deadline': (as_of + timedelta(days=20)).replace(tzinfo=None).isoformat()},
+    ]
+
+    result = PredictiveAnalytics().predict_completion_delays(orders, as_of=as_of)
+
+    assert [order['order_id'] for order in result['high_risk_orders']] == ['late']
+
+
+def test_delay_prediction_compares_aware_deadlines_with_current_time():
+    deadline = datetime.now(timezone(timedelta(hours=-5))) + timedelta(hours=12)
+    orders = [{'order_id': 'rush', 'complexity': 'complex', 'estimated_hours': 40, 'deadline': deadline.isoformat()}]
+
+    result = PredictiveAnalytics().predict_completion_delays(orders)
+
+    assert result['high_risk_orders'][0]['order_id'] == 'rush'
+
+
+def test_rush_flag_strings_are_parsed_strictly():
+    as_of = datetime(2024, 6, 1, 12, tzinfo=timezone.utc)
+    analytics = PredictiveAnalytics()
+
+    def risk(flag):
+        order = {'order_id': 'A1', 'complexity': 'medium', 'estimated_hours': 8,
+                 'deadline': (as_of + timedelta(days=2)).isoformat(), 'rush_order': flag}
+        return analytics.predict_completion_delays([order], as_of=as_of)['mean_delay_probability']
+
+    assert risk('false') == risk('no') == risk('0') == risk(False)
+    assert risk('true') == risk(True) > risk(False)
+
+
+def test_demand_cache_hits_until_history_changes():
+    analytics = PredictiveAnalytics()
+    orders = orders_closed_on_sunday('2023-01-02', 60)
+    first = analytics.predict_demand(orders)
+
+    assert analytics.predict_demand(list(orders)) is first
+    newer = orders + [{'date': pd.Timestamp('2023-03-10'), 'total': 100.0}]
+    assert analytics.predict_demand(newer) is not first
+    assert analytics.predict_demand(orders, version=1) is analytics.predict_demand(newer, version=1)
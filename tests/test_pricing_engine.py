@@ -0,0 +1,66 @@
+import pytest
+
+from pricing_engine import PricingEngine
+
+
+@pytest.fixture
+def engine():
+    return PricingEngine()
+
+
+@pytest.mark.parametrize('order', [
+    {'width': 16, 'height': 20},
+    {'width': '16 in', 'height': '20 inches'},
+    {'dimensions': {'width': '16"', 'height': '20"'}},
+    {'artwork_size': '16 x 20'},
+])
+def test_quote_order_accepts_dimension_formats(engine, order):
+    result = engine.quote_order(order)
+
+    assert result['valid']
+    assert (result['quote']['specification']['width'], result['quote']['specification']['height']) == (16, 20)
+
+
+@pytest.mark.parametrize('order', [
+    {'width': 0, 'height': 20},
+    {'width': '-16 in', 'height': '20 in'},
+    {'width': 16, 'height': 20, 'mat_width': '-2 in'},
+])
+def test_quote_order_rejects_non_positive_sizes(engine, order):
+    result = engine.quote_order(order)
+
+    assert not result['valid']
+    assert result['quote'] is None
+    assert result['errors']
+
+
+@pytest.mark.parametrize('flag, rush_fee', [(False, 0), ('false', 0), ('no', 0), ('0', 0), ('', 0), (None, 0),
+                                            (True, 1), ('true', 1), ('Yes', 1), (1, 1)])
+def test_rush_order_flag_is_parsed_strictly(engine, flag, rush_fee):
+    result = engine.quote_order({'width': 16, 'height': 20, 'rush_order': flag})
+
+    assert result['valid']
+    assert (result['quote']['rush_fee'] > 0) == bool(rush_fee)
+
+
+def test_unrecognized_rush_order_flag_is_a_validation_error(engine):
+    result = engine.quote_order({'width': 16, 'height': 20, 'rush_order': 'maybe'})
+
+    assert not result['valid']
+    assert 'rush_order' in result['errors'][0]
+
+
+@pytest.mark.parametrize('budget, parsed', [(300, 300.0), ('300', 300.0), ('$300', 300.0), ('$1,200.50', 1200.5)])
+def test_budget_formats(engine, budget, parsed):
+    result = engine.quote_order({'width': 16, 'height': 20, 'budget': budget})
+
+    assert result['valid']
+    assert result['budget'] == parsed
+
+
+@pytest.mark.parametrize('budget', ['three hundred', '-300', -5, True])
+def test_malformed_budget_is_a_validation_error(engine, budget):
+    result = engine.quote_order({'width': 16, 'height': 20, 'budget': budget})
+
+    assert not result['valid']
+    assert 'budget' in result['errors'][0]
@@ -0,0 +1,61 @@
+from datetime import date
+
+import pytest
+
+from production_scheduler import ProductionScheduler, SchedulingError
+
+MONDAY = date(2024, 6, 3)
+
+
+def plan(orders, capacity=None, stock=None):
+    return ProductionScheduler().schedule(orders, capacity or {'staff_available': 2}, stock, start_date=MONDAY)
+
+
+def test_frame_and_glass_types_draw_from_matching_stock():
+    orders = [{'order_id': f'ORD{index}', 'frame_type': 'Hardwood Cherry', 'glass_type': 'Museum Glass'}
+              for index in range(3)]
+
+    result = plan(orders, stock={'Cherry Frames': 2, 'museum_glass': 5})
+
+    assert [entry['order_id'] for entry in result['scheduled']] == ['ORD0', 'ORD1']
+    assert result['blocked'] == [{'order_id': 'ORD2', 'reason': 'materials', 'shortages': {'cherry_frames': 1}}]
+    assert result['remaining_materials'] == {'cherry_frames': 0, 'museum_glass': 3}
+
+
+def test_category_stock_is_used_when_specific_stock_is_not_tracked():
+    result = plan([{'order_id': 'ORD1', 'frame_type': 'Hardwood Oak', 'glass_type': 'Acrylic'}],
+                  stock={'Hardwood Frames': 1})
+
+    assert result['remaining_materials'] == {'hardwood_frames': 0}
+    assert result['untracked_materials'] == ['Acrylic']
+
+
+def test_explicit_materials_accept_numeric_strings():
+    result = plan([{'order_id': 'ORD1', 'materials': {'Mat Board': '2'}}], stock={'mat_board': 1})
+
+    assert result['blocked'][0]['shortages'] == {'mat_board': 1}
+
+
+@pytest.mark.parametrize('order, stock', [
+    ({'order_id': 'ORD1', 'materials': ['Mat Board']}, {}),
+    ({'order_id': 'ORD1', 'materials': {'Mat Board': 'two'}}, {}),
+    ({'order_id': 'ORD1'}, {'mat_board': 'lots'}),
+    ({'order_id': 'ORD1'}, ['mat_board']),
+])
+def test_malformed_materials_raise_scheduling_error(order, stock):
+    with pytest.raises(SchedulingError):
+        plan([order], stock=stock)
+
+
+def test_zero_daily_frames_is_a_limit_not_unlimited():
+    result = plan([{'order_id': 'ORD1'}], capacity={'daily_frames': 0})
+
+    assert result['scheduled'] == []
+    assert result['blocked'][0]['reason'] == 'capacity'
+
+
+def test_rush_order_string_false_is_not_rush():
+    scheduler = ProductionScheduler()
+
+    assert scheduler.order_hours({'complexity': 'medium', 'rush_order': 'false'}) == 3.0
+    assert scheduler.order_hours({'complexity': 'medium', 'rush_order': 'true'}) == pytest.approx(2.4)
@@ -0,0 +1,46 @@
+import pytest
+
+from smart_integrations import RealtimeDataSync, SyncScheduler
+
+
+class FakeClient:
+    def __init__(self, body):
+        self.body = body
+
+    def register_endpoint(self, name, endpoint, headers=None):
+        pass
+
+    def request(self, name, method, path, params=None, headers=None):
+        return {'success': True, 'data': self.body, 'latency': 0.01, 'etag': None}
+
+
+class RecordingScheduler(SyncScheduler):
+    """Scheduler that records jobs without starting its loop"""
+
+    def _start(self):
+        pass
+
+
+def test_instances_sharing_a_scheduler_keep_their_own_jobs():
+    scheduler = RecordingScheduler()
+    first = RealtimeDataSync(FakeClient([]), scheduler=scheduler)
+    second = RealtimeDataSync(FakeClient([]), scheduler=scheduler)
+    first.register_sync_endpoint('orders', 'http://pos.local/orders')
+    second.register_sync_endpoint('orders', 'http://tracker.local/orders')
+
+    assert len(scheduler.jobs) == 2
+    assert first.get_sync_metrics()['orders']['next_run_in'] is not None
+    assert second.get_sync_metrics()['orders']['next_run_in'] is not None
+
+
+@pytest.mark.parametrize('body', ['maintenance', 42, None, {'orders': 'none'}])
+def test_non_record_body_counts_as_failed_sync(body):
+    sync = RealtimeDataSync(FakeClient(body), scheduler=RecordingScheduler())
+    sync.register_sync_endpoint('orders', 'http://pos.local/orders')
+
+    assert sync.sync_endpoint('orders') is False
+    metrics = sync.get_sync_metrics()['orders']
+    assert metrics['failures'] == 1
+    assert metrics['consecutive_failures'] == 1
+    assert 'Unexpected response body' in metrics['last_error']
+    assert sync.get_cached('orders') == []
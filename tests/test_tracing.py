@@ -0,0 +1,46 @@
+import json
+import threading
+import time
+
+from tracing import Tracer
+
+
+def test_trace_with_concurrent_child_spans_is_exported_once(tmp_path):
+    path = tmp_path / 'traces.jsonl'
+    tracer = Tracer(sample_rate=1.0, path=str(path))
+
+    def work():
+        for _ in range(200):
+            with tracer.span('child'):
+                pass
+
+    with tracer.trace('request'):
+        threads = [threading.Thread(target=tracer.wrap(work)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert len(records) == 1
+    assert len(records[0]['spans']) == 8 * 200 + 1
+    assert tracer.slowest_traces()[0]['trace_id'] == records[0]['trace_id']
+
+
+def test_open_span_is_exported_after_its_timeout(tmp_path):
+    path = tmp_path / 'traces.jsonl'
+    tracer = Tracer(sample_rate=1.0, path=str(path))
+
+    with tracer.trace('chat.turn'):
+        rerun = tracer.start_span('streamlit.rerun', timeout=0.05)
+    assert not path.exists()
+
+    deadline = time.time() + 5
+    while not path.exists() and time.time() < deadline:
+        time.sleep(0.01)
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert len(records) == 1
+    assert rerun.attributes['timed_out'] is True
+
+    rerun.end()
+    assert len(path.read_text().splitlines()) == 1
@@ -0,0 +1,342 @@
+"""
+Lightweight request tracing
+
+A chat turn (or API request) opens a root trace; code below it opens child
+spans that find their parent through a context variable, so nothing needs to
+be passed around. Work handed to thread pools keeps its parent via
+tracer.wrap(), and calls to the Central Hub carry a W3C traceparent header.
+
+Only entry points start traces, and only a sampled fraction of them
+(TRACE_SAMPLE_RATE, default 0.1; 0 disables tracing). Spans outside a sampled
+trace are a shared no-op object, so instrumented hot paths cost one context
+variable lookup when tracing is off.
+
+A trace is exported once all of its spans have ended: appended as one line to
+TRACE_FILE, either as plain JSON (TRACE_FORMAT=json) or as an OTLP/JSON
+ResourceSpans document (TRACE_FORMAT=otlp), and kept in memory for the
+slowest-traces view of the health dashboard.
+"""
+
+import os
+import json
+import random
+import secrets
+import threading
+import time
+import contextvars
+from collections import deque
+from functools import wraps
+from typing import Any, Dict, List, Optional
+
+TRACEPARENT_VERSION = '00'
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+
+class _Trace:
+    __slots__ = ('trace_id', 'spans', 'open_spans', 'finished')
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.spans: List['Span'] = []
+        self.open_spans = 0
+        self.finished = False
+
+
+class Span:
+    """A timed operation within a sampled trace"""
+    sampled = True
+
+    def __init__(self, tracer: 'Tracer', trace: _Trace, name: str, parent_id: Optional[str],
+                 attributes: Dict[str, Any]):
+        self.tracer = tracer
+        self.trace = trace
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.status = 'ok'
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self._timer = None
+        # Spans of one trace start and end on different threads; the count decides export
+        with tracer._lock:
+            trace.open_spans += 1
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def record_error(self, error: BaseException):
+        self.status = 'error'
+        self.attributes['error'] = f"{type(error).__name__}: {error}"
+
+    def end(self):
+        # A timeout may end the span from another thread; only the first end counts
+        with self.tracer._lock:
+            if self.end_ns is not None:
+                return
+            self.end_ns = time.time_ns()
+        if self._timer is not None:
+            self._timer.cancel()
+        self.tracer._finish_span(self)
+
+    def _expire(self):
+        if self.end_ns is None:
+            self.set_attribute('timed_out', True)
+            self.end()
+
+    @property
+    def traceparent(self) -> str:
+        return f"{TRACEPARENT_VERSION}-{self.trace.trace_id}-{self.span_id}-01"
+
+
+class _NoopSpan:
+    """Stands in for spans that are not recorded (tracing off, unsampled, or no parent)"""
+    sampled = False
+    traceparent = None
+
+    def set_attribute(self, key, value):
+        pass
+
+    def record_error(self, error):
+        pass
+
+    def end(self):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class _SpanScope:
+    """Context manager making a span current for its duration"""
+    __slots__ = ('span', '_token')
+
+    def __init__(self, span):
+        self.span = span
+        self._token = None
+
+    def __enter__(self):
+        self._token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None and exc_type is not GeneratorExit:
+            self.span.record_error(exc)
+        self.span.end()
+        _current_span.reset(self._token)
+        return False
+
+
+class _NoopScope:
+    __slots__ = ()
+
+    def __enter__(self):
+        return NOOP_SPAN
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SCOPE = _NoopScope()
+
+
+class Tracer:
+    """Sampled span recorder with a JSON-lines or OTLP/JSON file sink"""
+
+    def __init__(self, sample_rate: Optional[float] = None, path: Optional[str] = None,
+                 export_format: Optional[str] = None, service_name: str = 'multi-model-chat',
+                 max_file_bytes: int = 20 * 1024 * 1024, recent_traces: int = 500):
+        self.sample_rate = float(os.environ.get('TRACE_SAMPLE_RATE', '0.1') if sample_rate is None else sample_rate)
+        self.path = path or os.environ.get('TRACE_FILE', os.path.join('traces', 'traces.jsonl'))
+        self.export_format = (export_format or os.environ.get('TRACE_FORMAT', 'json')).lower()
+        if self.export_format not in ('json', 'otlp'):
+            raise ValueError(f"Unsupported trace format: {self.export_format}")
+        self.service_name = service_name
+        self.max_file_bytes = max_file_bytes
+        self.recent = deque(maxlen=recent_traces)
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    # Starting spans
+
+    def trace(self, name: str, traceparent: Optional[str] = None, **attributes):
+        """
+        Scope for an entry point: starts a new sampled trace, or joins the caller's
+        trace when a traceparent header is given (honouring its sampled flag)
+        """
+        if not self.enabled:
+            return _NOOP_SCOPE
+        remote = _parse_traceparent(traceparent)
+        if remote:
+            trace_id, parent_id, sampled = remote
+        else:
+            trace_id, parent_id, sampled = secrets.token_hex(16), None, random.random() < self.sample_rate
+        if not sampled:
+            return _SpanScope(NOOP_SPAN)
+        return _SpanScope(Span(self, _Trace(trace_id), name, parent_id, attributes))
+
+    def span(self, name: str, **attributes):
+        """Scope for a child of the current span; a no-op outside a sampled trace"""
+        parent = _current_span.get()
+        if parent is None or not parent.sampled:
+            return _NOOP_SCOPE
+        return _SpanScope(Span(self, parent.trace, name, parent.span_id, attributes))
+
+    def start_span(self, name: str, parent: Optional[Span] = None, timeout: Optional[float] = None, **attributes):
+        """
+        Child span that is not made current and must be ended explicitly; for
+        work that starts and ends in different callbacks (or Streamlit runs).
+        With a timeout, a span still open after that many seconds is ended and
+        marked timed_out so its trace is exported anyway.
+        """
+        parent = parent or _current_span.get()
+        if parent is None or not parent.sampled:
+            return NOOP_SPAN
+        span = Span(self, parent.trace, name, parent.span_id, attributes)
+        if timeout is not None:
+            span._timer = threading.Timer(timeout, span._expire)
+            span._timer.daemon = True
+            span._timer.start()
+        return span
+
+    def traced(self, name: str):
+        """Decorator running the function inside a child span"""
+        def decorator(function):
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    @staticmethod
+    def wrap(function):
+        """Bind function to the current context so a worker thread continues this trace"""
+        if _current_span.get() is None:
+            return function
+        return _bind_context(contextvars.copy_context(), function)
+
+    @staticmethod
+    def current_traceparent() -> Optional[str]:
+        span = _current_span.get()
+        return span.traceparent if span is not None else None
+
+    # Export
+
+    def _finish_span(self, span: Span):
+        with self._lock:
+            trace = span.trace
+            if trace.finished:
+                return
+            trace.spans.append(span)
+            trace.open_spans -= 1
+            if trace.open_spans > 0:
+                return
+            trace.finished = True
+            summary = _summarize(trace)
+            self.recent.append(summary)
+            try:
+                self._write(trace, summary)
+            except OSError as e:
+                print(f"Trace export failed: {e}")
+
+    def _write(self, trace: _Trace, summary: Dict[str, Any]):
+        record = self._otlp_document(trace) if self.export_format == 'otlp' else summary
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if os.path.exists(self.path) and os.path.getsize(self.path) > self.max_file_bytes:
+            os.replace(self.path, self.path + '.1')
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(record, default=str) + '\n')
+
+    def _otlp_document(self, trace: _Trace) -> Dict[str, Any]:
+        return {
+            'resourceSpans': [{
+                'resource': {'attributes': [_otlp_attribute('service.name', self.service_name)]},
+                'scopeSpans': [{
+                    'scope': {'name': 'tracing'},
+                    'spans': [{
+                        'traceId': trace.trace_id,
+                        'spanId': span.span_id,
+                        'parentSpanId': span.parent_id or '',
+                        'name': span.name,
+                        'kind': 1,
+                        'startTimeUnixNano': str(span.start_ns),
+                        'endTimeUnixNano': str(span.end_ns),
+                        'attributes': [_otlp_attribute(key, value) for key, value in span.attributes.items()],
+                        'status': {'code': 2 if span.status == 'error' else 1}
+                    } for span in trace.spans]
+                }]
+            }]
+        }
+
+    # Reporting
+
+    def slowest_traces(self, limit: int = 10, name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Slowest recently completed traces in this process, optionally for one root span name"""
+        with self._lock:
+            traces = [trace for trace in self.recent if name is None or trace['name'] == name]
+        return sorted(traces, key=lambda trace: trace['duration_ms'], reverse=True)[:limit]
+
+
+def _bind_context(context: contextvars.Context, function):
+    @wraps(function)
+    def run(*args, **kwargs):
+        return context.run(function, *args, **kwargs)
+    return run
+
+
+def _parse_traceparent(header: Optional[str]):
+    """(trace_id, parent span id, sampled) from a W3C traceparent header, or None"""
+    if not header:
+        return None
+    parts = header.strip().split('-')
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        sampled = bool(int(parts[3][:2], 16) & 1)
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None
+    return parts[1], parts[2], sampled
+
+
+def _summarize(trace: _Trace) -> Dict[str, Any]:
+    start = min(span.start_ns for span in trace.spans)
+    end = max(span.end_ns for span in trace.spans)
+    root = next((span for span in trace.spans if span.parent_id is None), None) or \
+        min(trace.spans, key=lambda span: span.start_ns)
+    return {
+        'trace_id': trace.trace_id,
+        'name': root.name,
+        'start': start / 1e9,
+        'duration_ms': (end - start) / 1e6,
+        'status': 'error' if any(span.status == 'error' for span in trace.spans) else 'ok',
+        'spans': [{
+            'span_id': span.span_id,
+            'parent_id': span.parent_id,
+            'name': span.name,
+            'offset_ms': (span.start_ns - start) / 1e6,
+            'duration_ms': (span.end_ns - span.start_ns) / 1e6,
+            'status': span.status,
+            'attributes': span.attributes
+        } for span in sorted(trace.spans, key=lambda span: span.start_ns)]
+    }
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {'key': key, 'value': {'boolValue': value}}
+    if isinstance(value, int):
+        return {'key': key, 'value': {'intValue': str(value)}}
+    if isinstance(value, float):
+        return {'key': key, 'value': {'doubleValue': value}}
+    return {'key': key, 'value': {'stringValue': str(value)}}
+
+
+tracer = Tracer()
@@ -6,6 +6,8 @@ from datetime import datetime, timedelta
 from dataclasses import dataclass, asdict
 from typing import Dict, List, Optional
 import smtplib
+from metrics import metrics
+from tracing import tracer
 try:
     from email.mime.text import MimeText
     from email.mime.multipart import MimeMultipart
@@ -153,6 +155,7 @@ class UsageMonitor:
         except Exception as e:
             self.logger.error(f"Error saving notifications: {e}")
     
+    @tracer.traced("usage.track")
     def track_usage(self, usage_type: str, amount: int = 1, cost: float = 0.0):
         """Track usage event"""
         if usage_type == "api_call":
@@ -655,3 +658,16 @@ class UsageMonitor:
 
 # Global usage monitor instance
 usage_monitor = UsageMonitor()
+
+
+def _collect_usage_metrics():
+    """Export today's usage counters (persisted by the monitor) as gauges"""
+    current = usage_monitor.metrics
+    daily = metrics.gauge('usage_daily', 'Usage counted toward the daily limits', ('kind',))
+    for kind in ('api_calls', 'tokens_used', 'images_generated', 'file_uploads', 'conversation_count'):
+        daily.set(getattr(current, kind), kind=kind)
+    metrics.gauge('usage_daily_cost_dollars', 'Estimated spend counted toward the daily cost limit').set(
+        current.total_cost)
+
+
+metrics.register_collector(_collect_usage_metrics)
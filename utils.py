@@ -1,6 +1,7 @@
 import os
 import json
 from datetime import datetime
+from tracing import tracer
 
 # Custom CSS for styling the chat interface
 custom_css = """
@@ -229,8 +230,11 @@ def get_avatar(role):
     else:
         return '<div class="avatar assistant-avatar">🤖</div>'
 
-def format_message(message):
-    """Formats a message for display in the chat interface"""
+def format_message(message, image_src=None):
+    """Formats a message for display in the chat interface
+    
+    image_src overrides the message's image URL (e.g. a cached thumbnail data URI)
+    """
     role_display = "You" if message["role"] == "user" else "Assistant"
     timestamp = message.get("timestamp", "")
     model = message.get("model", "")
@@ -239,8 +243,8 @@ def format_message(message):
     
     # Handle image content
     image_content = ""
-    if message.get("image_url"):
-        image_content = f'<img src="{message["image_url"]}" style="max-width: 100%; border-radius: 8px; margin-top: 10px;" alt="Generated image"/>'
+    if image_src or message.get("image_url"):
+        image_content = f'<img src="{image_src or message["image_url"]}" style="max-width: 100%; border-radius: 8px; margin-top: 10px;" alt="Generated image"/>'
 
     return f"""
     <div class="chat-message {message['role']}">
@@ -263,6 +267,7 @@ def get_history_dir():
     os.makedirs(history_dir, exist_ok=True)
     return history_dir
 
+@tracer.traced("history.save")
 def save_session_history(conversation_id, messages):
     """Saves the conversation history to a file"""
     history_dir = get_history_dir()
@@ -6,8 +6,12 @@ Allows easy customization of branding, features, and deployment
 
 import os
 import json
-from dataclasses import dataclass, asdict
-from typing import Dict, List, Optional, Any
+from dataclasses import dataclass, asdict, fields
+from typing import Dict, List, Optional, Any, Tuple, get_args, get_origin
+
+# Sections the Hub may change by pushing config. Connection and deployment settings
+# (hub URLs, credentials, limits) only ever come from the local config file.
+REMOTE_CONFIG_SECTIONS = ('branding', 'features')
 
 @dataclass
 class BrandingConfig:
@@ -85,6 +89,7 @@ class ConnectionConfig:
     
     # API Endpoints
     hub_events_endpoint: str = "/api/events/publish"
+    hub_events_batch_endpoint: str = "/api/events/batch"
     hub_proxy_endpoint: str = "/api/proxy"
     hub_connection_test_endpoint: str = "/api/test-connection"
     
@@ -125,6 +130,33 @@ class DeploymentConfig:
     server_port: int = 5000
     debug_mode: bool = False
 
+def _matches_type(value: Any, expected: Any) -> bool:
+    origin = get_origin(expected)
+    if origin in (list, List):
+        (item_type,) = get_args(expected) or (Any,)
+        return isinstance(value, list) and all(_matches_type(item, item_type) for item in value)
+    if origin in (dict, Dict):
+        key_type, value_type = get_args(expected) or (Any, Any)
+        return isinstance(value, dict) and all(
+            _matches_type(key, key_type) and _matches_type(item, value_type) for key, item in value.items())
+    if expected is Any:
+        return True
+    if expected is bool:
+        return isinstance(value, bool)
+    if expected is float:
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    if expected is int:
+        return isinstance(value, int) and not isinstance(value, bool)
+    return isinstance(value, expected)
+
+
+def _matches_field(value: Any, field) -> bool:
+    """Whether value fits a config dataclass field (None only where None is the default)"""
+    if value is None:
+        return field.default is None
+    return _matches_type(value, field.type)
+
+
 class WhiteLabelConfig:
     """Main white-label configuration manager"""
     
@@ -141,35 +173,53 @@ class WhiteLabelConfig:
         try:
             if os.path.exists(self.config_file):
                 with open(self.config_file, 'r') as f:
-                    config_data = json.load(f)
-                    
-                    # Load branding config
-                    if 'branding' in config_data:
-                        for key, value in config_data['branding'].items():
-                            if hasattr(self.branding, key):
-                                setattr(self.branding, key, value)
-                    
-                    # Load features config
-                    if 'features' in config_data:
-                        for key, value in config_data['features'].items():
-                            if hasattr(self.features, key):
-                                setattr(self.features, key, value)
-                    
-                    # Load deployment config
-                    if 'deployment' in config_data:
-                        for key, value in config_data['deployment'].items():
-                            if hasattr(self.deployment, key):
-                                setattr(self.deployment, key, value)
-                    
-                    # Load connection config
-                    if 'connection' in config_data:
-                        for key, value in config_data['connection'].items():
-                            if hasattr(self.connection, key):
-                                setattr(self.connection, key, value)
+                    self.apply_config_update(json.load(f))
         
         except Exception as e:
             print(f"Error loading white-label config: {e}")
     
+    def apply_config_update(self, config_data: Dict[str, Any]) -> Dict[str, List[str]]:
+        """Apply a partial configuration (same shape as the config file) and return the changed keys"""
+        changed = {}
+        sections = {
+            'branding': self.branding,
+            'features': self.features,
+            'deployment': self.deployment,
+            'connection': self.connection
+        }
+        
+        for section_name, section_obj in sections.items():
+            for key, value in (config_data.get(section_name) or {}).items():
+                if hasattr(section_obj, key) and getattr(section_obj, key) != value:
+                    setattr(section_obj, key, value)
+                    changed.setdefault(section_name, []).append(key)
+        
+        return changed
+    
+    def filter_remote_update(self, config_data: Any) -> Tuple[Dict[str, Dict[str, Any]], List[str]]:
+        """
+        Split a Hub-pushed update into the values that may be applied and the
+        rejected 'section.key' names: only branding and features keys that exist
+        and whose values match the field's type are accepted.
+        """
+        accepted, rejected = {}, []
+        if not isinstance(config_data, dict):
+            return accepted, ['<config is not an object>']
+        
+        for section_name, values in config_data.items():
+            if section_name not in REMOTE_CONFIG_SECTIONS or not isinstance(values, dict):
+                rejected.append(str(section_name))
+                continue
+            section_fields = {field.name: field for field in fields(getattr(self, section_name))}
+            for key, value in values.items():
+                field = section_fields.get(key)
+                if field is None or not _matches_field(value, field):
+                    rejected.append(f"{section_name}.{key}")
+                else:
+                    accepted.setdefault(section_name, {})[key] = value
+        
+        return accepted, rejected
+    
     def save_config(self):
         """Save configuration to file"""
         try:
@@ -4,6 +4,7 @@ from datetime import datetime
 from typing import Dict, List, Optional
 from model_handler import ModelHandler
 from mcp_handler import MCPHandler
+from model_router import model_router
 
 class WorkflowAutomation:
     """
@@ -54,10 +55,15 @@ class WorkflowAutomation:
         primary_intent = max(intent_scores, key=intent_scores.get) if intent_scores else 'general'
         confidence = intent_scores.get(primary_intent, 0) / len(conversation_text.split()) * 100
         
+        # Pick the model from live latency, error rate and cost data; keep the
+        # configured preference when no model satisfies the task's requirements
+        decision = model_router.route(primary_intent, input_tokens=len(conversation_text) // 4)
+        preferred_model = self.workflow_triggers.get(primary_intent, {}).get('preferred_model')
+        
         return {
             'intent': primary_intent,
             'confidence': min(confidence, 100),
-            'recommended_model': self.workflow_triggers.get(primary_intent, {}).get('preferred_model'),
+            'recommended_model': decision.model_id if decision and decision.within_constraints else preferred_model,
             'follow_up_actions': self.workflow_triggers.get(primary_intent, {}).get('follow_up_actions', [])
         }
     